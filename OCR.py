@@ -1,34 +1,473 @@
+import io
 import os
-import tempfile
+import queue
+import socket
+import threading
+import time
+from collections import deque
+from base64 import b64encode
+import numpy as np
+from PIL import Image
 from PPOCR_api import GetOcrApi
+import ocr_preprocess
+
+ENGINE_PATH = r".\PaddleOCR-json_v1.4.1\PaddleOCR-json.exe"
+DEFAULT_ARGUMENT = {"config_path": "models/config_japan.txt"}
+
+# 各语言使用的模型配置（相对于引擎目录），见 get_pool
+LANGUAGE_CONFIGS = {
+    "cn": "models/config_chinese.txt",
+    "en": "models/config_en.txt",
+    "ja": "models/config_japan.txt",
+}
+
+# 设置后默认引擎池连接共享识别服务（见 ocr_broker.py），例如 "remote://127.0.0.1:8767"
+BROKER_ENV = "FACHAO_OCR_BROKER"
+
+# 引擎已崩溃或无法通信时返回的状态码，此时引擎不再放回池中
+ENGINE_FAILURE_CODES = (901, 902, 903)
+
+# 仅识别模式：关闭文本检测和方向分类，整张图片作为一行文字直接送入识别模型
+REC_ONLY_ARGUMENT = {"det": False, "cls": False, "use_angle_cls": False}
+REC_IMAGE_HEIGHT = 48  # PP-OCRv3 识别模型的输入高度
+MAX_LINE_ASPECT = 0.8  # 高宽比超过此值的图片可能是竖排或多行文字，使用完整流程
+
+# 对冲请求：耗时超过近期第95百分位的请求，再交给另一个引擎执行一次，取先返回的结果
+HEDGE_PERCENTILE = 0.95
+HEDGE_MIN_SAMPLES = 20  # 样本数不足时不对冲
+LATENCY_WINDOW = 200  # 统计最近多少次请求的耗时
+
+
+class EnginePool:
+    """常驻识别引擎池。\n
+    引擎按需启动，最多同时存在 `size` 个；每次识别借出一个空闲引擎，用完后放回池中复用，
+    避免每次识别都重新启动引擎进程。可在多个线程中同时使用。\n
+    `timeout`: 每次识别的最长秒数。超时的引擎被关闭并丢弃，下次借用时自动启动新引擎。\n
+    `hedge`: 开启后，耗时超过近期第95百分位的请求会再交给另一个空闲引擎执行，取先返回的结果。
+    需要 `size` 至少为2才有空闲引擎可用。\n
+    `budget`: cpu_budget.CpuBudget，为每个引擎分配线程数并按需绑定核心。
+    """
+
+    def __init__(self, size=1, argument=None, exePath=ENGINE_PATH, ipcMode="pipe", clientId=None,
+                 timeout=None, hedge=False, budget=None):
+        self.size = max(int(size), 1)
+        self.argument = dict(argument if argument is not None else DEFAULT_ARGUMENT)
+        self.exePath = exePath
+        self.ipcMode = ipcMode
+        self.clientId = clientId  # 连接共享识别服务时用于公平排队的客户端标识
+        self.timeout = timeout
+        self.hedge = hedge
+        self.budget = budget
+        self.slots = {}  # 引擎 -> 从 budget 领取的核心组编号
+        self.idle = []  # 空闲引擎，后放回的先借出，优先复用最近用过的引擎
+        self.started = 0
+        self.lock = threading.Lock()
+        # 归还引擎或丢弃引擎（空出启动名额）时唤醒一个等待的线程
+        self.available = threading.Condition(self.lock)
+        self.latencies = deque(maxlen=LATENCY_WINDOW)  # 最近成功请求的耗时（秒）
+        self.timeouts = 0
+        self.hedged = 0
+
+    def acquire(self, block=True):
+        """借出一个引擎，必要时启动新引擎；池满时等待其他线程归还。\n
+        `block`: 为False时池满且没有空闲引擎则返回None。"""
+        with self.available:
+            while not self.idle and self.started >= self.size:
+                if not block:
+                    return None
+                self.available.wait()
+            if self.idle:
+                return self.idle.pop()
+            self.started += 1
+        argument = dict(self.argument)
+        slot = None
+        if self.budget is not None and self.clientId is None:  # 远程引擎的线程数由服务端决定
+            argument = self.budget.engine_argument(argument)
+            slot = self.budget.acquire_slot()
+        try:
+            engine = GetOcrApi(self.exePath, argument=argument, ipcMode=self.ipcMode, timeout=self.timeout)
+        except Exception:
+            with self.available:
+                self.started -= 1
+                self.available.notify()  # 等待的线程可以再尝试启动
+            if slot is not None:
+                self.budget.release_slot(slot)
+            raise
+        if slot is not None:
+            with self.lock:
+                self.slots[engine] = slot
+            self.budget.pin_engine(engine, slot)
+        return engine
+
+    def release(self, engine):
+        with self.available:
+            self.idle.append(engine)
+            self.available.notify()
+
+    def warm(self):
+        """立即启动全部引擎，使第一次识别不必等待引擎初始化。"""
+        engines = [self.acquire() for _ in range(self.size)]
+        for engine in engines:
+            self.release(engine)
+
+    def discard(self, engine):
+        """关闭并丢弃一个出错的引擎，之后会按需启动新引擎替代它。"""
+        try:
+            engine.exit()
+        except Exception as e:
+            print(f"[Error] engine.exit() {e}")
+        with self.available:
+            self.started -= 1
+            slot = self.slots.pop(engine, None)
+            self.available.notify()  # 由等待的线程启动替代的引擎
+        if slot is not None:
+            self.budget.release_slot(slot)  # 替代它的引擎可以重新使用这组核心
+
+    def finish(self, engine, results, started):
+        """根据结果归还或丢弃引擎，并记录耗时。"""
+        codes = [res.get("code") for res in results]
+        if any(code in ENGINE_FAILURE_CODES for code in codes):
+            with self.lock:
+                self.timeouts += codes.count(903)
+            self.discard(engine)
+        else:
+            self.release(engine)
+            elapsed = (time.monotonic() - started) / max(len(results), 1)
+            with self.lock:
+                self.latencies.append(elapsed)
+
+    def hedge_delay(self):
+        """返回对冲前等待的秒数（近期耗时的第95百分位），样本不足时返回None。"""
+        with self.lock:
+            if len(self.latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            latencies = sorted(self.latencies)
+        return latencies[int(HEDGE_PERCENTILE * (len(latencies) - 1))]
+
+    def call(self, engine, writeDict, timeout):
+        started = time.monotonic()
+        try:
+            res = engine.runDict(writeDict, timeout)
+        except Exception:
+            self.discard(engine)
+            raise
+        self.finish(engine, [res], started)
+        return res
+
+    def runDict(self, writeDict: dict, timeout=None):
+        """`timeout`: 本次识别的最长秒数，None为使用池的设置。"""
+        if self.clientId is not None:
+            writeDict = dict(writeDict, client=self.clientId)
+        delay = self.hedge_delay() if self.hedge else None
+        if delay is None:
+            return self.call(self.acquire(), writeDict, timeout)
+
+        answers = queue.Queue()
+
+        def attempt(engine):
+            try:
+                answers.put(self.call(engine, writeDict, timeout))
+            except Exception as e:
+                answers.put(e)
+
+        threading.Thread(target=attempt, args=(self.acquire(),), daemon=True).start()
+        attempts = 1
+        try:
+            res = answers.get(timeout=delay)
+        except queue.Empty:
+            # 请求比平时慢：有空闲引擎时再发一次，较慢的那次完成后引擎照常归还
+            engine = self.acquire(block=False)
+            if engine is not None:
+                with self.lock:
+                    self.hedged += 1
+                attempts = 2
+                threading.Thread(target=attempt, args=(engine,), daemon=True).start()
+            res = answers.get()
+        if attempts == 2 and (isinstance(res, Exception) or res.get("code") in ENGINE_FAILURE_CODES):
+            res = answers.get()  # 先返回的一次失败了，等待另一次
+        if isinstance(res, Exception):
+            raise res
+        return res
+
+    def runBytes(self, imageBytes):
+        return self.runDict({"image_base64": b64encode(imageBytes).decode("utf-8")})
+
+    def runBytesBatch(self, imageBytesList, timeout=None):
+        """用同一个引擎连续识别多张图片，返回与输入一一对应的结果列表。\n
+        `timeout`: 每张图片的最长秒数，None为使用池的设置。"""
+        writeDicts = [{"image_base64": b64encode(b).decode("utf-8")} for b in imageBytesList]
+        if self.clientId is not None:
+            writeDicts = [dict(d, client=self.clientId) for d in writeDicts]
+        engine = self.acquire()
+        started = time.monotonic()
+        try:
+            results = engine.runDictBatch(writeDicts, timeout)
+        except Exception:
+            self.discard(engine)
+            raise
+        self.finish(engine, results, started)
+        return results
+
+    def stats(self):
+        """返回引擎数、近期耗时的中位数和第95百分位（秒）、超时次数和对冲次数。"""
+        with self.lock:
+            latencies = sorted(self.latencies)
+        percentile = lambda q: latencies[int(q * (len(latencies) - 1))] if latencies else None
+        return {"engines": self.started, "p50": percentile(0.5), "p95": percentile(HEDGE_PERCENTILE),
+                "timeouts": self.timeouts, "hedged": self.hedged}
+
+    def close(self):
+        """关闭池中所有空闲引擎。"""
+        with self.lock:
+            engines, self.idle = self.idle, []
+        for engine in engines:
+            self.discard(engine)
+
+
+_default_pool = None
+_rec_only_warned = False  # 已提示过共享识别服务不支持仅识别模式
+_derived_pools = {}  # 引擎参数 -> 按语言或仅识别模式派生的引擎池
+_default_pool_lock = threading.Lock()
+recognitionOnly = False  # 见 set_recognition_only
+
+
+def get_default_pool():
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = make_pool(1, None, ENGINE_PATH, "pipe", os.environ.get(BROKER_ENV))
+        return _default_pool
+
+
+def get_pool(language=None, rec_only=False):
+    """返回识别 `language` 使用的引擎池，与默认池的引擎数量和设置相同，只换成该语言的模型配置。
+
+    未知语言或None使用默认池的模型配置；连接共享识别服务时模型由服务端决定，不按语言区分。
+    各语言的引擎池按需启动引擎，只识别一种语言时不会多占内存。
+
+    `rec_only`: 仅识别模式使用的引擎池，见 set_recognition_only；连接共享识别服务时不支持，返回完整流程的引擎池。"""
+    pool = get_default_pool()
+    argument = dict(pool.argument)
+    if pool.clientId is None and language in LANGUAGE_CONFIGS:
+        argument["config_path"] = LANGUAGE_CONFIGS[language]
+    if rec_only and rec_only_supported():
+        argument.update(REC_ONLY_ARGUMENT)
+    if argument == pool.argument:
+        return pool
+    key = tuple(sorted(argument.items()))
+    with _default_pool_lock:
+        if key not in _derived_pools:
+            _derived_pools[key] = EnginePool(pool.size, argument, pool.exePath, pool.ipcMode, pool.clientId, pool.timeout,
+                                             pool.hedge, pool.budget)
+        return _derived_pools[key]
+
+
+def get_rec_pool(language=None):
+    """仅识别模式使用的引擎池，见 get_pool。"""
+    return get_pool(language, rec_only=True)
+
+
+def rec_only_supported():
+    """仅识别模式需要用不同的启动参数启动引擎；连接共享识别服务时引擎由服务端启动，
+    启动参数不会传给服务端，只能使用完整的检测+识别流程。"""
+    global _rec_only_warned
+    if get_default_pool().clientId is None:
+        return True
+    if not _rec_only_warned:
+        _rec_only_warned = True
+        print("连接共享识别服务时不支持仅识别模式，将使用完整的检测+识别流程。")
+    return False
+
+
+def set_recognition_only(enabled):
+    """开启后，单行的源区域跳过文本检测，直接送入识别模型。"""
+    global recognitionOnly
+    recognitionOnly = bool(enabled)
+
+
+def make_pool(size, argument, exePath, ipcMode, broker, timeout=None, hedge=False, budget=None):
+    if broker:
+        # 共享识别服务由服务端持有引擎，本地只保留 size 个连接对象
+        clientId = f"{socket.gethostname()}:{os.getpid()}"
+        return EnginePool(size, argument, broker, "socket", clientId, timeout, hedge)
+    return EnginePool(size, argument, exePath, ipcMode, timeout=timeout, hedge=hedge, budget=budget)
+
+
+def configure(size=1, argument=None, exePath=ENGINE_PATH, ipcMode="pipe", broker=None, timeout=None, hedge=False,
+              budget=None):
+    """替换默认引擎池，例如在多线程批量处理前增加引擎数量。\n
+    `broker`: 共享识别服务地址，如 "remote://127.0.0.1:8767"；为None时使用环境变量 FACHAO_OCR_BROKER。\n
+    `timeout`, `hedge`, `budget`: 见 EnginePool。"""
+    global _default_pool
+    with _default_pool_lock:
+        close_pools()
+        _default_pool = make_pool(size, argument, exePath, ipcMode, broker or os.environ.get(BROKER_ENV), timeout, hedge,
+                                  budget)
+        return _default_pool
+
+
+def close_pools():
+    """关闭默认引擎池和所有派生引擎池中的空闲引擎。"""
+    for pool in [_default_pool, *_derived_pools.values()]:
+        if pool is not None:
+            pool.close()
+    _derived_pools.clear()
+
+
+def close():
+    with _default_pool_lock:
+        close_pools()
+
+
+def image_to_png_bytes(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def ink_rows(image):
+    """返回图片中含有墨迹的行（布尔数组）和墨迹掩码，见 ocr_preprocess.ink_rows。"""
+    return ocr_preprocess.ink_rows(image.convert("L"))
+
+
+def is_single_line(image):
+    """根据高宽比和墨迹的行投影判断图片是否只有一行横排文字。"""
+    if image.width == 0 or image.height > image.width * MAX_LINE_ASPECT:
+        return False
+    rows, _ = ink_rows(image)
+    # 较高的墨迹带超过一条即视为多行
+    return ocr_preprocess.text_bands(rows).size == 1
+
+
+def normalize_line(image, height=REC_IMAGE_HEIGHT):
+    """裁掉单行图片四周的空白并缩放到识别模型的输入高度。"""
+    rows, ink = ink_rows(image)
+    cols = ink.any(axis=0)
+    if rows.any() and cols.any():
+        top, bottom = np.flatnonzero(rows)[[0, -1]]
+        left, right = np.flatnonzero(cols)[[0, -1]]
+        pad = max((bottom - top) // 8, 2)
+        image = image.crop((max(left - pad, 0), max(top - pad, 0),
+                            min(right + pad + 1, image.width), min(bottom + pad + 1, image.height)))
+    width = max(int(image.width * height / max(image.height, 1)), 1)
+    if image.mode not in ("L", "RGB"):
+        image = image.convert("RGB")
+    return image.resize((width, height), Image.BILINEAR)
+
+
+def first_result(getObj):
+    """取识别结果的第一行 (文本, 置信度)；识别失败时返回 (错误信息, 0.0)，与 getTextFromImage 一致。\n
+    引擎崩溃或超时（ENGINE_FAILURE_CODES）时抛出异常，批量处理会把该图片记为失败，稍后重试。"""
+    if getObj["code"] in ENGINE_FAILURE_CODES:
+        raise Exception(f"识别引擎调用失败，状态码：{getObj['code']}，{getObj.get('data')}")
+    if getObj["code"] == 100:
+        line = getObj["data"][0]
+        return line["text"], float(line.get("score", 0.0))
+    return f"OCR识别失败，状态码：{getObj['code']}", 0.0
+
+
+def first_text(getObj):
+    """取识别结果的第一行文本，见 first_result。"""
+    return first_result(getObj)[0]
+
+
+def getResultsFromLines(images, language=None):
+    """识别多张源区域图片，返回与输入一一对应的 (文本, 置信度) 列表。\n
+    单行图片经裁边和高度归一化后，一次性连续送入仅识别引擎；
+    多行、竖排或仅识别失败的图片回退到完整的检测+识别流程。"""
+    images = [ocr_preprocess.prepare(image, "paddle") for image in images]
+    results = [None] * len(images)
+    lines = [index for index, image in enumerate(images) if is_single_line(image)] if rec_only_supported() else []
+    if lines:
+        getObjs = get_rec_pool(language).runBytesBatch([image_to_png_bytes(normalize_line(images[i])) for i in lines])
+        for index, getObj in zip(lines, getObjs):
+            if getObj["code"] == 100 and getObj["data"] and getObj["data"][0].get("text"):
+                results[index] = first_result(getObj)
+    for index, result in enumerate(results):
+        if result is None:
+            results[index] = first_result(get_pool(language).runBytes(image_to_png_bytes(images[index])))
+    return results
+
+
+def getTextsFromLines(images, language=None):
+    """识别多张源区域图片，返回与输入一一对应的文本列表，见 getResultsFromLines。"""
+    return [text for text, _ in getResultsFromLines(images, language)]
+
+
+def getResultFromImage(image, language=None):
+    """识别一张图片，返回第一行的 (文本, 置信度)。"""
+    if recognitionOnly:
+        return getResultsFromLines([image], language)[0]
+
+    # 识别图片（图片以内存中的PNG字节流传给引擎，无需临时文件）
+    image = ocr_preprocess.prepare(image, "paddle")
+    return first_result(get_pool(language).runBytes(image_to_png_bytes(image)))
+
 
 def getTextFromImage(image, language=None):
-    # 设置参数
-    argument = {"config_path": "models/config_japan.txt"}
+    return getResultFromImage(image, language)[0]
+
+# 拼图识别：把多张小图纵向拼接成一张图，只需一次引擎调用
+MONTAGE_GAP = 16  # 相邻小图之间的空白高度
+MONTAGE_MAX_SIDE = 1600  # 超过此长度的拼图会被引擎缩小，导致小字丢失
+
 
-    # 初始化识别器对象
-    ocr = GetOcrApi(r".\PaddleOCR-json_v1.4.1\PaddleOCR-json.exe", argument=argument)
+def build_montages(images, gap=MONTAGE_GAP, max_side=MONTAGE_MAX_SIDE):
+    """把图片纵向拼接成若干张白底长图。\n
+    `return`: [(拼图, [(图片序号, 上边界, 下边界), ...]), ...]"""
+    montages = []
+    group, height, width = [], gap, 1
+    for index, image in enumerate(images):
+        if group and max(height + image.height + gap, width, image.width) > max_side:
+            montages.append((group, height, width))
+            group, height, width = [], gap, 1
+        group.append((index, height, image))
+        height += image.height + gap
+        width = max(width, image.width)
+    if group:
+        montages.append((group, height, width))
 
-    # 创建临时文件来保存图像
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as temp_file:
-        temp_filename = temp_file.name
-        image.save(temp_filename, format='PNG')
+    result = []
+    for group, height, width in montages:
+        mode = "L" if all(image.mode == "L" for _, _, image in group) else "RGB"
+        montage = Image.new(mode, (width + 2 * gap, height), "white")
+        spans = []
+        for index, top, image in group:
+            if image.mode == "RGBA":
+                montage.paste(image, (gap, top), image)
+            else:
+                montage.paste(image.convert(mode), (gap, top))
+            spans.append((index, top - gap // 2, top + image.height + gap // 2))
+        result.append((montage, spans))
+    return result
 
-    try:
-        # 识别图片
-        getObj = ocr.run(temp_filename)
-        
+
+def getResultsFromImages(images, language=None):
+    """一次识别多张图片，返回与输入一一对应的 (文本, 置信度) 列表。\n
+    图片先被拼接成长图，按识别出的文本框中心把结果分回对应的图片，每张图片取第一行文本。"""
+    results = [("", 0.0)] * len(images)
+    images = [ocr_preprocess.prepare(image, "paddle") for image in images]
+    for montage, spans in build_montages(images):
+        getObj = get_pool(language).runBytes(image_to_png_bytes(montage))
         if getObj["code"] == 100:
-            # 如果识别成功，返回识别的文本
-            result = getObj["data"][0]["text"]
-            return result
-        else:
-            # 如果识别失败，返回错误信息
-            return f"OCR识别失败，状态码：{getObj['code']}"
-    
-    finally:
-        # 删除临时文件
-        os.unlink(temp_filename)
+            for line in getObj["data"]:
+                center_y = sum(point[1] for point in line["box"]) / len(line["box"])
+                for index, top, bottom in spans:
+                    if top <= center_y < bottom:
+                        if not results[index][0]:
+                            results[index] = (line["text"], float(line.get("score", 0.0)))
+                        break
+        elif getObj["code"] in ENGINE_FAILURE_CODES:
+            raise Exception(f"识别引擎调用失败，状态码：{getObj['code']}，{getObj.get('data')}")
+        elif getObj["code"] != 101:  # 101：图中没有文字
+            for index, _, _ in spans:
+                results[index] = (f"OCR识别失败，状态码：{getObj['code']}", 0.0)
+    return results
+
+
+def getTextsFromImages(images, language=None):
+    """一次识别多张图片，返回与输入一一对应的文本列表，见 getResultsFromImages。"""
+    return [text for text, _ in getResultsFromImages(images, language)]
 
 # 使用示例
 # from PIL import Image
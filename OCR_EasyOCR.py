@@ -1,7 +1,49 @@
 # OCR.py
+import concurrent.futures
+import cpu_budget
 import easyocr
 import numpy as np
 from PIL import Image
+import OCR
+import ocr_preprocess
+import shm_transport
+
+# 每个进程按语言缓存 Reader：加载模型需要数秒，不能每次识别都重新初始化
+_readers = {}
+_process_pool = None
+
+# 界面使用的语言代码 -> EasyOCR 的语言代码
+EASYOCR_LANGUAGES = {"cn": "ch_sim", "en": "en", "ja": "ja"}
+
+
+def get_reader(language):
+    if language not in _readers:
+        # 如果有兼容的GPU，可以设置gpu=True
+        _readers[language] = easyocr.Reader([EASYOCR_LANGUAGES.get(language, language)], gpu=False)
+    return _readers[language]
+
+
+def recognise(img, language):
+    """识别一张 numpy 图片（BGR 或灰度），返回合并后的文本。"""
+    result = get_reader(language).readtext(img, detail=0, paragraph=True)
+    return ' '.join(result[::-1]).strip()
+
+
+def recognise_result(img, language):
+    """识别一张 numpy 图片，返回 (合并后的文本, 各文本框置信度的平均值)。"""
+    lines = get_reader(language).readtext(img, detail=1, paragraph=False)
+    if not lines:
+        return "", 0.0
+    text = ' '.join(line[1] for line in lines[::-1]).strip()
+    return text, float(sum(line[2] for line in lines) / len(lines))
+
+
+def to_array(image):
+    """预处理图片（见 ocr_preprocess.py）并转换为 EasyOCR 接受的灰度或BGR数组。"""
+    img = ocr_preprocess.prepare(image, "easyocr")
+    if img.mode == "L":
+        return np.array(img)  # EasyOCR 可直接接受二维灰度数组，无需转换为BGR
+    return np.array(img)[:, :, ::-1]  # RGB to BGR
 
 def getTextFromImage_EasyOCR(image, language):
     """
@@ -20,23 +62,90 @@ def getTextFromImage_EasyOCR(image, language):
         raise ValueError(f"Unsupported language: {language}. Supported languages are: {supported_languages}")
     
 
-    # 将PIL图片转换为OpenCV格式（BGR）
-    img = image.convert("RGB")
-    img = np.array(img)
-    img = img[:, :, ::-1]  # RGB to BGR
-
-    # 初始化EasyOCR Reader
-    reader = easyocr.Reader([language], gpu=False)  # 如果有兼容的GPU，可以设置gpu=True
+    # 去掉透明通道并缩小过大的图片，转换为OpenCV格式（BGR）
+    img = to_array(image)
 
     # 执行OCR
-    result = reader.readtext(img, detail=0, paragraph=True)
+    return recognise(img, language)
+
+
+def getResultFromImage_EasyOCR(image, language):
+    """从图片中提取文本，返回 (文本, 置信度)，见 getTextFromImage_EasyOCR。"""
+    if language not in EASYOCR_LANGUAGES:
+        raise ValueError(f"Unsupported language: {language}. Supported languages are: {list(EASYOCR_LANGUAGES)}")
+    return recognise_result(to_array(image), language)
 
-    # 将结果合并为一个字符串
-    ocr_text = ' '.join(result[::-1]).strip()
 
-    return ocr_text
+def _recognise_region(region, language, scored=False):
+    # 在子进程中执行：region 是共享内存上的视图，只有需要缩小时才生成新数组
+    gray = region if region.ndim == 2 else region[:, :, 1]  # 绿色通道近似亮度，足够估计字高
+    scale = ocr_preprocess.scale_for(gray, "easyocr")
+    if scale < 1.0:
+        size = (max(round(region.shape[1] * scale), 1), max(round(region.shape[0] * scale), 1))
+        region = np.asarray(Image.fromarray(region).resize(size, Image.BOX))
+    return recognise_result(region, language) if scored else recognise(region, language)
+
+
+def _read_region(descriptor, language, scored=False):
+    return shm_transport.with_region(descriptor, _recognise_region, language, scored)
+
+
+def get_process_pool(processes=None, budget=None):
+    """识别子进程池；每个子进程各自缓存 Reader。\n
+    `budget`: cpu_budget.CpuBudget，限制每个子进程的 torch/OpenMP 线程数并按需绑定核心；
+    None为使用 PaddleOCR 默认引擎池的预算，使两种引擎计入同一个预算。"""
+    global _process_pool
+    if _process_pool is None:
+        if budget is None:
+            budget = OCR.get_default_pool().budget
+        if budget is not None:
+            _process_pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=processes or budget.easyocr_workers or None,
+                initializer=cpu_budget.init_worker, initargs=budget.worker_initargs())
+        else:
+            _process_pool = concurrent.futures.ProcessPoolExecutor(max_workers=processes)
+    return _process_pool
+
+
+def getTextsFromPage_EasyOCR(image, boxes, language, processes=None):
+    """
+    在子进程池中识别一页图片上的多个源区域。
+
+    整页图片只写入共享内存一次（BGR 或灰度的转换对整页一次完成），
+    子进程按 (共享内存名称, 形状, 框) 在共享内存上直接切出源区域，源区域本身不经过序列化。
+
+    参数:
+        image (PIL.Image): 整页图片。
+        boxes (list): 源区域列表，每项为 (左, 上, 右, 下)。
+        language (str): OCR识别的语言。
+        processes (int): 子进程数，仅在第一次调用时生效，默认为CPU核心数。
+
+    返回:
+        list: 与 boxes 一一对应的文本。
+    """
+    pool = get_process_pool(processes)
+    mode = "L" if ocr_preprocess.PROFILES["easyocr"].get("gray", True) else "BGR"
+    with shm_transport.SharedPage(image, mode) as page:
+        futures = [pool.submit(_read_region, page.descriptor(box), language) for box in boxes]
+        return [future.result() for future in futures]
 
 
+def getResultsFromPage_EasyOCR(image, boxes, language, processes=None):
+    """与 getTextsFromPage_EasyOCR 相同，但返回与 boxes 一一对应的 (文本, 置信度)；
+    某个源区域识别出错时，对应位置为该异常，其余源区域不受影响。"""
+    if language not in EASYOCR_LANGUAGES:
+        raise ValueError(f"Unsupported language: {language}. Supported languages are: {list(EASYOCR_LANGUAGES)}")
+    pool = get_process_pool(processes)
+    mode = "L" if ocr_preprocess.PROFILES["easyocr"].get("gray", True) else "BGR"
+    with shm_transport.SharedPage(image, mode) as page:
+        futures = [pool.submit(_read_region, page.descriptor(box), language, True) for box in boxes]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
 
 
 getTextFromImage = getTextFromImage_EasyOCR
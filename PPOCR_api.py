@@ -6,6 +6,8 @@ import os
 import socket  # 套接字
 import atexit  # 退出处理
 import subprocess  # 进程，管道
+import threading  # 批量指令的写入线程、输出读取线程
+import queue  # 输出行队列
 import re  # regex
 from json import loads as jsonLoads, dumps as jsonDumps
 from sys import platform as sysPlatform  # popen静默模式
@@ -13,14 +15,17 @@ from base64 import b64encode  # base64 编码
 
 
 class PPOCR_pipe:  # 调用OCR（管道模式）
-    def __init__(self, exePath: str, modelsPath: str = None, argument: dict = None):
+    def __init__(self, exePath: str, modelsPath: str = None, argument: dict = None, timeout: float = None):
         """初始化识别器（管道模式）。\n
         `exePath`: 识别器`PaddleOCR_json.exe`的路径。\n
         `modelsPath`: 识别库`models`文件夹的路径。若为None则默认识别库与识别器在同一目录下。\n
-        `argument`: 启动参数，字典`{"键":值}`。参数说明见 https://github.com/hiroi-sora/PaddleOCR-json
+        `argument`: 启动参数，字典`{"键":值}`。参数说明见 https://github.com/hiroi-sora/PaddleOCR-json\n
+        `timeout`: 每条指令等待结果的最长秒数。超时后引擎进程被关闭，返回码903。None为一直等待。
         """
         # 私有成员变量
         self.__ENABLE_CLIPBOARD = False
+        self.timeout = timeout
+        self.__lines = None  # 输出读取线程读到的行，首次发送指令时创建
 
         exePath = os.path.abspath(exePath)
         cwd = os.path.abspath(os.path.join(exePath, os.pardir))  # 获取exe父文件夹
@@ -77,9 +82,43 @@ class PPOCR_pipe:  # 调用OCR（管道模式）
         # 默认管道模式只能运行在本地
         return "local"
 
-    def runDict(self, writeDict: dict):
+    def __readLine(self, timeout):
+        """读取引擎输出的一行，最多等待 timeout 秒。\n
+        输出由单独的线程读取，主线程只需按时限等待队列；超时的引擎可能已卡死，
+        且迟到的结果会被下一条指令误读，因此直接关闭引擎进程。\n
+        `return`: 字符串，或表示失败的结果字典\n"""
+        if self.__lines is None:
+            self.__lines = queue.Queue()
+            threading.Thread(target=self.__readerLoop, args=(self.ret.stdout, self.__lines), daemon=True).start()
+        try:
+            getStr = self.__lines.get(timeout=timeout)
+        except queue.Empty:
+            try:
+                self.ret.kill()
+            except Exception as e:
+                print(f"[Error] ret.kill() {e}")
+            return {"code": 903, "data": f"识别器在{timeout}秒内没有返回结果，已关闭引擎进程。"}
+        if isinstance(getStr, Exception):
+            return {"code": 903, "data": f"读取识别器进程输出值失败。异常信息：[{getStr}]"}
+        if not getStr:  # 管道已关闭
+            return {"code": 902, "data": f"识别器进程已退出，疑似子进程已崩溃。"}
+        return getStr
+
+    @staticmethod
+    def __readerLoop(stdout, lines):
+        # 输出读取线程：逐行读取直到管道关闭
+        try:
+            for line in iter(stdout.readline, b""):
+                lines.put(line.decode("utf-8", errors="ignore"))
+        except Exception as e:
+            lines.put(e)
+            return
+        lines.put("")
+
+    def runDict(self, writeDict: dict, timeout: float = None):
         """传入指令字典，发送给引擎进程。\n
         `writeDict`: 指令字典。\n
+        `timeout`: 等待结果的最长秒数，None为使用初始化时的设置。\n
         `return`:  {"code": 识别码, "data": 内容列表或错误信息字符串}\n"""
         # 检查子进程
         if not self.ret:
@@ -97,10 +136,9 @@ class PPOCR_pipe:  # 调用OCR（管道模式）
                 "data": f"向识别器进程传入指令失败，疑似子进程已崩溃。{e}",
             }
         # 获取返回值
-        try:
-            getStr = self.ret.stdout.readline().decode("utf-8", errors="ignore")
-        except Exception as e:
-            return {"code": 903, "data": f"读取识别器进程输出值失败。异常信息：[{e}]"}
+        getStr = self.__readLine(self.timeout if timeout is None else timeout)
+        if isinstance(getStr, dict):
+            return getStr
         try:
             return jsonLoads(getStr)
         except Exception as e:
@@ -109,6 +147,51 @@ class PPOCR_pipe:  # 调用OCR（管道模式）
                 "data": f"识别器输出值反序列化JSON失败。异常信息：[{e}]。原始内容：[{getStr}]",
             }
 
+    def runDictBatch(self, writeDicts: list, timeout: float = None):
+        """传入多条指令字典，连续发送给引擎进程后依次读取结果。\n
+        引擎逐行处理输入，写入与读取在两个线程中同时进行，省去每条指令之间的来回等待。\n
+        `writeDicts`: 指令字典列表。\n
+        `timeout`: 每条指令等待结果的最长秒数，None为使用初始化时的设置。\n
+        `return`:  与指令一一对应的结果列表\n"""
+        if not self.ret:
+            return [{"code": 901, "data": f"引擎实例不存在。"} for _ in writeDicts]
+        if not self.ret.poll() == None:
+            return [{"code": 902, "data": f"子进程已崩溃。"} for _ in writeDicts]
+
+        writeErrors = []
+
+        def writer():
+            # 单独的写入线程：引擎输出缓冲区写满时，主线程仍在读取，不会互相堵塞
+            try:
+                for writeDict in writeDicts:
+                    writeStr = jsonDumps(writeDict, ensure_ascii=True, indent=None) + "\n"
+                    self.ret.stdin.write(writeStr.encode("utf-8"))
+                    self.ret.stdin.flush()
+            except Exception as e:
+                writeErrors.append(e)
+
+        timeout = self.timeout if timeout is None else timeout
+        writeThread = threading.Thread(target=writer, daemon=True)
+        writeThread.start()
+        results = []
+        for _ in writeDicts:
+            if results and results[-1]["code"] in (902, 903):  # 引擎已退出或已被关闭
+                results.append({"code": 902, "data": f"向识别器进程传入指令失败，疑似子进程已崩溃。{writeErrors}"})
+                continue
+            getStr = self.__readLine(timeout)
+            if isinstance(getStr, dict):
+                results.append(getStr)
+                continue
+            try:
+                results.append(jsonLoads(getStr))
+            except Exception as e:
+                results.append({
+                    "code": 904,
+                    "data": f"识别器输出值反序列化JSON失败。异常信息：[{e}]。原始内容：[{getStr}]",
+                })
+        writeThread.join()
+        return results
+
     def run(self, imgPath: str):
         """对一张本地图片进行文字识别。\n
         `exePath`: 图片路径。\n
@@ -177,12 +260,14 @@ class PPOCR_pipe:  # 调用OCR（管道模式）
 class PPOCR_socket(PPOCR_pipe):
     """调用OCR（套接字模式）"""
 
-    def __init__(self, exePath: str, modelsPath: str = None, argument: dict = None):
+    def __init__(self, exePath: str, modelsPath: str = None, argument: dict = None, timeout: float = None):
         """初始化识别器（套接字模式）。\n
         `exePath`: 识别器`PaddleOCR_json.exe`的路径。\n
         `modelsPath`: 识别库`models`文件夹的路径。若为None则默认识别库与识别器在同一目录下。\n
-        `argument`: 启动参数，字典`{"键":值}`。参数说明见 https://github.com/hiroi-sora/PaddleOCR-json
+        `argument`: 启动参数，字典`{"键":值}`。参数说明见 https://github.com/hiroi-sora/PaddleOCR-json\n
+        `timeout`: 每条指令等待结果的最长秒数，超时返回码903。None为一直等待。
         """
+        self.timeout = timeout
         # 处理参数
         if not argument:
             argument = {}
@@ -196,7 +281,7 @@ class PPOCR_socket(PPOCR_pipe):
 
         # 如果为本地路径：使用 PPOCR_pipe 来开启本地引擎进程
         if self.__runningMode == "local":
-            super().__init__(self.exePath, modelsPath, argument)  # 父类构造函数
+            super().__init__(self.exePath, modelsPath, argument, timeout)  # 父类构造函数
             self.__ENABLE_CLIPBOARD = super().isClipboardEnabled()
             # 再获取一行输出，检查是否成功启动服务器
             initStr = self.ret.stdout.readline().decode("utf-8", errors="ignore")
@@ -230,9 +315,10 @@ class PPOCR_socket(PPOCR_pipe):
     def getRunningMode(self) -> str:
         return self.__runningMode
 
-    def runDict(self, writeDict: dict):
+    def runDict(self, writeDict: dict, timeout: float = None):
         """传入指令字典，发送给引擎进程。\n
         `writeDict`: 指令字典。\n
+        `timeout`: 等待结果的最长秒数，None为使用初始化时的设置。\n
         `return`:  {"code": 识别码, "data": 内容列表或错误信息字符串}\n"""
 
         # 仅在本地模式下检查引擎进程
@@ -243,9 +329,11 @@ class PPOCR_socket(PPOCR_pipe):
 
         # 通信
         writeStr = jsonDumps(writeDict, ensure_ascii=True, indent=None) + "\n"
+        clientSocket = None
         try:
             # 创建TCP连接
             clientSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            clientSocket.settimeout(self.timeout if timeout is None else timeout)  # 连接和每次收发的时限
             clientSocket.connect((self.ip, self.port))
             # 发送数据
             clientSocket.sendall(writeStr.encode())
@@ -259,12 +347,13 @@ class PPOCR_socket(PPOCR_pipe):
             getStr = resData.decode()
         except ConnectionRefusedError:
             return {"code": 902, "data": "连接被拒绝"}
-        except TimeoutError:
+        except (TimeoutError, socket.timeout):
             return {"code": 903, "data": "连接超时"}
         except Exception as e:
             return {"code": 904, "data": f"网络错误：{e}"}
         finally:
-            clientSocket.close()  # 关闭连接
+            if clientSocket is not None:
+                clientSocket.close()  # 关闭连接
         # 反序列输出信息
         try:
             return jsonLoads(getStr)
@@ -274,6 +363,11 @@ class PPOCR_socket(PPOCR_pipe):
                 "data": f"识别器输出值反序列化JSON失败。异常信息：[{e}]。原始内容：[{getStr}]",
             }
 
+    def runDictBatch(self, writeDicts: list, timeout: float = None):
+        """传入多条指令字典。套接字模式每条指令使用独立连接，因此依次发送。\n
+        `return`:  与指令一一对应的结果列表\n"""
+        return [self.runDict(writeDict, timeout) for writeDict in writeDicts]
+
     def exit(self):
         """关闭引擎子进程"""
         # 仅在本地模式下关闭引擎进程
@@ -317,18 +411,19 @@ class PPOCR_socket(PPOCR_pipe):
 
 
 def GetOcrApi(
-    exePath: str, modelsPath: str = None, argument: dict = None, ipcMode: str = "pipe"
+    exePath: str, modelsPath: str = None, argument: dict = None, ipcMode: str = "pipe", timeout: float = None
 ):
     """获取识别器API对象。\n
     `exePath`: 识别器`PaddleOCR_json.exe`的路径。\n
     `modelsPath`: 识别库`models`文件夹的路径。若为None则默认识别库与识别器在同一目录下。\n
     `argument`: 启动参数，字典`{"键":值}`。参数说明见 https://github.com/hiroi-sora/PaddleOCR-json\n
-    `ipcMode`: 进程通信模式，可选值为套接字模式`socket` 或 管道模式`pipe`。用法上完全一致。
+    `ipcMode`: 进程通信模式，可选值为套接字模式`socket` 或 管道模式`pipe`。用法上完全一致。\n
+    `timeout`: 每条指令等待结果的最长秒数，None为一直等待。
     """
     if ipcMode == "socket":
-        return PPOCR_socket(exePath, modelsPath, argument)
+        return PPOCR_socket(exePath, modelsPath, argument, timeout)
     elif ipcMode == "pipe":
-        return PPOCR_pipe(exePath, modelsPath, argument)
+        return PPOCR_pipe(exePath, modelsPath, argument, timeout)
     else:
         raise Exception(
             f'ipcMode可选值为 套接字模式"socket" 或 管道模式"pipe" ，不允许{ipcMode}。'
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from page_source import page_key
+
+MANIFEST_NAME = "fachao_manifest.json"
+JOURNAL_SUFFIX = ".journal"
+MANIFEST_VERSION = 1
+COMPACT_EVERY = 5000  # Journal lines after which the snapshot is rewritten, bounding the replay on load
+
+# Decisions that finish an item; anything else (e.g. "failed") is retried on the next run.
+# "rendered" is an output saved without human review (distributed and unattended runs).
+FINISHED_DECISIONS = ("accepted", "rendered", "rejected")
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """Return the SHA-1 hex digest of a file's contents."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BatchManifest:
+    """Checkpoint of a batch job, stored as JSON next to the batch outputs.
+
+    Every input is recorded with its content hash, OCR results, seed, decision and output path,
+    so an interrupted batch can be restarted and skip everything that is already done. Pages of
+    multi-page files are recorded separately, keyed by page_source.page_key.
+
+    The JSON file is a snapshot; each record() appends the updated entry as one line to a journal
+    next to it, so recording costs the same on the last page of a large batch as on the first.
+    The journal is replayed on load and folded into the snapshot by start(), close() and every
+    COMPACT_EVERY records. record() may be called from several threads.
+    """
+
+    def __init__(self, output_folder):
+        self.path = os.path.join(output_folder, MANIFEST_NAME)
+        self.journal_path = self.path + JOURNAL_SUFFIX
+        self.seed = None
+        self.template = None
+        self.items = {}  # Page key of the absolute input path -> entry dict
+        self.hashes = {}  # (absolute path, size, mtime) -> hash, so a document is hashed once for all its pages
+        self.journal = None  # Open journal file while records are being appended
+        self.journal_lines = 0
+        self.lock = threading.Lock()
+        if os.path.exists(self.path):
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"无法读取批量处理清单 {self.path}，将重新开始：{e}")
+            return
+        if data.get("version") != MANIFEST_VERSION:
+            print(f"批量处理清单版本不匹配（{data.get('version')}），将重新开始。")
+            return
+        self.seed = data.get("seed")
+        self.template = data.get("template")
+        self.items = data.get("items", {})
+        self.replay()
+
+    def replay(self):
+        """Apply the journal lines written since the last snapshot."""
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash; everything before it is intact. Compact now so
+                    # new lines are not appended to the broken one.
+                    truncated = True
+                    break
+                self.items[record["key"]] = record["entry"]
+                self.journal_lines += 1
+            else:
+                truncated = False
+        if truncated:
+            self.save()
+
+    def save(self):
+        """Write a snapshot of all items and empty the journal."""
+        data = {
+            "version": MANIFEST_VERSION,
+            "seed": self.seed,
+            "template": self.template,
+            "items": self.items,
+        }
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(temp_path, self.path)
+        # Replaying a journal that is already in the snapshot is harmless, so a crash here loses nothing
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.journal_lines = 0
+
+    def start(self, seed, template):
+        """Begin (or resume) a run. Items rendered with another template are no longer up to date."""
+        with self.lock:
+            if self.template != template:
+                for entry in self.items.values():
+                    entry["decision"] = "stale"
+            self.seed = seed
+            self.template = template
+            self.save()
+
+    def close(self):
+        """Fold the journal into the snapshot at the end of a run."""
+        with self.lock:
+            if self.journal is not None or self.journal_lines:
+                self.save()
+
+    def input_signature(self, path, frame=None):
+        """Return (size, mtime, hash) of path, reusing the stored hash if size and mtime are unchanged."""
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+        entry = self.items.get(page_key(key[0], frame), {})
+        if entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime and entry.get("hash"):
+            return stat.st_size, stat.st_mtime, entry["hash"]
+        if key not in self.hashes:
+            self.hashes[key] = file_hash(path)
+        return stat.st_size, stat.st_mtime, self.hashes[key]
+
+    def is_done(self, path, frame=None):
+        """True if the page was finished with the current template and neither input nor output changed since."""
+        entry = self.items.get(page_key(os.path.abspath(path), frame))
+        if not entry or entry.get("decision") not in FINISHED_DECISIONS:
+            return False
+        try:
+            if self.input_signature(path, frame)[2] != entry.get("hash"):
+                return False
+        except OSError:
+            return False
+        if entry["decision"] in ("accepted", "rendered"):
+            return bool(entry.get("output")) and os.path.exists(entry["output"])
+        return True
+
+    def entry(self, path, frame=None):
+        """Return the entry of a page (empty if it was never recorded)."""
+        return self.items.get(page_key(os.path.abspath(path), frame), {})
+
+    def first_unfinished(self, pages, start=0):
+        """Return the index of the first (path, frame) page from start on that is not done, or len(pages)."""
+        for index in range(start, len(pages)):
+            if not self.is_done(*pages[index]):
+                return index
+        return len(pages)
+
+    def record(self, path, frame=None, signature=None, **fields):
+        """Update the entry for a page with fields and append it to the journal on disk.
+
+        `signature` is the input_signature the page was processed from; by default the input is
+        signed now, which is only right if it cannot have changed since it was read.
+        """
+        key = page_key(os.path.abspath(path), frame)
+        if signature is None:
+            try:
+                signature = self.input_signature(path, frame)  # Hashing happens outside the lock
+            except OSError:
+                pass
+        with self.lock:
+            entry = dict(self.items.get(key, {}))
+            if signature is not None:
+                entry["size"], entry["mtime"], entry["hash"] = signature
+            entry.update(fields)
+            entry["updated"] = time.time()
+            self.items[key] = entry
+            if self.journal is None:
+                self.journal = open(self.journal_path, "a", encoding="utf-8")
+            self.journal.write(json.dumps({"key": key, "entry": entry}, ensure_ascii=False) + "\n")
+            self.journal.flush()
+            self.journal_lines += 1
+            if self.journal_lines >= COMPACT_EVERY:
+                self.save()
+
+    def summary(self):
+        counts = {}
+        for entry in self.items.values():
+            decision = entry.get("decision", "pending")
+            counts[decision] = counts.get(decision, 0) + 1
+        return counts
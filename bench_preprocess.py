@@ -0,0 +1,161 @@
+# 识别前预处理的基准测试：对同一批源区域图片，分别在开启和关闭 ocr_preprocess.prepare 的缩小/灰度处理时
+# 识别，比较单张耗时和准确率。默认用 fonts 文件夹中的字体合成高分辨率扫描件那样的大字图片（已知正确文本），
+# 也可以用 --samples 指定真实源区域图片。
+#
+#   python bench_preprocess.py                      合成30张图片，测试 PaddleOCR（及已安装的 EasyOCR）
+#   python bench_preprocess.py --samples crops      crops/labels.txt 每行为 “文件名<Tab>正确文本”
+#   python bench_preprocess.py --offline            只统计像素数、PNG大小和编码耗时，不启动识别引擎
+#
+# 两种设置对每张图片交替运行，减少引擎预热和系统负载变化造成的偏差；每个后端先识别一张图片预热，不计入统计。
+
+import argparse
+import importlib.util
+import io
+import os
+import random
+import statistics
+import time
+from PIL import Image, ImageDraw, ImageFont
+import ocr_preprocess
+
+FONTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts")
+SAMPLE_CHARS = "0123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+RAW_PROFILE = {"text_height": None, "limit_side_len": None, "gray": False}  # 关闭缩小和灰度，只去掉透明通道
+
+
+def synthetic_samples(count, glyph_height, font_path, seed=0):
+    """合成 count 张单行文字图片，返回 [(图片, 正确文本)]。"""
+    rng = random.Random(seed)
+    font = ImageFont.truetype(font_path, glyph_height)
+    samples = []
+    for _ in range(count):
+        text = "".join(rng.choice(SAMPLE_CHARS) for _ in range(rng.randint(4, 10)))
+        left, top, right, bottom = font.getbbox(text)
+        pad = glyph_height // 2
+        image = Image.new("RGBA", (right - left + 2 * pad, bottom - top + 2 * pad), (0, 0, 0, 0))
+        ImageDraw.Draw(image).text((pad - left, pad - top), text, font=font, fill=(20, 20, 20, 255))
+        samples.append((image, text))
+    return samples
+
+
+def load_samples(folder):
+    """读取 folder/labels.txt 中列出的图片和正确文本。"""
+    samples = []
+    with open(os.path.join(folder, "labels.txt"), "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                name, text = line.rstrip("\n").split("\t", 1)
+                samples.append((Image.open(os.path.join(folder, name)), text))
+    return samples
+
+
+def edit_distance(a, b):
+    row = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        previous, row[0] = row[0], i
+        for j, cb in enumerate(b, 1):
+            previous, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, previous + (ca != cb))
+    return row[-1]
+
+
+def normalise(text):
+    return "".join(text.split())
+
+
+def char_accuracy(text, truth):
+    """1 - 编辑距离/正确文本长度（不计空白），不小于0。"""
+    text, truth = normalise(text), normalise(truth)
+    return max(1.0 - edit_distance(text, truth) / max(len(truth), 1), 0.0)
+
+
+def with_profile(backend, profile, func, *args):
+    """临时替换后端的预处理参数并调用 func。"""
+    saved = dict(ocr_preprocess.PROFILES[backend])
+    ocr_preprocess.set_profile(backend, **profile)
+    try:
+        return func(*args)
+    finally:
+        ocr_preprocess.PROFILES[backend] = saved
+
+
+def offline_stats(samples, backend):
+    """统计不经过引擎的部分：送入引擎的像素数、PNG大小和预处理+编码耗时。"""
+    stats = {}
+    for name, profile in (("关闭", RAW_PROFILE), ("开启", dict(ocr_preprocess.PROFILES[backend]))):
+        pixels, sizes, times = [], [], []
+        for image, _ in samples:
+            started = time.perf_counter()
+            prepared = with_profile(backend, profile, ocr_preprocess.prepare, image, backend)
+            buffer = io.BytesIO()
+            prepared.save(buffer, format="PNG")
+            times.append(time.perf_counter() - started)
+            pixels.append(prepared.width * prepared.height)
+            sizes.append(buffer.tell())
+        stats[name] = (statistics.mean(pixels), statistics.mean(sizes), statistics.median(times))
+    return stats
+
+
+def recognisers():
+    """返回可用的 {后端名称: (预处理参数名, 识别函数)}。"""
+    import OCR
+    result = {"paddle": ("paddle", lambda image: OCR.getResultFromImage(image, "en")[0])}
+    if importlib.util.find_spec("easyocr") is not None:
+        import OCR_EasyOCR
+        result["easyocr"] = ("easyocr", lambda image: OCR_EasyOCR.getResultFromImage_EasyOCR(image, "en")[0])
+    return result
+
+
+def benchmark(samples, backend, recognise):
+    """交替用两种设置识别每张图片，返回 {设置: (耗时中位数, 平均耗时, 完全正确比例, 平均字符准确率)}。"""
+    profiles = {"关闭": RAW_PROFILE, "开启": dict(ocr_preprocess.PROFILES[backend])}
+    for profile in profiles.values():
+        with_profile(backend, profile, recognise, samples[0][0])  # 预热
+    runs = {name: ([], [], []) for name in profiles}
+    for index, (image, truth) in enumerate(samples):
+        order = list(profiles) if index % 2 == 0 else list(profiles)[::-1]
+        for name in order:
+            started = time.perf_counter()
+            text = with_profile(backend, profiles[name], recognise, image)
+            latencies, exact, accuracy = runs[name]
+            latencies.append(time.perf_counter() - started)
+            exact.append(normalise(text) == normalise(truth))
+            accuracy.append(char_accuracy(text, truth))
+    return {name: (statistics.median(latencies), statistics.mean(latencies), statistics.mean(exact),
+                   statistics.mean(accuracy)) for name, (latencies, exact, accuracy) in runs.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="比较开启和关闭识别前预处理时的耗时和准确率")
+    parser.add_argument("--samples", help="源区域图片文件夹，其中 labels.txt 每行为 “文件名<Tab>正确文本”")
+    parser.add_argument("--count", type=int, default=30, help="合成图片数")
+    parser.add_argument("--glyph-height", type=int, default=180, help="合成图片的字号（像素），模拟高分辨率扫描件")
+    parser.add_argument("--font", default=None, help="合成图片使用的字体，默认为 fonts 文件夹中的第一个字体")
+    parser.add_argument("--offline", action="store_true", help="只统计像素数、PNG大小和编码耗时")
+    args = parser.parse_args(argv)
+
+    if args.samples:
+        samples = load_samples(args.samples)
+    else:
+        font = args.font or os.path.join(FONTS_DIR, sorted(os.listdir(FONTS_DIR))[0])
+        samples = synthetic_samples(args.count, args.glyph_height, font)
+    print(f"共 {len(samples)} 张图片")
+
+    for backend in ("paddle", "easyocr"):
+        for name, (pixels, size, encode) in offline_stats(samples, backend).items():
+            print(f"[{backend}] 预处理{name}：平均 {pixels / 1e6:.2f} 百万像素，PNG {size / 1024:.1f} KB，"
+                  f"预处理+编码 {encode * 1000:.1f} 毫秒")
+    if args.offline:
+        return
+
+    try:
+        for backend, (profile_name, recognise) in recognisers().items():
+            for name, (median, mean, exact, accuracy) in benchmark(samples, profile_name, recognise).items():
+                print(f"[{backend}] 预处理{name}：耗时中位数 {median * 1000:.0f} 毫秒，平均 {mean * 1000:.0f} 毫秒，"
+                      f"完全正确 {exact:.1%}，字符准确率 {accuracy:.1%}")
+    finally:
+        import OCR
+        OCR.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# CPU线程预算：同时运行多个 PaddleOCR 引擎、EasyOCR/torch 子进程和渲染线程时，
+# 每个库默认都按全部核心数开线程，线程总数远超核心数，反而互相争抢变慢。
+# CpuBudget 从一个总核心数出发，统一分配每个引擎的 cpu_threads、子进程的 torch/OpenMP 线程数和渲染线程数，
+# 并可选地把每个引擎绑定到互不重叠的核心上。
+
+import multiprocessing
+import os
+import threading
+
+try:
+    import psutil  # 可选：用于在 Windows 等没有 os.sched_setaffinity 的平台上绑定核心
+except ImportError:
+    psutil = None
+
+# 子进程中需要限制线程数的数值库环境变量
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def available_cores():
+    """返回当前进程可用的核心编号列表。"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    if psutil is not None:
+        try:
+            return sorted(psutil.Process().cpu_affinity())
+        except Exception:
+            pass
+    return list(range(os.cpu_count() or 1))
+
+
+def set_affinity(pid, cores):
+    """把进程绑定到指定核心，平台不支持时忽略。pid 为0表示当前进程。"""
+    if not cores:
+        return False
+    try:
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(pid, cores)
+            return True
+        if psutil is not None:
+            psutil.Process(pid or os.getpid()).cpu_affinity(list(cores))
+            return True
+    except Exception as e:
+        print(f"无法绑定核心 {list(cores)}：{e}")
+    return False
+
+
+class CpuBudget:
+    """把 `cores` 个核心分配给识别引擎、EasyOCR 子进程和渲染线程。\n
+    `cores`: 总核心数，None为当前进程可用的全部核心。\n
+    `engines`: PaddleOCR 引擎数；`easyocr_workers`: EasyOCR 子进程数；`render_threads`: 渲染线程数。\n
+    `mkldnn`: 是否为引擎开启 MKL-DNN 加速。\n
+    `pin`: 是否把每个引擎/子进程绑定到各自的核心上。\n
+    默认引擎池、按语言和仅识别模式派生的引擎池共用同一个预算：引擎启动时用 acquire_slot 领取核心组，
+    关闭时用 release_slot 归还，重启的引擎不会绑定到仍在使用的核心上。
+    """
+
+    def __init__(self, cores=None, engines=1, easyocr_workers=0, render_threads=1, mkldnn=True, pin=False):
+        available = available_cores()
+        self.cores = available[:cores] if cores else available
+        self.engines = max(int(engines), 0)
+        self.easyocr_workers = max(int(easyocr_workers), 0)
+        self.render_threads = max(int(render_threads), 1)
+        self.mkldnn = mkldnn
+        self.pin = pin
+
+        # 渲染线程大多受GIL限制，只占用 render_threads 个核心；其余核心平均分给引擎和子进程
+        slots = self.engines + self.easyocr_workers
+        reserved = min(self.render_threads, max(len(self.cores) - slots, 0))
+        self.render_cores = self.cores[:reserved] or self.cores[:1]
+        remaining = self.cores[reserved:] or self.cores
+        self.threads_per_engine = max(len(remaining) // max(slots, 1), 1)
+        # 每个引擎/子进程对应的核心组；核心不够时循环复用
+        self.slot_cores = [[remaining[(slot * self.threads_per_engine + i) % len(remaining)]
+                            for i in range(self.threads_per_engine)] for slot in range(max(slots, 1))]
+        self.slot_users = [0] * max(self.engines, 1)  # 每个引擎核心组上正在运行的引擎数
+        self.lock = threading.Lock()
+
+    def engine_argument(self, argument=None):
+        """在引擎启动参数中加入线程数和 MKL-DNN 设置。"""
+        return dict(argument or {}, cpu_threads=self.threads_per_engine, enable_mkldnn=self.mkldnn)
+
+    def acquire_slot(self):
+        """为新启动的引擎分配核心组编号，优先使用空闲的核心组。\n
+        各引擎池的引擎总数超过 engines 时，新引擎与使用者最少的核心组共用核心，线程总数不超出预算。"""
+        with self.lock:
+            slot = min(range(len(self.slot_users)), key=self.slot_users.__getitem__)
+            self.slot_users[slot] += 1
+            return slot
+
+    def release_slot(self, slot):
+        """引擎关闭后归还它的核心组。"""
+        with self.lock:
+            self.slot_users[slot] -= 1
+
+    def engine_cores(self, index):
+        """第 index 个 PaddleOCR 引擎绑定的核心。"""
+        return self.slot_cores[index % max(self.engines, 1)]
+
+    def pin_engine(self, engine, index):
+        """绑定本地引擎进程（远程引擎和未开启绑定时忽略）。"""
+        process = getattr(engine, "ret", None)
+        if self.pin and process is not None:
+            set_affinity(process.pid, self.engine_cores(index))
+
+    def worker_initargs(self):
+        """EasyOCR 子进程池的 initializer 参数，见 init_worker。"""
+        if not self.pin:
+            return self.threads_per_engine, None, None
+        return self.threads_per_engine, self.slot_cores[self.engines:] or self.slot_cores, multiprocessing.Value("i", 0)
+
+    def summary(self):
+        return (f"CPU预算：{len(self.cores)} 核，{self.engines} 个引擎、{self.easyocr_workers} 个EasyOCR子进程"
+                f"各 {self.threads_per_engine} 线程，渲染 {self.render_threads} 线程"
+                + ("，已绑定核心" if self.pin else ""))
+
+
+def init_worker(threads, core_groups=None, counter=None):
+    """EasyOCR 子进程的初始化函数：限制 torch/OpenMP 线程数，并按需绑定核心。\n
+    `core_groups`: 可选的核心组列表；`counter`: 共享计数器，子进程按启动顺序依次选取核心组。"""
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+    except ImportError:
+        pass
+    except RuntimeError:
+        pass  # torch 已开始并行计算后不能再修改 interop 线程数
+    if core_groups and counter is not None:
+        with counter.get_lock():
+            index = counter.value
+            counter.value += 1
+        set_affinity(0, core_groups[index % len(core_groups)])
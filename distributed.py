@@ -0,0 +1,458 @@
+"""Distributed batch execution.
+
+A coordinator owns the list of inputs, the template and the batch manifest. Workers (on this
+machine or others) pull shards of tasks over HTTP, download the inputs, run the OCR + render
+pipeline with their own engine pool and upload the rendered pages. Every frame of a multi-page TIFF
+is a task of its own and is decoded only when a worker asks for it. Example with two local workers:
+
+    python distributed.py coordinator --template t.json --output out --local-workers 2 scans/*.png
+    python distributed.py worker --url http://192.168.1.10:8765 --engines 2
+"""
+import argparse
+import base64
+import collections
+import glob
+import io
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image
+import OCR
+import cpu_budget
+import ocr_router
+from augment import Augmentation
+from batch_manifest import BatchManifest
+from overlay import OVERLAY_SUFFIX, Overlay, save_overlay
+from page_source import expand_pages, open_page, page_key, page_name, page_stem
+from pipeline import render_page
+from region_template import LayoutCache, load_template, template_fingerprint
+from registration import PageRegistrar
+from renderer import HandwritingRenderer, VariantPool, stable_seed
+
+FONTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts")
+FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc')
+
+
+def output_path_for(output_folder, input_path, frame=None, overlay=False):
+    suffix = OVERLAY_SUFFIX if overlay else "_modified.png"
+    return os.path.join(output_folder, f"{page_stem(input_path, frame)}{suffix}")
+
+
+class Coordinator:
+    """Hands out shards of input pages to workers and records their results in one manifest."""
+
+    def __init__(self, input_paths, output_folder, job, shard_size=4, lease_timeout=600, max_attempts=2, reference_path=None):
+        self.pages = expand_pages([os.path.abspath(path) for path in input_paths])  # (path, frame) per task
+        self.output_folder = output_folder
+        self.job = job
+        self.shard_size = max(int(shard_size), 1)
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.reference_path = reference_path
+
+        self.lock = threading.Lock()
+        self.manifest = BatchManifest(output_folder)
+        self.manifest.start(job["seed"], template_fingerprint(job["region_pairs"]))
+        self.pending = collections.deque(
+            index for index, page in enumerate(self.pages) if not self.manifest.is_done(*page))
+        self.leases = {}  # Task index -> (worker name, lease deadline)
+        self.attempts = collections.Counter()
+        self.remaining = len(self.pending)
+        self.finished = threading.Event()
+        if self.remaining == 0:
+            self.finished.set()
+        print(f"共 {len(self.pages)} 页图片，其中 {self.remaining} 页待处理。")
+
+    def lease(self, worker):
+        """Return up to shard_size task dicts for worker; an empty list means wait or stop."""
+        with self.lock:
+            now = time.time()
+            for index, (owner, deadline) in list(self.leases.items()):
+                if deadline < now:
+                    print(f"任务 {index} 在 {owner} 上超时，重新分配。")
+                    del self.leases[index]
+                    self.pending.appendleft(index)
+            tasks = []
+            while self.pending and len(tasks) < self.shard_size:
+                index = self.pending.popleft()
+                self.leases[index] = (worker, now + self.lease_timeout)
+                path, frame = self.pages[index]
+                tasks.append({"id": index, "path": page_key(path, frame), "source": path, "frame": frame})
+            return tasks
+
+    def complete(self, index, worker, result, data):
+        with self.lock:
+            if self.leases.get(index, (None,))[0] != worker:
+                return  # Lease expired and the task was handed out again (possibly to another worker)
+            del self.leases[index]
+        # The lock only guards the lease bookkeeping; writing the output and journaling it would
+        # otherwise hold up every other worker's lease and result requests
+        path, frame = self.pages[index]
+        output_path = output_path_for(self.output_folder, path, frame, self.job.get("overlay", False))
+        temp_path = f"{output_path}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, output_path)
+        except OSError as e:
+            self.retry(index, worker, f"无法写入 {output_path}：{e}")
+            return
+        self.manifest.record(path, frame, decision="rendered", output=output_path, seed=result.get("seed"),
+                             texts=result.get("texts", []), worker=worker)
+        with self.lock:
+            self.task_done()
+            remaining = self.remaining
+        print(f"[{worker}] 完成 {page_name(path, frame)}（剩余 {remaining}）")
+
+    def fail(self, index, worker, error):
+        with self.lock:
+            if self.leases.get(index, (None,))[0] != worker:
+                return  # A late report must not fail the task of the worker that holds it now
+            del self.leases[index]
+        self.retry(index, worker, error)
+
+    def retry(self, index, worker, error):
+        """Queue a task whose lease was released again, or record it as failed after max_attempts."""
+        path, frame = self.pages[index]
+        with self.lock:
+            self.attempts[index] += 1
+            retrying = self.attempts[index] < self.max_attempts
+            if retrying:
+                self.pending.append(index)
+        if retrying:
+            print(f"[{worker}] 处理 {page_name(path, frame)} 失败，将重试：{error}")
+            return
+        print(f"[{worker}] 处理 {page_name(path, frame)} 失败：{error}")
+        self.manifest.record(path, frame, decision="failed", error=error, worker=worker)
+        with self.lock:
+            self.task_done()
+
+    def task_index(self, url_path):
+        """Return the task index at the end of a request path, or None if it does not name a task."""
+        try:
+            index = int(url_path.rsplit("/", 1)[1])
+        except ValueError:
+            return None
+        return index if 0 <= index < len(self.pages) else None
+
+    def task_done(self):
+        self.remaining -= 1
+        if self.remaining <= 0:
+            self.finished.set()
+
+    def make_server(self, host, port):
+        coordinator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def send_body(self, body, content_type="application/json", status=200):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def send_json(self, obj, status=200):
+                self.send_body(json.dumps(obj).encode("utf-8"), status=status)
+
+            def read_body(self):
+                return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            def do_GET(self):
+                if self.path == "/job":
+                    self.send_json(dict(coordinator.job, has_reference=coordinator.reference_path is not None))
+                elif self.path == "/reference" and coordinator.reference_path:
+                    with open(coordinator.reference_path, "rb") as f:
+                        self.send_body(f.read(), "application/octet-stream")
+                elif self.path.startswith("/input/"):
+                    index = coordinator.task_index(self.path)
+                    if index is None:
+                        self.send_json({"error": "not found"}, 404)
+                        return
+                    path, frame = coordinator.pages[index]
+                    if frame is None:
+                        with open(path, "rb") as f:
+                            self.send_body(f.read(), "application/octet-stream")
+                    else:
+                        # Send just this frame instead of the whole document
+                        buffer = io.BytesIO()
+                        open_page(path, frame).save(buffer, format="PNG")
+                        self.send_body(buffer.getvalue(), "image/png")
+                else:
+                    self.send_json({"error": "not found"}, 404)
+
+            def do_POST(self):
+                if self.path == "/lease":
+                    worker = json.loads(self.read_body() or b"{}").get("worker", self.client_address[0])
+                    tasks = coordinator.lease(worker)
+                    self.send_json({"tasks": tasks, "done": coordinator.finished.is_set()})
+                elif self.path.startswith("/result/"):
+                    index = coordinator.task_index(self.path)
+                    if index is None:
+                        self.send_json({"error": "not found"}, 404)
+                        return
+                    # Metadata and output travel in the JSON body: the recognised texts of a dense page
+                    # can exceed the header size limit of http.server
+                    try:
+                        body = json.loads(self.read_body() or b"{}")
+                        result = body.get("result", {})
+                        data = base64.b64decode(body.get("output", ""))
+                    except ValueError as e:
+                        self.send_json({"error": f"invalid result: {e}"}, 400)
+                        return
+                    worker = result.get("worker", self.client_address[0])
+                    if result.get("ok") and data:
+                        coordinator.complete(index, worker, result, data)
+                    else:
+                        coordinator.fail(index, worker, result.get("error", "unknown error"))
+                    self.send_json({"ok": True})
+                else:
+                    self.send_json({"error": "not found"}, 404)
+
+        return ThreadingHTTPServer((host, port), Handler)
+
+    def run(self, host="127.0.0.1", port=8765, local_workers=0, engines=1, cores=None, pin=False):
+        server = self.make_server(host, port)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://{host if host != '0.0.0.0' else '127.0.0.1'}:{server.server_address[1]}"
+        print(f"协调器已启动：{url}")
+
+        # Split the core budget between local workers so their engines do not compete for the same cores
+        core_groups = None
+        if local_workers and (cores or pin):
+            available = cpu_budget.available_cores()[:cores] if cores else cpu_budget.available_cores()
+            share = max(len(available) // local_workers, 1)
+            core_groups = [available[(i * share) % len(available):][:share] for i in range(local_workers)]
+        workers = []
+        for i in range(local_workers):
+            command = [sys.executable, os.path.abspath(__file__), "worker", "--url", url,
+                       "--engines", str(engines), "--name", f"local-{i + 1}"]
+            if core_groups:
+                command += ["--cores", str(len(core_groups[i]))] + (["--pin"] if pin else [])
+            worker = subprocess.Popen(command)
+            if core_groups and pin:
+                cpu_budget.set_affinity(worker.pid, core_groups[i])  # Inherited by the worker's engines
+            workers.append(worker)
+        try:
+            while not self.finished.wait(1):
+                if workers and all(worker.poll() is not None for worker in workers):
+                    print("所有本地工作进程都已退出，批量处理未完成。")
+                    break
+        finally:
+            # Give workers one more lease round to learn that the job is done
+            time.sleep(1)
+            server.shutdown()
+            for worker in workers:
+                try:
+                    worker.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    worker.kill()
+            self.manifest.close()
+        print(f"批量处理清单统计: {self.manifest.summary()}")
+
+
+class Worker:
+    """Pulls tasks from a coordinator and runs the OCR + render pipeline with its own engine pool."""
+
+    def __init__(self, url, engines=1, name=None, ocr_timeout=None, hedge=False, cores=None, pin=False, ocr_backend=None):
+        self.url = url.rstrip("/")
+        self.engines = max(int(engines), 1)
+        # With a core budget each engine gets its own share of threads, and one extra loop thread
+        # renders while the engines are busy with the next pages
+        self.budget = cpu_budget.CpuBudget(cores, self.engines, pin=pin) if cores or pin else None
+        self.ocr_timeout = ocr_timeout  # A page whose OCR hangs fails and is retried instead of stalling the worker
+        self.hedge = hedge
+        self.ocr_backend = ocr_backend  # Fixed ocr_router backend, None picks one per language automatically
+        self.name = name or f"{os.uname().nodename if hasattr(os, 'uname') else 'worker'}-{os.getpid()}"
+        self.local = threading.local()  # Fonts are not shared between threads
+
+    def request(self, path, body=None, headers=None):
+        req = urllib.request.Request(self.url + path, data=body, headers=headers or {})
+        with urllib.request.urlopen(req, timeout=600) as res:
+            return res.read()
+
+    def request_json(self, path, obj=None):
+        body = None if obj is None else json.dumps(obj).encode("utf-8")
+        return json.loads(self.request(path, body, {"Content-Type": "application/json"}))
+
+    def setup(self):
+        self.job = self.request_json("/job")
+        self.region_pairs = self.job["region_pairs"]
+        self.layout_cache = LayoutCache()
+        self.layout_lock = threading.Lock()
+
+        # Resolve the coordinator's font names against this machine's fonts directory
+        local_fonts = {f: os.path.join(FONTS_DIR, f) for f in os.listdir(FONTS_DIR) if f.lower().endswith(FONT_EXTENSIONS)}
+        self.font_paths = [local_fonts[f] for f in self.job["fonts"] if f in local_fonts] or sorted(local_fonts.values())
+        if not self.font_paths:
+            raise Exception(f"在 {FONTS_DIR} 中未找到任何字体文件。")
+
+        self.pool = VariantPool(self.job["variants"], self.job["seed"]) if self.job.get("variants") else None
+        self.registrar = None
+        if self.job.get("has_reference"):
+            reference = Image.open(io.BytesIO(self.request("/reference")))
+            self.registrar = PageRegistrar(reference, estimate_rotation=self.job.get("align_rotation", False))
+
+        OCR.configure(size=self.engines, timeout=self.ocr_timeout, hedge=self.hedge, budget=self.budget)
+        ocr_router.get_router().force(self.ocr_backend)
+
+    def get_renderer(self):
+        if not hasattr(self.local, "renderer"):
+            self.local.renderer = HandwritingRenderer(self.font_paths, self.job["font_size"], self.job["color"],
+                                                      wrap=self.job.get("wrap", False),
+                                                      augmentation=Augmentation.from_strength(self.job.get("augment", 0)))
+        return self.local.renderer
+
+    def process(self, task):
+        image = Image.open(io.BytesIO(self.request(f"/input/{task['id']}"))).convert("RGBA")
+        transform = self.registrar.estimate(image) if self.registrar is not None else None
+        seed = stable_seed(self.job["seed"], task["path"], 0)
+        overlay = Overlay(image.size, task.get("source"), task.get("frame")) if self.job.get("overlay") else None
+        with self.layout_lock:
+            self.layout_cache.get(self.region_pairs, *image.size)  # Compile once per resolution
+        texts = render_page(image, self.region_pairs, self.layout_cache, self.job["language"], self.get_renderer(),
+                            seed, pool=self.pool, transform=transform, name=os.path.basename(task["path"]),
+                            overlay=overlay)
+        buffer = io.BytesIO()
+        if overlay is not None:
+            save_overlay(overlay, buffer)  # Only the text layer goes back to the coordinator
+        else:
+            image.save(buffer, format="PNG")
+        return {"ok": True, "seed": seed, "texts": texts}, buffer.getvalue()
+
+    def report(self, task, result, data=b""):
+        body = {"result": dict(result, worker=self.name), "output": base64.b64encode(data).decode("ascii")}
+        self.request(f"/result/{task['id']}", json.dumps(body).encode("utf-8"), {"Content-Type": "application/json"})
+
+    def loop(self):
+        while True:
+            try:
+                lease = self.request_json("/lease", {"worker": self.name})
+            except (urllib.error.URLError, ConnectionError):
+                return  # Coordinator has shut down
+            if not lease["tasks"]:
+                if lease["done"]:
+                    return
+                time.sleep(1)  # Other workers still hold the remaining tasks
+                continue
+            for task in lease["tasks"]:
+                try:
+                    result, data = self.process(task)
+                except Exception as e:
+                    result, data = {"ok": False, "error": str(e)}, b""
+                try:
+                    self.report(task, result, data)
+                except Exception as e:
+                    # The lease runs out and the task is handed out again; keep this thread working
+                    print(f"无法报告任务 {task['id']} 的结果：{e}")
+
+    def run(self):
+        self.setup()
+        print(f"工作进程 {self.name} 已连接 {self.url}，引擎数 {self.engines}")
+        loop_threads = self.engines
+        if self.budget is not None:
+            print(self.budget.summary())
+            loop_threads += self.budget.render_threads
+        threads = [threading.Thread(target=self.loop) for _ in range(loop_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        print(f"识别后端统计: {ocr_router.get_router().summary()}")
+        OCR.close()
+
+
+def add_job_arguments(parser):
+    """Add the options describing how pages are rendered (shared with watch_folder.py)."""
+    parser.add_argument("--template", required=True, help="由“保存模板”生成的模板文件")
+    parser.add_argument("--output", required=True, help="输出文件夹")
+    parser.add_argument("--language", default="cn")
+    parser.add_argument("--font-size", type=int, default=None, help="默认为模板方框大小的85%%")
+    parser.add_argument("--color", default="black")
+    parser.add_argument("--wrap", action="store_true", help="文字过长时自动换行")
+    parser.add_argument("--augment", type=float, default=0, help="手写效果强度，0为关闭，1为最强")
+    parser.add_argument("--overlay", action="store_true", help="只保存文字层（可用 overlay.py 合成完整页面）")
+    parser.add_argument("--fonts", nargs="*", default=None, help="使用的字体文件名，默认使用 fonts 目录中的全部字体")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--variants", type=int, default=0, help="预渲染变体数，0为关闭")
+    parser.add_argument("--align", default=None, help="对齐所用的模板页图片")
+    parser.add_argument("--align-rotation", action="store_true")
+
+
+def build_job(args):
+    """Return the job dict for parsed add_job_arguments options and create the output folder.
+
+    The seed of a previous run in the same output folder is reused so that resumed runs stay reproducible.
+    """
+    template = load_template(args.template)
+    square_size = template["square_size"] or 50
+    fonts = args.fonts or sorted(f for f in os.listdir(FONTS_DIR) if f.lower().endswith(FONT_EXTENSIONS))
+    os.makedirs(args.output, exist_ok=True)
+
+    manifest_seed = BatchManifest(args.output).seed
+    seed = args.seed if args.seed is not None else manifest_seed if manifest_seed is not None else int.from_bytes(os.urandom(4), "little")
+    return {
+        "region_pairs": template["region_pairs"],
+        "language": args.language,
+        "font_size": args.font_size or int(square_size * 0.85),
+        "color": args.color,
+        "fonts": fonts,
+        "seed": seed,
+        "variants": args.variants,
+        "align_rotation": args.align_rotation,
+        "wrap": args.wrap,
+        "augment": args.augment,
+        "overlay": args.overlay,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="罚抄生成器分布式批量处理")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    coord = sub.add_parser("coordinator", help="分发任务并汇总结果")
+    coord.add_argument("inputs", nargs="+", help="输入图片（支持通配符）")
+    add_job_arguments(coord)
+    coord.add_argument("--host", default="127.0.0.1")
+    coord.add_argument("--port", type=int, default=8765)
+    coord.add_argument("--shard-size", type=int, default=4)
+    coord.add_argument("--local-workers", type=int, default=0, help="在本机启动的工作进程数")
+    coord.add_argument("--engines", type=int, default=1, help="每个本地工作进程的引擎数")
+    coord.add_argument("--cores", type=int, default=None, help="本地工作进程共用的核心数，平均分给各工作进程")
+    coord.add_argument("--pin", action="store_true", help="把每个本地工作进程及其引擎绑定到各自的核心上")
+
+    work = sub.add_parser("worker", help="从协调器领取任务并处理")
+    work.add_argument("--url", required=True)
+    work.add_argument("--engines", type=int, default=1)
+    work.add_argument("--name", default=None)
+    work.add_argument("--ocr-timeout", type=float, default=None, help="单次识别的最长秒数，超时的引擎会被关闭并重启")
+    work.add_argument("--hedge", action="store_true", help="识别慢于平时第95百分位时交给另一个引擎重试")
+    work.add_argument("--cores", type=int, default=None, help="按此核心数为每个引擎分配线程数")
+    work.add_argument("--pin", action="store_true", help="把每个引擎绑定到各自的核心上")
+    work.add_argument("--ocr-backend", choices=["paddle", "easyocr"], default=None, help="固定使用的识别后端，默认按语言自动选择")
+
+    args = parser.parse_args(argv)
+
+    if args.mode == "worker":
+        Worker(args.url, args.engines, args.name, args.ocr_timeout, args.hedge, args.cores, args.pin,
+               args.ocr_backend).run()
+        return
+
+    input_paths = []
+    for pattern in args.inputs:
+        input_paths.extend(sorted(glob.glob(pattern)) or [pattern])
+    job = build_job(args)
+    coordinator = Coordinator(input_paths, args.output, job, args.shard_size, reference_path=args.align)
+    coordinator.run(args.host, args.port, args.local_workers, args.engines, args.cores, args.pin)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,34 @@
 import tkinter as tk
-from tkinter import filedialog, font, messagebox, ttk
+from tkinter import filedialog, font, messagebox, simpledialog, ttk
 from PIL import Image, ImageTk, ImageDraw, ImageFont
 import os
 import sys
-import numpy as np
 import random
-import OCR  # Ensure OCR.py is in the same directory or properly referenced
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import OCR
+import ocr_router
+from augment import Augmentation
+from renderer import HandwritingRenderer, VariantPool, paste_patch, stable_seed
+from pipeline import draw_regions, redraw_destination, render_page
+from region_template import LayoutCache, save_template, load_template, template_fingerprint
+from grid_detect import detect_grid
+from registration import PageRegistrar
+from batch_manifest import FINISHED_DECISIONS, BatchManifest
+from overlay import Overlay, OVERLAY_SUFFIX, save_overlay
+from page_cache import PageCache
+from page_source import IMAGE_FILETYPES, expand_pages, open_page, page_key, page_name, page_stem, put_tiff_page
+from region_index import RegionIndex, is_source
+from review_policy import DEFAULT_THRESHOLD, ReviewPolicy
+from thumbnails import THUMBNAIL_SIZE, ThumbnailMaker
+
+THUMBNAIL_CELL = THUMBNAIL_SIZE[0] + 12  # Width of one page in the thumbnail strip
+# Outline colour of a thumbnail per page status
+THUMBNAIL_COLORS = {"pending": "#808080", "rendered": "#3a7bd5", "accepted": "#2e9e44", "rejected": "#d03030",
+                    "failed": "#800000"}
+OCR_BACKENDS = {"自动": None, "PaddleOCR": "paddle", "EasyOCR": "easyocr"}  # Menu entry -> ocr_router backend name
 
 class PenaltyCopyApp:
     def __init__(self, root):
@@ -22,10 +45,26 @@ class PenaltyCopyApp:
 
         # Store source and destination regions as relative ratios
         self.region_pairs = []  # Each pair: {'source': [x1_ratio, y1_ratio, x2_ratio, y2_ratio], 'destinations': [[x1_ratio, y1_ratio, x2_ratio, y2_ratio], ...]}
+        self.layout_cache = LayoutCache()  # Pixel boxes of region_pairs per image resolution
+        self.region_index = RegionIndex()  # Hit-testing over region_pairs, kept in sync by regions_changed
+
+        # Boxes selected for editing with Ctrl + left click / drag: id(box) -> (pair, box)
+        self.selected_boxes = {}
+        self.selecting = False
+        self.select_start = None
+        self.select_rect = None  # Rubber-band rectangle ID
+        self.box_action = None  # "regenerate" / "edit" while Shift + left / right clicking a box of a batch page
 
         # Store selected font file paths
         self.selected_fonts = []
-        self.loaded_fonts = {}  # Cache loaded fonts
+        self.loaded_fonts = {}  # Cache loaded fonts, keyed by (path, size)
+
+        # Render randomness: blank seed means a fresh random seed per run
+        self.seed_var = tk.StringVar(value="")
+        self.variant_count = tk.IntVar(value=0)  # 0 renders every destination individually
+        self.wrap_text = tk.BooleanVar(value=False)  # Break long texts into lines instead of only shrinking them
+        self.augment_strength = tk.IntVar(value=0)  # Handwriting augmentation, 0 (off) .. 10
+        self.variant_pool = None
 
         # Store interval between destination boxes, default is 1 pixel
         self.interval = tk.IntVar(value=1)
@@ -39,13 +78,49 @@ class PenaltyCopyApp:
         self.right_drag_direction = None  # 'horizontal' or 'vertical'
         self.right_drag_preview = []  # List of preview destination box IDs
 
+        # When enabled, right-drag selects an area in which the printed grid cells are detected
+        self.grid_detect_mode = tk.BooleanVar(value=False)
+
         # Batch processing variables
-        self.batch_images = []
+        self.batch_pages = []  # (path, frame) of every page to process, see page_source.py
         self.batch_output_folder = ""
         self.batch_current_index = 0
         self.batch_total = 0
         self.batch_temp_image = None  # Temporary image for preview during batch processing
         self.batch_original_image = None  # Original image before modifications
+        self.batch_seed = 0  # Base seed of the current batch
+        self.batch_page_seed = 0  # Seed used to render the current preview
+        self.batch_regen_count = 0  # Number of regenerations of the current page
+        self.batch_page_texts = []  # OCR results of the current page
+        self.batch_manifest = None  # Checkpoint of the running batch, see batch_manifest.py
+        self.tiff_output = tk.BooleanVar(value=True)  # Write the pages of a multi-page TIFF back into one TIFF
+        self.overlay_output = tk.BooleanVar(value=False)  # Save only the text layer of every page, see overlay.py
+        self.batch_overlay_output = False  # overlay_output as the running batch was started with
+        # Patches drawn on the current page, used to redraw single boxes and saved with overlay output;
+        # without overlay output it is dropped once the page has been decided
+        self.batch_overlay = None
+        self.page_cache = None  # Decoded originals and renders of visited pages, see page_cache.py
+        self.batch_states = {}  # Page index -> seed, texts, transform, regeneration counts and overlay of its render
+        self.batch_tiff_started = set()  # Output TIFFs written during this batch (see tiff_started_over)
+        self.batch_failed = set()  # Indices of the pages that failed during this batch
+        self.jump_var = tk.StringVar(value="")
+        self.auto_accept = tk.BooleanVar(value=False)  # Accept confident pages without review, see review_policy.py
+        self.auto_accept_threshold = tk.StringVar(value=f"{DEFAULT_THRESHOLD:.2f}")
+        self.review_policy = None
+        self.batch_page_scores = []  # OCR confidence of every region of the current page
+        self.batch_saver = None  # Writes accepted pages in the background, one at a time and in order
+        self.batch_saved = queue.Queue()  # Pages written by the saver, waiting to be recorded on the UI thread
+        self.batch_saving = set()  # Indices of the pages queued for saving and not recorded yet
+        self.batch_next_call = None  # Pending root.after call that moves on after an auto-accepted page
+        self.thumbnail_maker = None  # Background thumbnail generator of the running batch
+        self.thumbnail_images = {}  # Page index -> PhotoImage shown in the strip (kept alive here)
+        self.thumbnail_current = None  # Index highlighted as the current page in the strip
+
+        # Align every batch page to the template page before cropping and drawing
+        self.align_pages = tk.BooleanVar(value=False)
+        self.align_rotation = tk.BooleanVar(value=False)
+        self.registrar = None
+        self.batch_page_transform = None  # Transform of the current batch page
 
         # Flag to indicate if batch processing is active
         self.batch_active = False
@@ -72,6 +147,12 @@ class PenaltyCopyApp:
         self.root.bind("<Left>", self.on_arrow_key)
         self.root.bind("<Right>", self.on_arrow_key)
 
+        # Delete / deselect the boxes selected with Ctrl + left click
+        self.root.bind("<Delete>", self.delete_selected_boxes)
+        self.root.bind("<Escape>", self.clear_box_selection)
+        self.root.bind("<Prior>", self.previous_batch_page)  # Page Up / Page Down browse batch pages
+        self.root.bind("<Next>", self.next_batch_page)
+
         # Ensure the root window has focus to capture key events
         self.root.focus_set()
 
@@ -82,6 +163,21 @@ class PenaltyCopyApp:
 
         self.canvas = tk.Canvas(self.canvas_frame, bg="grey")
         self.canvas.pack(fill=tk.BOTH, expand=True)
+
+        # Thumbnail strip of the batch pages below the image; click a page to show it
+        self.thumbnail_scrollbar = tk.Scrollbar(self.canvas_frame, orient=tk.HORIZONTAL, command=self.on_thumbnail_scroll)
+        self.thumbnail_scrollbar.pack(side=tk.BOTTOM, fill=tk.X, before=self.canvas)
+        self.thumbnail_canvas = tk.Canvas(self.canvas_frame, height=THUMBNAIL_SIZE[1] + 26, bg="#404040",
+                                          xscrollcommand=self.thumbnail_scrollbar.set)
+        self.thumbnail_canvas.pack(side=tk.BOTTOM, fill=tk.X, before=self.canvas)
+        self.thumbnail_canvas.bind("<Button-1>", self.on_thumbnail_click)
+        self.thumbnail_canvas.bind("<Configure>", lambda event: self.request_visible_thumbnails())
+        if sys.platform.startswith("linux"):
+            self.thumbnail_canvas.bind("<Button-4>", lambda event: self.on_thumbnail_scroll("scroll", -1, "units"))
+            self.thumbnail_canvas.bind("<Button-5>", lambda event: self.on_thumbnail_scroll("scroll", 1, "units"))
+        else:
+            self.thumbnail_canvas.bind("<MouseWheel>", lambda event: self.on_thumbnail_scroll(
+                "scroll", -1 if event.delta > 0 else 1, "units"))
         self.canvas.bind("<Button-1>", self.on_left_press)    # Left click
         self.canvas.bind("<ButtonRelease-1>", self.on_left_release)  # Left release
         self.canvas.bind("<Button-3>", self.on_right_press)   # Right click
@@ -89,18 +185,29 @@ class PenaltyCopyApp:
         self.canvas.bind("<ButtonRelease-3>", self.on_right_release_drag)  # Right release
         self.canvas.bind("<Motion>", self.on_mouse_move)           # Mouse move
         self.canvas.bind("<Leave>", self.on_mouse_leave)           # Mouse leave
-
-        # Bind mouse wheel events
+        self.canvas.bind("<Control-Button-1>", self.on_select_press)          # Ctrl + left click selects boxes
+        self.canvas.bind("<Control-B1-Motion>", self.on_select_drag)          # Ctrl + left drag rubber-band selects
+        self.canvas.bind("<Control-ButtonRelease-1>", self.on_select_release)
+        self.canvas.bind("<Shift-Button-1>", lambda event: self.on_box_press("regenerate"))  # Shift + left click redraws a box
+        self.canvas.bind("<Shift-ButtonRelease-1>", self.on_box_release)
+        self.canvas.bind("<Shift-Button-3>", lambda event: self.on_box_press("edit"))  # Shift + right click edits its text
+        self.canvas.bind("<Shift-ButtonRelease-3>", self.on_box_release)
+
+        # Bind mouse wheel events (Ctrl + wheel resizes the selected boxes)
         if sys.platform == "darwin":
             # macOS
             self.canvas.bind("<MouseWheel>", self.on_mousewheel)
+            self.canvas.bind("<Control-MouseWheel>", self.on_resize_selected)
         elif sys.platform.startswith("linux"):
             # Linux
             self.canvas.bind("<Button-4>", self.on_mousewheel)
             self.canvas.bind("<Button-5>", self.on_mousewheel)
+            self.canvas.bind("<Control-Button-4>", self.on_resize_selected)
+            self.canvas.bind("<Control-Button-5>", self.on_resize_selected)
         else:
             # Windows
             self.canvas.bind("<MouseWheel>", self.on_mousewheel)
+            self.canvas.bind("<Control-MouseWheel>", self.on_resize_selected)
 
         # Right-side control panel
         self.control_frame = tk.Frame(self.root, padx=10, pady=10)
@@ -111,6 +218,9 @@ class PenaltyCopyApp:
         self.interval_spinbox = tk.Spinbox(self.control_frame, from_=0, to=100, width=5, textvariable=self.interval)
         self.interval_spinbox.pack(anchor='w', pady=5)
 
+        self.grid_detect_check = tk.Checkbutton(self.control_frame, text="右键框选区域自动识别格子", variable=self.grid_detect_mode)
+        self.grid_detect_check.pack(anchor='w', pady=5)
+
         # Input label and entry (kept for original functionality)
         tk.Label(self.control_frame, text="输入内容:").pack(anchor='w')
         self.text_entry = tk.Entry(self.control_frame, textvariable=self.text, width=30)
@@ -133,6 +243,13 @@ class PenaltyCopyApp:
         self.size_spinbox.bind("<FocusOut>", self.update_font_size)
         self.size_spinbox.bind("<Return>", self.update_font_size)
 
+        self.wrap_check = tk.Checkbutton(self.control_frame, text="文字过长时自动换行", variable=self.wrap_text)
+        self.wrap_check.pack(anchor='w')
+
+        tk.Label(self.control_frame, text="手写效果强度 (0为关闭):").pack(anchor='w', pady=(10, 0))
+        self.augment_spinbox = tk.Spinbox(self.control_frame, from_=0, to=10, width=5, textvariable=self.augment_strength)
+        self.augment_spinbox.pack(anchor='w', pady=5)
+
         # Font color
         tk.Label(self.control_frame, text="字体颜色:").pack(anchor='w', pady=(10, 0))
         self.color_entry = tk.Entry(self.control_frame, width=10)
@@ -150,10 +267,55 @@ class PenaltyCopyApp:
                                           command=self.update_selected_language)
         self.language_menu.pack(anchor='w', pady=5)
 
+        # Per-region language for mixed pages, applied to the boxes selected with Ctrl + click
+        tk.Label(self.control_frame, text="选中区域的OCR语言:").pack(anchor='w')
+        self.region_language = tk.StringVar(value="跟随全局")
+        self.region_language_menu = tk.OptionMenu(self.control_frame, self.region_language, "跟随全局",
+                                                  *language_options.keys(), command=self.update_region_language)
+        self.region_language_menu.pack(anchor='w', pady=5)
+
+        # OCR backend: automatic picks the fastest backend that is accurate enough for the language
+        tk.Label(self.control_frame, text="识别后端:").pack(anchor='w', pady=(10, 0))
+        self.ocr_backend = tk.StringVar(value="自动")
+        self.backend_menu = tk.OptionMenu(self.control_frame, self.ocr_backend, *OCR_BACKENDS.keys(),
+                                          command=self.update_ocr_backend)
+        self.backend_menu.pack(anchor='w', pady=5)
+
+        # Recognition-only fast path for single-line source regions
+        self.recognition_only = tk.BooleanVar(value=False)
+        self.recognition_only_check = tk.Checkbutton(self.control_frame, text="快速识别（单行区域跳过文字检测）",
+                                                     variable=self.recognition_only,
+                                                     command=lambda: OCR.set_recognition_only(self.recognition_only.get()))
+        self.recognition_only_check.pack(anchor='w')
+
+        # Render seed and variant pool size
+        tk.Label(self.control_frame, text="随机种子 (留空则随机):").pack(anchor='w', pady=(10, 0))
+        self.seed_entry = tk.Entry(self.control_frame, textvariable=self.seed_var, width=15)
+        self.seed_entry.pack(anchor='w', pady=5)
+
+        tk.Label(self.control_frame, text="预渲染变体数 (0为关闭):").pack(anchor='w', pady=(10, 0))
+        self.variant_spinbox = tk.Spinbox(self.control_frame, from_=0, to=32, width=5, textvariable=self.variant_count)
+        self.variant_spinbox.pack(anchor='w', pady=5)
+
         # OCR and copy button
         self.process_button = tk.Button(self.control_frame, text="执行OCR并复制文本", command=self.process_ocr_and_copy)
         self.process_button.pack(anchor='w', pady=(20, 0))
 
+        # Batch alignment options
+        self.align_check = tk.Checkbutton(self.control_frame, text="批量时对齐到模板页", variable=self.align_pages)
+        self.align_check.pack(anchor='w', pady=(10, 0))
+        self.align_rotation_check = tk.Checkbutton(self.control_frame, text="对齐时校正旋转/缩放", variable=self.align_rotation)
+        self.align_rotation_check.pack(anchor='w')
+        self.tiff_output_check = tk.Checkbutton(self.control_frame, text="多页TIFF输出为单个TIFF文件", variable=self.tiff_output)
+        self.tiff_output_check.pack(anchor='w')
+        self.overlay_output_check = tk.Checkbutton(self.control_frame, text="只保存文字层（可用 overlay.py 合成完整页面）",
+                                                   variable=self.overlay_output)
+        self.overlay_output_check.pack(anchor='w')
+        self.auto_accept_frame = tk.Frame(self.control_frame)
+        self.auto_accept_frame.pack(anchor='w')
+        tk.Checkbutton(self.auto_accept_frame, text="高置信度页面自动接受，阈值:", variable=self.auto_accept).pack(side=tk.LEFT)
+        tk.Entry(self.auto_accept_frame, textvariable=self.auto_accept_threshold, width=5).pack(side=tk.LEFT)
+
         # Batch apply button
         self.batch_button = tk.Button(self.control_frame, text="批量应用", command=self.batch_apply_ocr_copy, fg="blue")
         self.batch_button.pack(anchor='w', pady=(10, 0))
@@ -180,6 +342,12 @@ class PenaltyCopyApp:
         self.clear_button = tk.Button(self.control_frame, text="清除所有框选", command=self.clear_selected_regions)
         self.clear_button.pack(anchor='w', pady=(10, 0))
 
+        # Template save/load buttons
+        self.save_template_button = tk.Button(self.control_frame, text="保存模板", command=self.save_region_template)
+        self.save_template_button.pack(anchor='w', pady=(10, 0))
+        self.load_template_button = tk.Button(self.control_frame, text="加载模板", command=self.load_region_template)
+        self.load_template_button.pack(anchor='w', pady=(10, 0))
+
         # **New Batch Control Buttons**
         self.batch_control_frame = tk.Frame(self.control_frame, pady=20)
         self.batch_control_frame.pack(anchor='w', fill=tk.X)
@@ -196,6 +364,19 @@ class PenaltyCopyApp:
         self.regenerate_button = tk.Button(self.batch_control_frame, text="重新生成当前图片", command=self.regenerate_current_batch_image, state=tk.DISABLED)
         self.regenerate_button.pack(anchor='w', pady=2, fill=tk.X)
 
+        # Batch page navigation
+        self.batch_nav_frame = tk.Frame(self.batch_control_frame)
+        self.batch_nav_frame.pack(anchor='w', pady=2, fill=tk.X)
+        self.previous_button = tk.Button(self.batch_nav_frame, text="上一页", command=self.previous_batch_page, state=tk.DISABLED)
+        self.previous_button.pack(side=tk.LEFT)
+        self.next_button = tk.Button(self.batch_nav_frame, text="下一页", command=self.next_batch_page, state=tk.DISABLED)
+        self.next_button.pack(side=tk.LEFT)
+        self.jump_entry = tk.Entry(self.batch_nav_frame, textvariable=self.jump_var, width=5)
+        self.jump_entry.pack(side=tk.LEFT, padx=(5, 0))
+        self.jump_entry.bind("<Return>", self.jump_to_batch_page)
+        self.jump_button = tk.Button(self.batch_nav_frame, text="跳转", command=self.jump_to_batch_page, state=tk.DISABLED)
+        self.jump_button.pack(side=tk.LEFT)
+
         # Cancel Batch button
         self.cancel_batch_button = tk.Button(self.batch_control_frame, text="取消批量处理", command=self.cancel_batch_processing, state=tk.DISABLED)
         self.cancel_batch_button.pack(anchor='w', pady=2, fill=tk.X)
@@ -260,12 +441,39 @@ class PenaltyCopyApp:
             self.selected_language.set(language_map[selection])
             print(f"选择的OCR语言: {self.selected_language.get()}")
 
+    def update_region_language(self, selection):
+        """Set the OCR language of the region pairs of the selected boxes ("跟随全局" clears it)."""
+        language_map = {"英语": "en", "中文": "cn", "日语": "ja"}
+        pairs = {id(pair): pair for pair, _ in self.selected_boxes.values()}.values()
+        if not pairs:
+            messagebox.showwarning("警告", "请先按住 Ctrl 点击选中要设置语言的区域。")
+            self.region_language.set("跟随全局")
+            return
+        for pair in pairs:
+            if selection in language_map:
+                pair['language'] = language_map[selection]
+            else:
+                pair.pop('language', None)
+        self.regions_changed([])
+        self.update_canvas()
+        print(f"已将 {len(pairs)} 个区域的OCR语言设置为: {selection}")
+
+    def update_ocr_backend(self, selection):
+        try:
+            ocr_router.get_router().force(OCR_BACKENDS[selection])
+            print(f"识别后端: {selection}")
+        except ValueError as e:
+            messagebox.showwarning("警告", str(e))
+            self.ocr_backend.set("自动")
+            ocr_router.get_router().force(None)
+
     def load_image_initial(self):
         # Clear previous selections
         self.region_pairs = []
+        self.regions_changed()
         # Select image file
         self.image_path = filedialog.askopenfilename(title="请选择一张图片",
-                                                     filetypes=[("Image Files", "*.png;*.jpg;*.jpeg;*.bmp")])
+                                                     filetypes=IMAGE_FILETYPES)
         if not self.image_path:
             messagebox.showerror("错误", "未选择图片，程序将退出。")
             self.root.destroy()
@@ -324,15 +532,23 @@ class PenaltyCopyApp:
                 src_y1 = src[1] * self.display_size[1]
                 src_x2 = src[2] * self.display_size[0]
                 src_y2 = src[3] * self.display_size[1]
-                # Draw source region red box
-                self.canvas.create_rectangle(src_x1, src_y1, src_x2, src_y2, outline="red", width=2, tag="selection")
+                # Draw source region red box (magenta when selected)
+                selected = id(src) in self.selected_boxes
+                self.canvas.create_rectangle(src_x1, src_y1, src_x2, src_y2, outline="magenta" if selected else "red",
+                                             width=3 if selected else 2, tag="selection")
+                if pair.get('language'):
+                    # Regions with their own OCR language are labelled with it
+                    self.canvas.create_text(src_x1, src_y1 - 2, anchor=tk.SW, text=pair['language'], fill="red",
+                                            tag="selection")
             for dst in destinations:
                 dst_x1 = dst[0] * self.display_size[0]
                 dst_y1 = dst[1] * self.display_size[1]
                 dst_x2 = dst[2] * self.display_size[0]
                 dst_y2 = dst[3] * self.display_size[1]
-                # Draw destination region blue box
-                self.canvas.create_rectangle(dst_x1, dst_y1, dst_x2, dst_y2, outline="blue", width=2, tag="selection")
+                # Draw destination region blue box (magenta when selected)
+                selected = id(dst) in self.selected_boxes
+                self.canvas.create_rectangle(dst_x1, dst_y1, dst_x2, dst_y2, outline="magenta" if selected else "blue",
+                                             width=3 if selected else 2, tag="selection")
 
         # Keep the preview rectangle on top
         if self.preview_rect:
@@ -343,9 +559,122 @@ class PenaltyCopyApp:
         self.left_click_start = (event.x, event.y)
 
     def on_left_release(self, event):
+        if self.selecting:
+            # Ctrl was let go before the mouse button: finish the selection instead
+            self.on_select_release(event)
+            return
+        if self.box_action is not None:
+            # Shift was let go before the mouse button
+            self.on_box_release(event)
+            return
         # Create source region upon left mouse release
         self.create_source_region(event.x, event.y)
 
+    def on_select_press(self, event):
+        self.selecting = True
+        self.select_start = (event.x, event.y)
+
+    def on_select_drag(self, event):
+        if not self.selecting:
+            return
+        start_x, start_y = self.select_start
+        if self.select_rect is None:
+            self.select_rect = self.canvas.create_rectangle(start_x, start_y, event.x, event.y,
+                                                            outline="magenta", dash=(4, 2), width=1)
+        else:
+            self.canvas.coords(self.select_rect, start_x, start_y, event.x, event.y)
+
+    def on_select_release(self, event):
+        if not self.selecting:
+            return
+        self.selecting = False
+        start_x, start_y = self.select_start
+        width, height = self.display_size
+        if self.select_rect is not None:
+            self.canvas.delete(self.select_rect)
+            self.select_rect = None
+
+        if abs(event.x - start_x) < 3 and abs(event.y - start_y) < 3:
+            # Click: toggle the box under the cursor, or clear the selection on empty space
+            hit = self.region_index.hit(event.x / width, event.y / height)
+            if hit is None:
+                self.selected_boxes.clear()
+            elif id(hit[1]) in self.selected_boxes:
+                del self.selected_boxes[id(hit[1])]
+            else:
+                self.selected_boxes[id(hit[1])] = hit
+        else:
+            # Rubber band: add every box touching the rectangle
+            for pair, box in self.region_index.query(start_x / width, start_y / height, event.x / width, event.y / height):
+                self.selected_boxes[id(box)] = (pair, box)
+
+        self.update_canvas()
+        print(f"已选中 {len(self.selected_boxes)} 个框")
+
+    def clear_box_selection(self, event=None):
+        if self.selected_boxes:
+            self.selected_boxes.clear()
+            self.update_canvas()
+
+    def delete_selected_boxes(self, event=None):
+        if event is not None and isinstance(event.widget, (tk.Entry, tk.Spinbox)):
+            return  # Delete key inside a text field
+        if not self.selected_boxes:
+            return
+
+        # Deleting a source deletes its whole pair: destinations cannot be rendered without it
+        removed_pairs = set()
+        removed_boxes = {}  # id(pair) -> ids of the destinations to remove
+        for pair, box in self.selected_boxes.values():
+            if is_source(pair, box):
+                removed_pairs.add(id(pair))
+            else:
+                removed_boxes.setdefault(id(pair), set()).add(id(box))
+
+        removed = 0
+        kept_pairs = []
+        for pair in self.region_pairs:
+            if id(pair) in removed_pairs:
+                self.region_index.remove_pair(pair)
+                removed += 1 + len(pair['destinations'])
+                continue
+            doomed = removed_boxes.get(id(pair))
+            if doomed:
+                for dst in pair['destinations']:
+                    if id(dst) in doomed:
+                        self.region_index.remove(dst)
+                pair['destinations'] = [dst for dst in pair['destinations'] if id(dst) not in doomed]
+                removed += len(doomed)
+            kept_pairs.append(pair)
+        self.region_pairs = kept_pairs
+
+        self.selected_boxes.clear()
+        self.regions_changed(changed=[])
+        self.update_canvas()
+        print(f"已删除 {removed} 个框")
+
+    def on_resize_selected(self, event):
+        if not self.selected_boxes:
+            self.on_mousewheel(event)
+            return
+        direction = self.wheel_direction(event)
+        if direction == 0:
+            return
+        # Grow or shrink every selected box around its center by 5 display pixels
+        step_x = 2.5 * direction / self.display_size[0]
+        step_y = 2.5 * direction / self.display_size[1]
+        min_x = 5 / self.display_size[0]
+        min_y = 5 / self.display_size[1]
+        changed = []
+        for pair, box in self.selected_boxes.values():
+            center_x, center_y = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+            half_w = max(abs(box[2] - box[0]) / 2 + step_x, min_x)
+            half_h = max(abs(box[3] - box[1]) / 2 + step_y, min_y)
+            box[:] = [center_x - half_w, center_y - half_h, center_x + half_w, center_y + half_h]
+            changed.append((pair, box))
+        self.regions_changed(changed)
+        self.update_canvas()
+
     def on_right_press(self, event):
         self.right_dragging = True
         self.right_drag_start = (event.x, event.y)
@@ -360,6 +689,16 @@ class PenaltyCopyApp:
         start_x, start_y = self.right_drag_start
         end_x, end_y = current_pos
 
+        if self.grid_detect_mode.get():
+            # Rubber-band the area to search for grid cells
+            for rect_id in self.right_drag_preview:
+                self.canvas.delete(rect_id)
+            self.right_drag_preview = [self.canvas.create_rectangle(
+                start_x, start_y, end_x, end_y,
+                outline="green", dash=(4, 2), width=2
+            )]
+            return
+
         # Determine drag direction
         if self.right_drag_direction is None:
             delta_x = end_x - start_x
@@ -383,6 +722,9 @@ class PenaltyCopyApp:
         self.generate_continuous_targets(start_x, start_y, num, self.right_drag_direction)
 
     def on_right_release_drag(self, event):
+        if self.box_action is not None:
+            self.on_box_release(event)
+            return
         if not self.right_dragging:
             return
 
@@ -390,11 +732,16 @@ class PenaltyCopyApp:
         self.right_drag_start = None
         self.right_drag_direction = None
 
+        if self.grid_detect_mode.get():
+            self.add_detected_grid_targets()
+            return
+
         # Get the last pair of regions
         if not self.region_pairs:
             return
 
         last_pair = self.region_pairs[-1]
+        first_new = len(last_pair['destinations'])
 
         for rect_id in self.right_drag_preview:
             # Get box coordinates
@@ -417,9 +764,55 @@ class PenaltyCopyApp:
 
         # Clear preview list
         self.right_drag_preview.clear()
+        self.regions_changed([(last_pair, dst) for dst in last_pair['destinations'][first_new:]])
 
         print("右键拖动释放，目标方框已添加。")
 
+    def add_detected_grid_targets(self):
+        """Detect the grid cells inside the rubber-band area and add them as destinations."""
+        area_ids = list(self.right_drag_preview)
+        self.right_drag_preview.clear()
+        if not area_ids:
+            return
+        area = self.canvas.coords(area_ids[0])
+        for rect_id in area_ids:
+            self.canvas.delete(rect_id)
+
+        if not self.region_pairs:
+            messagebox.showwarning("警告", "请先用左键点击标记源区域。")
+            return
+
+        # Map the display area to original image pixels
+        img_width, img_height = self.original_image.size
+        sx = img_width / self.display_size[0]
+        sy = img_height / self.display_size[1]
+        x1, x2 = sorted((area[0], area[2]))
+        y1, y2 = sorted((area[1], area[3]))
+        x1, x2 = int(max(x1, 0) * sx), int(min(x2, self.display_size[0]) * sx)
+        y1, y2 = int(max(y1, 0) * sy), int(min(y2, self.display_size[1]) * sy)
+        if x2 - x1 < 2 or y2 - y1 < 2:
+            return
+
+        gray = np.asarray(self.original_image.crop((x1, y1, x2, y2)).convert("L"))
+        min_cell = max(int(self.square_size * min(sx, sy) * 0.5), 4)
+        cells = detect_grid(gray, min_cell=min_cell)
+        if not cells:
+            messagebox.showinfo("信息", "未在所选区域中识别到格子。")
+            return
+
+        last_pair = self.region_pairs[-1]
+        first_new = len(last_pair['destinations'])
+        for cx1, cy1, cx2, cy2 in cells:
+            last_pair['destinations'].append([
+                (x1 + cx1) / img_width,
+                (y1 + cy1) / img_height,
+                (x1 + cx2) / img_width,
+                (y1 + cy2) / img_height
+            ])
+        self.regions_changed([(last_pair, dst) for dst in last_pair['destinations'][first_new:]])
+        self.update_canvas()
+        print(f"自动识别到 {len(cells)} 个格子，已添加为目标区域。")
+
     def generate_continuous_targets(self, start_x, start_y, num, direction):
         # Clear previous previews
         for rect_id in self.right_drag_preview:
@@ -492,8 +885,8 @@ class PenaltyCopyApp:
             # Update preview rectangle position
             self.canvas.coords(self.preview_rect, x1, y1, x2, y2)
 
-    def on_mousewheel(self, event):
-        # Detect scroll direction and adjust box size
+    def wheel_direction(self, event):
+        """Return 1 for scrolling up, -1 for scrolling down and 0 otherwise."""
         if sys.platform.startswith('linux'):
             if event.num == 4:
                 delta = 1
@@ -503,6 +896,11 @@ class PenaltyCopyApp:
                 delta = 0
         else:
             delta = event.delta
+        return (delta > 0) - (delta < 0)
+
+    def on_mousewheel(self, event):
+        # Detect scroll direction and adjust box size
+        delta = self.wheel_direction(event)
 
         if delta > 0:
             self.square_size = min(self.square_size + 5, 200)  # Max limit
@@ -542,6 +940,7 @@ class PenaltyCopyApp:
 
         pair = {'source': [x1_ratio, y1_ratio, x2_ratio, y2_ratio], 'destinations': []}
         self.region_pairs.append(pair)
+        self.regions_changed([(pair, pair['source'])])
 
         self.canvas.create_rectangle(x1_display, y1_display, x2_display, y2_display, outline="red", width=2, tag="selection")
         print(f"标记源区域：中心({x}, {y}), 矩形({x1_ratio:.4f}, {y1_ratio:.4f}, {x2_ratio:.4f}, {y2_ratio:.4f})")
@@ -565,6 +964,7 @@ class PenaltyCopyApp:
         y2_ratio = y2_display / self.display_size[1]
 
         last_pair['destinations'].append([x1_ratio, y1_ratio, x2_ratio, y2_ratio])
+        self.regions_changed([(last_pair, last_pair['destinations'][-1])])
 
         self.canvas.create_rectangle(x1_display, y1_display, x2_display, y2_display, outline="blue", width=2, tag="selection")
         print(f"标记目标区域：中心({x}, {y}), 矩形({x1_ratio:.4f}, {y1_ratio:.4f}, {x2_ratio:.4f}, {y2_ratio:.4f})")
@@ -585,116 +985,19 @@ class PenaltyCopyApp:
         messagebox.showinfo("完成", "OCR 和文本复制已完成。")
 
     def process_image(self, image, image_path, display_size):
-        draw = ImageDraw.Draw(image)
-        img_width, img_height = image.size
-
-        language = self.selected_language.get()
-
-        for index, pair in enumerate(self.region_pairs, start=1):
-            src = pair['source']  # [x1_ratio, y1_ratio, x2_ratio, y2_ratio]
-            destinations = pair.get('destinations', [])
-
-            src_box = (
-                int(src[0] * img_width),
-                int(src[1] * img_height),
-                int(src[2] * img_width),
-                int(src[3] * img_height)
-            )
-            src_region = image.crop(src_box)
-
+        def show_region(index, src_region):
             # Display debug image
             self.display_debug_image(src_region, f"区域 {index} OCR 图像")
 
-            # Perform OCR
-            try:
-                ocr_text = OCR.getTextFromImage(src_region, language)
-            except Exception as e:
-                messagebox.showerror("错误", f"执行OCR时发生错误：{e}")
-                return
-
-            print(f"区域 {index} OCR 结果: {ocr_text}")
-
-            if not ocr_text:
-                messagebox.showwarning("警告", f"区域 {index} 未识别到任何文本。")
-                continue
+        try:
+            texts = self.render_page(image, os.path.basename(image_path), self.get_seed(), on_region=show_region, raise_ocr_errors=True)
+        except Exception as e:
+            messagebox.showerror("错误", f"执行OCR时发生错误：{e}")
+            return
 
-            # Get text properties
-            font_color = self.color_entry.get()
-
-            # Add OCR text to all destination regions
-            for dst_index, dst in enumerate(destinations, start=1):
-                dst_box = (
-                    int(dst[0] * img_width),
-                    int(dst[1] * img_height),
-                    int(dst[2] * img_width),
-                    int(dst[3] * img_height)
-                )
-                box_width = dst_box[2] - dst_box[0]
-                box_height = dst_box[3] - dst_box[1]
-
-                # Calculate starting position
-                text_x = dst_box[0]
-                text_y = dst_box[1]
-
-                # Draw text character by character with random font and slight variations
-                last_font = None
-                total_width = 0
-                max_text_height = 0
-
-                for char in ocr_text:
-                    # Choose a different font than the last one
-                    available_fonts = [f for f in self.selected_fonts if f != last_font]
-                    if not available_fonts:
-                        available_fonts = self.selected_fonts  # Allow repetition if all fonts used
-                    font_path = random.choice(available_fonts)
-                    last_font = font_path
-
-                    # Load font if not already loaded
-                    if font_path not in self.loaded_fonts:
-                        try:
-                            pil_font = ImageFont.truetype(font_path, self.font_size)
-                            self.loaded_fonts[font_path] = pil_font
-                        except Exception as e:
-                            print(f"无法加载字体 {font_path}：{e}")
-                            pil_font = ImageFont.load_default()
-                            self.loaded_fonts[font_path] = pil_font
-                    else:
-                        pil_font = self.loaded_fonts[font_path]
-
-                    # Get character size and apply slight random variation
-                    try:
-                        char_width, char_height = pil_font.getsize(char)
-                    except:
-                        char_width, char_height = (10, 10)  # Fallback size
-
-                    # Apply 0.05 random variation
-                    size_variation = np.random.uniform(1, 1)
-                    char_width = int(char_width * size_variation)
-                    char_height = int(char_height * size_variation)
-
-                    max_text_height = max(max_text_height, char_height)
-
-                    # Add random offset
-                    max_offset_x = box_width * 0
-                    max_offset_y = box_height * 0
-                    random_offset_x = np.random.uniform(-max_offset_x / 2, max_offset_x / 2)
-                    random_offset_y = np.random.uniform(-max_offset_y, max_offset_y)
-
-                    # Calculate character position
-                    current_x = dst_box[0] + (box_width - total_width) / 2 + random_offset_x - char_width / 2 + ocr_text.index(char) * (2*char_width)
-                    current_y = dst_box[1] + (box_height - max_text_height) / 2 + random_offset_y
-
-                    # Draw character with adjusted size
-                    try:
-                        font_with_size = pil_font.font_variant(size=int(self.font_size * size_variation))
-                        draw.text((current_x + total_width, current_y), char, font=font_with_size, fill=font_color)
-                    except Exception as e:
-                        print(f"绘制字符时发生错误：{e}")
-
-                    # Update total width
-                    total_width += char_width
-
-                print(f"文本已添加到区域 {index}-{dst_index}")
+        empty_regions = [str(index) for index, text in enumerate(texts, start=1) if not text]
+        if empty_regions:
+            messagebox.showwarning("警告", f"区域 {', '.join(empty_regions)} 未识别到任何文本。")
 
         # Update original image
         self.original_image = image
@@ -712,6 +1015,70 @@ class PenaltyCopyApp:
         # Update display canvas
         self.update_canvas()
 
+    def get_seed(self):
+        """Return the seed typed by the user, or a fresh random one if the field is blank."""
+        value = self.seed_var.get().strip()
+        if value:
+            try:
+                return int(value)
+            except ValueError:
+                return stable_seed(value)
+        return random.getrandbits(32)
+
+    def get_renderer(self):
+        try:
+            strength = int(self.augment_strength.get())
+        except (tk.TclError, ValueError):
+            strength = 0
+        return HandwritingRenderer(self.selected_fonts, self.font_size, self.color_entry.get(), font_cache=self.loaded_fonts,
+                                   wrap=self.wrap_text.get(), augmentation=Augmentation.from_strength(strength / 10))
+
+    def get_variant_pool(self, seed):
+        """Return the shared variant pool, or None when pooling is disabled."""
+        try:
+            count = int(self.variant_count.get())
+        except (tk.TclError, ValueError):
+            count = 0
+        if count <= 0:
+            self.variant_pool = None
+        elif self.variant_pool is None or self.variant_pool.variants != count or self.variant_pool.seed != seed:
+            self.variant_pool = VariantPool(count, seed)
+        return self.variant_pool
+
+    def regions_changed(self, changed=None):
+        """Must be called after every change to region_pairs so cached pixel layouts are rebuilt.
+
+        `changed` lists the (pair, box) entries that were added, moved or resized since the last call,
+        so the region index is updated incrementally; None rebuilds the index from region_pairs.
+        Removed boxes must be taken out of self.region_index by the caller.
+        """
+        self.layout_cache.invalidate()
+        if changed is None:
+            self.region_index.rebuild(self.region_pairs)
+            self.selected_boxes = {key: entry for key, entry in self.selected_boxes.items()
+                                   if key in self.region_index.entries}
+        else:
+            for pair, box in changed:
+                self.region_index.update(pair, box)
+
+    def render_page(self, image, name, seed, on_region=None, raise_ocr_errors=False, transform=None, overlay=None,
+                    scores=None):
+        """Run OCR and draw the text for every region pair onto image in place.
+
+        `transform` maps template pixels to this page (see registration.PageRegistrar).
+        `overlay` records the drawn patches for sparse output (see overlay.Overlay).
+        `scores`, when given, receives the OCR confidence of every region pair.
+        """
+        pool_seed = self.batch_seed if self.batch_active else seed
+        pool = self.get_variant_pool(pool_seed)
+        texts = render_page(image, self.region_pairs, self.layout_cache, self.selected_language.get(),
+                            self.get_renderer(), seed, pool=pool, transform=transform, name=name,
+                            on_region=on_region, raise_ocr_errors=raise_ocr_errors, overlay=overlay, scores=scores)
+        print(f"渲染种子: {seed}")
+        if pool is not None:
+            print(f"变体池: 已渲染 {pool.rendered} 个变体，共使用 {pool.sampled} 次")
+        return texts
+
     def save_image(self):
         save_path = filedialog.asksaveasfilename(defaultextension=".png",
                                                  filetypes=[("PNG Image", "*.png"),
@@ -742,6 +1109,7 @@ class PenaltyCopyApp:
 
         # Clear region pairs list
         self.region_pairs.clear()
+        self.regions_changed()
 
         # Clear selection boxes on canvas
         self.canvas.delete("selection")
@@ -752,6 +1120,45 @@ class PenaltyCopyApp:
 
         messagebox.showinfo("信息", "所有框选已清除。")
 
+    def save_region_template(self):
+        if not self.region_pairs:
+            messagebox.showwarning("警告", "没有标记任何源和目标区域。")
+            return
+
+        save_path = filedialog.asksaveasfilename(defaultextension=".json",
+                                                 filetypes=[("Template Files", "*.json")],
+                                                 title="保存模板")
+        if not save_path:
+            return
+        try:
+            save_template(save_path, self.region_pairs, self.square_size, self.interval.get(), self.layout_cache)
+            print(f"模板已保存到 {save_path}")
+        except Exception as e:
+            messagebox.showerror("错误", f"保存模板时发生错误：{e}")
+
+    def load_region_template(self):
+        load_path = filedialog.askopenfilename(title="加载模板", filetypes=[("Template Files", "*.json")])
+        if not load_path:
+            return
+        try:
+            template = load_template(load_path, self.layout_cache)
+        except Exception as e:
+            messagebox.showerror("错误", f"加载模板时发生错误：{e}")
+            return
+
+        self.region_pairs = template["region_pairs"]
+        self.region_index.rebuild(self.region_pairs)  # The layout cache was already filled by load_template
+        self.selected_boxes.clear()
+        if template["square_size"]:
+            self.square_size = template["square_size"]
+            self.font_size = int(self.square_size * 0.85)
+            self.size_var.set(str(self.font_size))
+        if template["interval"] is not None:
+            self.interval.set(template["interval"])
+
+        self.update_canvas()
+        print(f"已加载模板 {load_path}，共 {len(self.region_pairs)} 组区域")
+
     def batch_apply_ocr_copy(self):
         if not self.region_pairs:
             messagebox.showwarning("警告", "请先标记源和目标区域。")
@@ -762,11 +1169,11 @@ class PenaltyCopyApp:
             return
 
         # Select multiple images
-        self.batch_image_paths = filedialog.askopenfilenames(
+        batch_image_paths = filedialog.askopenfilenames(
             title="选择要批量处理的图片",
-            filetypes=[("Image Files", "*.png;*.jpg;*.jpeg;*.bmp")]
+            filetypes=IMAGE_FILETYPES
         )
-        if not self.batch_image_paths:
+        if not batch_image_paths:
             messagebox.showinfo("信息", "未选择任何图片。")
             return
 
@@ -776,10 +1183,43 @@ class PenaltyCopyApp:
             messagebox.showinfo("信息", "未选择输出文件夹。")
             return
 
+        # Resume from the manifest of a previous run into the same folder, if any
+        self.batch_manifest = BatchManifest(self.batch_output_folder)
+        if self.seed_var.get().strip() or self.batch_manifest.seed is None:
+            self.batch_seed = self.get_seed()
+        else:
+            self.batch_seed = self.batch_manifest.seed  # Keep results of the resumed run reproducible
+        self.batch_manifest.start(self.batch_seed, template_fingerprint(self.region_pairs))
+
         # Initialize batch processing variables
-        self.batch_total = len(self.batch_image_paths)
-        self.batch_current_index = 0
+        # Multi-page TIFFs contribute one entry per frame; frames are decoded only when they are processed
+        self.batch_pages = expand_pages(batch_image_paths)
+        self.batch_total = len(self.batch_pages)
+        self.batch_current_index = self.batch_manifest.first_unfinished(self.batch_pages)
+        if self.batch_current_index > 0:
+            print(f"已跳过前 {self.batch_current_index} 页已完成的图片，从第 {self.batch_current_index + 1} 页继续。")
+        self.registrar = None
+        if self.align_pages.get():
+            try:
+                self.registrar = PageRegistrar(Image.open(self.image_path), estimate_rotation=self.align_rotation.get())
+            except Exception as e:
+                messagebox.showwarning("警告", f"无法使用模板页进行对齐，将不做对齐：{e}")
+        self.page_cache = PageCache()
+        self.batch_overlay_output = self.overlay_output.get()
+        self.batch_states = {}
+        self.batch_tiff_started = set()
+        self.batch_failed = set()
+        self.batch_saving = set()
+        self.batch_saver = ThreadPoolExecutor(max_workers=1)
+        self.review_policy = None
+        if self.auto_accept.get():
+            try:
+                self.review_policy = ReviewPolicy(float(self.auto_accept_threshold.get()))
+            except ValueError:
+                messagebox.showwarning("警告", "置信度阈值无效，将不自动接受。")
         self.batch_active = True
+        print(f"批量处理种子: {self.batch_seed}")
+        self.start_thumbnail_strip()
 
         # Disable batch button and other controls to prevent interference
         self.batch_button.config(state=tk.DISABLED)
@@ -790,148 +1230,310 @@ class PenaltyCopyApp:
         self.accept_button.config(state=tk.NORMAL)
         self.reject_button.config(state=tk.NORMAL)
         self.regenerate_button.config(state=tk.NORMAL)  # Enable regenerate button
+        for button in (self.previous_button, self.next_button, self.jump_button):
+            button.config(state=tk.NORMAL)
 
         # Start processing the first image
         self.process_next_batch_image()
 
     def process_next_batch_image(self):
-        if self.batch_current_index >= self.batch_total:
-            # Batch processing completed
-            messagebox.showinfo("完成", f"批量处理完成。共处理 {self.batch_total} 张图片。")
-            self.batch_cleanup()
+        self.batch_next_call = None
+        if not self.batch_active:
             return
+        while True:
+            # Skip images that are already finished and unchanged since the last run
+            self.batch_current_index = self.next_unfinished_page(self.batch_current_index)
+            if self.batch_current_index >= self.batch_total:
+                # Pages left behind by jumping ahead are still undecided: go back to the first of them
+                self.batch_current_index = self.next_unfinished_page(0)
+                if self.batch_current_index >= self.batch_total and self.batch_saving:
+                    self.finish_batch_saves()  # Pages that fail to save are not counted as done
+                    self.batch_current_index = self.next_unfinished_page(0)
+                if self.batch_current_index < self.batch_total:
+                    print(f"返回第 {self.batch_current_index + 1} 页，继续处理之前跳过的页面。")
+
+            if self.batch_current_index >= self.batch_total:
+                # Batch processing completed
+                print(f"批量处理清单统计: {self.batch_manifest.summary()}")
+                print(f"识别后端统计: {ocr_router.get_router().summary()}")
+                message = f"批量处理完成。共处理 {self.batch_total} 页图片。"
+                if self.review_policy is not None:
+                    message += self.review_policy.summary() + "。"
+                messagebox.showinfo("完成", message)
+                self.batch_cleanup()
+                return
 
-        current_image_path = self.batch_image_paths[self.batch_current_index]
-        print(f"正在处理图片 {self.batch_current_index + 1}/{self.batch_total}: {current_image_path}")
+            if not self.show_batch_page(self.batch_current_index):
+                self.batch_current_index += 1  # Skip to next image
+                continue
+            if self.review_policy is None:
+                return
 
-        try:
-            # Open image
-            image = Image.open(current_image_path).convert("RGBA")
-            img_width, img_height = image.size
-            draw = ImageDraw.Draw(image)
+            # Confident pages are saved in the background and the batch moves on; the rest wait for review
+            reasons = self.review_reasons()
+            self.review_policy.count(not reasons)
+            if reasons:
+                print(f"图片需要人工审阅：{'；'.join(reasons)}（{self.review_policy.summary()}）")
+                return
+            self.accept_current_page(auto=True)
+            self.batch_current_index += 1
+            # Go on from a new Tk callback, so clicks (cancel, browsing) are handled between pages
+            self.root.update_idletasks()  # Show the page that was just accepted
+            self.schedule_batch_advance()
+            return
 
-            language = self.selected_language.get()
+    def batch_ready(self):
+        """True while the shown batch page waits for a decision (not between auto-accepted pages)."""
+        return self.batch_active and self.batch_next_call is None
+
+    def schedule_batch_advance(self):
+        self.batch_next_call = self.root.after(0, self.process_next_batch_image)
+
+    def cancel_batch_advance(self):
+        """Drop the pending move to the next page after an auto-accepted one; True if there was one."""
+        if self.batch_next_call is None:
+            return False
+        self.root.after_cancel(self.batch_next_call)
+        self.batch_next_call = None
+        return True
+
+    def next_unfinished_page(self, start):
+        """Index of the first page from start on that is not finished, being saved or failed in this run."""
+        index = self.batch_manifest.first_unfinished(self.batch_pages, start)
+        while index in self.batch_failed or index in self.batch_saving:
+            index = self.batch_manifest.first_unfinished(self.batch_pages, index + 1)
+        return index
+
+    def show_batch_page(self, index):
+        """Make page `index` the current batch page and display it.
+
+        Pages visited before are restored from the page cache, or rebuilt from their state without OCR
+        if the cache dropped them (see rebuild_batch_page); others are decoded, aligned, recognised and
+        rendered. Returns False (and records the failure) if the page could not be rendered.
+        """
+        current_image_path, frame = self.batch_pages[index]
+        name = page_name(current_image_path, frame)
+        state = self.batch_states.get(index)
+        original = rendered = None
+        if state is not None:
+            original = self.page_cache.get((index, "original"))
+            rendered = self.page_cache.get((index, "rendered"))
+            if original is None or rendered is None:
+                try:
+                    original, rendered = self.rebuild_batch_page(index, state)
+                except Exception as e:
+                    print(f"恢复图片 '{name}' 时发生错误：{e}")
+                    decision = self.batch_manifest.entry(current_image_path, frame).get("decision")
+                    if decision not in FINISHED_DECISIONS and index not in self.batch_saving:
+                        # A decided page keeps its decision; its output is already written or queued
+                        self.batch_manifest.record(current_image_path, frame, decision="failed", error=str(e))
+                        self.batch_failed.add(index)
+                        self.update_thumbnail_status(index)
+                    return False
+                self.page_cache.put((index, "original"), original, group=index)
+                self.page_cache.put((index, "rendered"), rendered, group=index)
+
+        if state is None:
+            print(f"正在处理图片 {index + 1}/{self.batch_total}: {page_key(current_image_path, frame)}")
+            try:
+                # Decode only this page
+                rendered = open_page(current_image_path, frame)
+                original = rendered.copy()  # Original image
 
-            for index, pair in enumerate(self.region_pairs, start=1):
-                src = pair['source']  # [x1_ratio, y1_ratio, x2_ratio, y2_ratio]
-                destinations = pair.get('destinations', [])
+                transform = None
+                if self.registrar is not None:
+                    transform = self.registrar.estimate(rendered)
+                    print(f"图片 '{name}' 对齐结果: {transform}")
 
-                src_box = (
-                    int(src[0] * img_width),
-                    int(src[1] * img_height),
-                    int(src[2] * img_width),
-                    int(src[3] * img_height)
-                )
-                src_region = image.crop(src_box)
+                overlay = Overlay(rendered.size, os.path.abspath(current_image_path), frame)
 
-                # Perform OCR
-                try:
-                    ocr_text = OCR.getTextFromImage(src_region, language)
-                except Exception as e:
-                    print(f"执行OCR时发生错误：{e}")
-                    ocr_text = ""
-
-                print(f"图片 '{os.path.basename(current_image_path)}' 区域 {index} OCR 结果: {ocr_text}")
-
-                if not ocr_text:
-                    print(f"警告: 图片 '{os.path.basename(current_image_path)}' 区域 {index} 未识别到任何文本。")
-                    continue
-
-                # Get text properties
-                font_color = self.color_entry.get()
-
-                # Add OCR text to all destination regions
-                for dst_index, dst in enumerate(destinations, start=1):
-                    dst_box = (
-                        int(dst[0] * img_width),
-                        int(dst[1] * img_height),
-                        int(dst[2] * img_width),
-                        int(dst[3] * img_height)
-                    )
-                    box_width = dst_box[2] - dst_box[0]
-                    box_height = dst_box[3] - dst_box[1]
-
-                    # Calculate starting position
-                    text_x = dst_box[0]
-                    text_y = dst_box[1]
-
-                    # Draw text character by character with random font and slight variations
-                    last_font = None
-                    total_width = 0
-                    max_text_height = 0
-
-                    for char in ocr_text:
-                        # Choose a different font than the last one
-                        available_fonts = [f for f in self.selected_fonts if f != last_font]
-                        if not available_fonts:
-                            available_fonts = self.selected_fonts  # Allow repetition if all fonts used
-                        font_path = random.choice(available_fonts)
-                        last_font = font_path
-
-                        # Load font if not already loaded
-                        if font_path not in self.loaded_fonts:
-                            try:
-                                pil_font = ImageFont.truetype(font_path, self.font_size)
-                                self.loaded_fonts[font_path] = pil_font
-                            except Exception as e:
-                                print(f"无法加载字体 {font_path}：{e}")
-                                pil_font = ImageFont.load_default()
-                                self.loaded_fonts[font_path] = pil_font
-                        else:
-                            pil_font = self.loaded_fonts[font_path]
-
-                        # Get character size and apply slight random variation
-                        try:
-                            char_width, char_height = pil_font.getsize(char)
-                        except:
-                            char_width, char_height = (10, 10)  # Fallback size
-
-                        # Apply 0.05 random variation
-                        size_variation = np.random.uniform(1, 1)
-                        char_width = int(char_width * size_variation)
-                        char_height = int(char_height * size_variation)
-
-                        max_text_height = max(max_text_height, char_height)
-
-                        # Add random offset
-                        max_offset_x = box_width * 0
-                        max_offset_y = box_height * 0
-                        random_offset_x = np.random.uniform(-max_offset_x / 2, max_offset_x / 2)
-                        random_offset_y = np.random.uniform(-max_offset_y, max_offset_y)
-
-                        # Calculate character position
-                        current_x = dst_box[0] + (box_width - total_width) / 2 + random_offset_x - char_width / 2 + ocr_text.index(char) * (2*char_width)
-                        current_y = dst_box[1] + (box_height - max_text_height) / 2 + random_offset_y
-
-                        # Draw character with adjusted size
-                        try:
-                            font_with_size = pil_font.font_variant(size=int(self.font_size * size_variation))
-                            draw.text((current_x + total_width, current_y), char, font=font_with_size, fill=font_color)
-                        except Exception as e:
-                            print(f"绘制字符时发生错误：{e}")
-
-                        # Update total width
-                        total_width += char_width
-
-                    print(f"文本已添加到图片 '{os.path.basename(current_image_path)}' 区域 {index}-{dst_index}")
-
-            # Store the modified image for preview
-            self.batch_temp_image = image.copy()
-            self.batch_original_image = Image.open(current_image_path).convert("RGBA")  # Original image
-
-            # Display the modified image as a preview
-            self.display_batch_preview()
+                seed = stable_seed(self.batch_seed, page_key(current_image_path, frame), 0)
+                scores = []
+                texts = self.render_page(rendered, name, seed, transform=transform, overlay=overlay, scores=scores)
+            except Exception as e:
+                print(f"处理图片 '{name}' 时发生错误：{e}")
+                self.batch_manifest.record(current_image_path, frame, decision="failed", error=str(e))
+                self.batch_failed.add(index)
+                self.update_thumbnail_status(index)
+                return False
+            state = {"seed": seed, "texts": texts, "scores": scores, "transform": transform, "regen": 0,
+                     "box_regen": 0, "overlay": overlay}
+            self.batch_states[index] = state
+            self.page_cache.put((index, "original"), original, group=index)
+            self.page_cache.put((index, "rendered"), rendered, group=index)
+
+        self.batch_current_index = index
+        self.batch_original_image = original
+        self.batch_temp_image = rendered  # The modified image for preview
+        self.batch_page_seed = state["seed"]
+        self.batch_page_texts = state["texts"]
+        self.batch_page_scores = state["scores"]
+        self.batch_page_transform = state["transform"]
+        self.batch_regen_count = state["regen"]
+        self.batch_overlay = state["overlay"]
+
+        # Display the modified image as a preview
+        self.display_batch_preview()
+        return True
+
+    def rebuild_batch_page(self, index, state):
+        """Return (original, rendered) of a visited page whose images were dropped from the page cache.
+
+        Nothing is recognised again and `state` is left as it is, so regenerated pages, redrawn boxes and
+        edited texts come back as they were: the render is composed from the page's drawing record, or
+        read back from the saved output once the record was released for an accepted page. Only a page
+        that has neither is drawn again from its stored texts and seed, without its single box redraws.
+        """
+        path, frame = self.batch_pages[index]
+        original = open_page(path, frame)
+        overlay = state["overlay"]
+        if overlay is not None:
+            rendered = original.copy()
+            for patch, x, y in overlay.placements:
+                paste_patch(rendered, patch, x, y)
+            return original, rendered
+
+        entry = self.batch_manifest.entry(path, frame)
+        output = entry.get("output")
+        if entry.get("decision") == "accepted" and output and os.path.exists(output):
+            rendered = open_page(output, frame if output.lower().endswith(".tif") else None)
+            if rendered.size == original.size:
+                return original, rendered
+
+        if state["box_regen"]:
+            print(f"图片 '{page_name(path, frame)}' 的绘制记录已释放，单独重绘的目标框按页面种子重新绘制。")
+        rendered = original.copy()
+        layout = self.layout_cache.get(self.region_pairs, *rendered.size)
+        if state["transform"] is not None:
+            layout = state["transform"].apply_layout(layout)
+        draw_regions(rendered, layout, state["texts"], self.get_renderer(), random.Random(state["seed"]),
+                     pool=self.get_variant_pool(self.batch_seed))
+        return original, rendered
+
+    def start_thumbnail_strip(self):
+        """Lay out a placeholder for every batch page and start making thumbnails in the background."""
+        self.stop_thumbnail_strip()
+        self.thumbnail_maker = ThumbnailMaker()
+        canvas = self.thumbnail_canvas
+        for index, (path, frame) in enumerate(self.batch_pages):
+            x = index * THUMBNAIL_CELL + 6
+            canvas.create_rectangle(x - 3, 3, x + THUMBNAIL_SIZE[0] + 3, THUMBNAIL_SIZE[1] + 9, width=2,
+                                    outline=THUMBNAIL_COLORS["pending"], tags=(f"border{index}",))
+            canvas.create_text(x + THUMBNAIL_SIZE[0] // 2, THUMBNAIL_SIZE[1] + 18, text=str(index + 1), fill="white")
+            self.update_thumbnail_status(index)
+        canvas.config(scrollregion=(0, 0, len(self.batch_pages) * THUMBNAIL_CELL, THUMBNAIL_SIZE[1] + 26))
+        canvas.xview_moveto(0)
+        self.request_visible_thumbnails()
+        self.poll_thumbnails()
+
+    def stop_thumbnail_strip(self):
+        if self.thumbnail_maker is not None:
+            self.thumbnail_maker.stop()
+            self.thumbnail_maker = None
+        self.thumbnail_canvas.delete("all")
+        self.thumbnail_images = {}
+        self.thumbnail_current = None
+
+    def request_visible_thumbnails(self):
+        """Ask the background maker for the pages in view (and one screen to either side)."""
+        if self.thumbnail_maker is None or not self.batch_pages:
+            return
+        first, last = self.thumbnail_canvas.xview()
+        total = len(self.batch_pages)
+        start, end = int(first * total), int(last * total) + 1
+        margin = end - start
+        for index in range(max(start - margin, 0), min(end + margin, total)):
+            self.thumbnail_maker.request(index, *self.batch_pages[index])
+
+    def poll_thumbnails(self, maker=None):
+        """Show finished thumbnails; runs on the UI thread every 100 ms while the strip is active."""
+        maker = maker or self.thumbnail_maker
+        if maker is None or maker is not self.thumbnail_maker:
+            return
+        while True:
+            try:
+                index, thumbnail = maker.results.get_nowait()
+            except queue.Empty:
+                break
+            photo = ImageTk.PhotoImage(thumbnail)
+            self.thumbnail_images[index] = photo
+            x = index * THUMBNAIL_CELL + 6 + THUMBNAIL_SIZE[0] // 2
+            self.thumbnail_canvas.create_image(x, 6 + THUMBNAIL_SIZE[1] // 2, image=photo, anchor=tk.CENTER)
+            self.thumbnail_canvas.tag_raise(f"border{index}")
+        self.root.after(100, self.poll_thumbnails, maker)
+
+    def thumbnail_status(self, index):
+        decision = self.batch_manifest.entry(*self.batch_pages[index]).get("decision")
+        if decision in ("accepted", "rejected", "failed"):
+            return decision
+        if decision == "rendered" or index in self.batch_states:
+            return "rendered"
+        return "pending"
+
+    def update_thumbnail_status(self, index):
+        if self.batch_manifest is None or not 0 <= index < len(self.batch_pages):
+            return
+        current = index == self.batch_current_index
+        self.thumbnail_canvas.itemconfig(f"border{index}", outline="yellow" if current else
+                                         THUMBNAIL_COLORS[self.thumbnail_status(index)], width=4 if current else 2)
+
+    def show_thumbnail(self, index):
+        """Scroll the strip so that page index is visible."""
+        total = len(self.batch_pages)
+        if not total:
+            return
+        first, last = self.thumbnail_canvas.xview()
+        if not first <= index / total <= last - 1 / total:
+            self.thumbnail_canvas.xview_moveto(max(index / total - (last - first) / 2, 0))
+            self.request_visible_thumbnails()
+
+    def on_thumbnail_scroll(self, *args):
+        self.thumbnail_canvas.xview(*args)
+        self.request_visible_thumbnails()
+
+    def on_thumbnail_click(self, event):
+        index = int(self.thumbnail_canvas.canvasx(event.x) // THUMBNAIL_CELL)
+        self.goto_batch_page(index)
+
+    def review_reasons(self):
+        """Reasons why the current page needs review, see review_policy.ReviewPolicy.check."""
+        layout = self.layout_cache.get(self.region_pairs, *self.batch_temp_image.size)
+        if self.batch_page_transform is not None:
+            layout = self.batch_page_transform.apply_layout(layout)
+        return self.review_policy.check(self.batch_page_texts, self.batch_page_scores, layout, self.get_renderer())
+
+    def goto_batch_page(self, index):
+        """Show another batch page without deciding on the current one."""
+        if not self.batch_active or not 0 <= index < self.batch_total or index == self.batch_current_index:
+            return
+        advancing = self.cancel_batch_advance()  # Browsing stops auto-accepting until the next decision
+        if not self.show_batch_page(index):
+            messagebox.showerror("错误", f"无法处理第 {index + 1} 页，详见控制台输出。")
+            if advancing:
+                self.schedule_batch_advance()  # The page on screen is already decided
 
-        except Exception as e:
-            print(f"处理图片 '{os.path.basename(current_image_path)}' 时发生错误：{e}")
-            self.batch_current_index += 1
-            self.process_next_batch_image()  # Skip to next image
+    def previous_batch_page(self, event=None):
+        self.goto_batch_page(self.batch_current_index - 1)
+
+    def next_batch_page(self, event=None):
+        self.goto_batch_page(self.batch_current_index + 1)
+
+    def jump_to_batch_page(self, event=None):
+        try:
+            number = int(self.jump_var.get())
+        except ValueError:
+            number = 0
+        if not 1 <= number <= self.batch_total:
+            messagebox.showwarning("警告", f"请输入 1 到 {self.batch_total} 之间的页码。")
+            return
+        self.goto_batch_page(number - 1)
 
     def display_batch_preview(self):
         try:
             # Resize image for display
             preview_size = self.display_size
-            preview_image = self.batch_temp_image.resize(preview_size, resample=self.get_resampling_filter())
+            preview_image = self.batch_temp_image.resize(preview_size, resample=self.get_resampling_filter(),
+                                                         reducing_gap=2.0)
             self.tk_image = ImageTk.PhotoImage(preview_image)
             self.canvas.delete("all")  # Clear canvas
             self.canvas.create_image(0, 0, anchor=tk.NW, image=self.tk_image)
@@ -955,55 +1557,193 @@ class PenaltyCopyApp:
 
             # Update debug info (optional)
             self.debug_canvas.delete("all")
-            self.debug_label.config(text=f"预览图片: {os.path.basename(self.batch_image_paths[self.batch_current_index])}")
+            decision = self.batch_manifest.entry(*self.batch_pages[self.batch_current_index]).get("decision", "未处理")
+            self.debug_label.config(text=f"预览图片 {self.batch_current_index + 1}/{self.batch_total}: "
+                                         f"{page_name(*self.batch_pages[self.batch_current_index])}\n"
+                                         f"种子: {self.batch_page_seed}  状态: {decision}")
             self.debug_canvas.create_image(100, 100, anchor=tk.CENTER, image=self.tk_image)
 
+            # Move the strip's highlight to this page and bring it into view
+            previous, self.thumbnail_current = self.thumbnail_current, self.batch_current_index
+            if previous is not None:
+                self.update_thumbnail_status(previous)
+            self.update_thumbnail_status(self.batch_current_index)
+            self.show_thumbnail(self.batch_current_index)
+
         except Exception as e:
             print(f"显示预览时发生错误：{e}")
 
     def accept_batch_image(self):
-        if not self.batch_active:
+        if not self.batch_ready():
             return
 
-        current_image_path = self.batch_image_paths[self.batch_current_index]
-        save_path = os.path.join(self.batch_output_folder, f"{os.path.splitext(os.path.basename(current_image_path))[0]}_modified.png")
-        try:
-            self.batch_temp_image.save(save_path)
-            print(f"图片已保存到 {save_path}")
-        except Exception as e:
-            print(f"保存图片 '{os.path.basename(current_image_path)}' 时发生错误：{e}")
+        self.accept_current_page()
 
         # Move to next image
         self.batch_current_index += 1
         self.process_next_batch_image()
 
+    def accept_current_page(self, auto=False):
+        current_image_path, frame = self.batch_pages[self.batch_current_index]
+        try:
+            save_path = self.save_batch_page(self.batch_temp_image, current_image_path, frame, decision="accepted",
+                                             seed=self.batch_page_seed, texts=self.batch_page_texts,
+                                             scores=self.batch_page_scores, auto=auto)
+            print(f"图片{'已自动接受，' if auto else ''}将保存到 {save_path}")
+        except Exception as e:
+            print(f"保存图片 '{page_name(current_image_path, frame)}' 时发生错误：{e}")
+            self.batch_manifest.record(current_image_path, frame, decision="failed", error=str(e))
+            self.batch_failed.add(self.batch_current_index)
+        self.release_drawing_record()
+
+    def release_drawing_record(self):
+        """Drop the patches of the decided current page unless they are its output."""
+        if not self.batch_overlay_output:
+            self.batch_overlay = None
+            self.batch_states[self.batch_current_index]["overlay"] = None
+
     def reject_batch_image(self):
-        if not self.batch_active:
+        if not self.batch_ready():
             return
 
         # Discard changes and move to next image
-        print(f"图片 '{os.path.basename(self.batch_image_paths[self.batch_current_index])}' 被拒绝。跳过。")
+        current_image_path, frame = self.batch_pages[self.batch_current_index]
+        print(f"图片 '{page_name(current_image_path, frame)}' 被拒绝。跳过。")
+        fields = dict(decision="rejected", seed=self.batch_page_seed, texts=self.batch_page_texts,
+                      scores=self.batch_page_scores)
+        if self.writes_tiff(frame):
+            # Keep the page numbering of the output document: the page goes in unchanged
+            try:
+                self.save_batch_page(self.batch_original_image, current_image_path, frame, **fields)
+            except Exception as e:
+                print(f"写入原页面时发生错误：{e}")
+                self.batch_manifest.record(current_image_path, frame, decision="failed", error=str(e))
+                self.batch_failed.add(self.batch_current_index)
+        else:
+            self.batch_manifest.record(current_image_path, frame, output=None, **fields)
+        self.release_drawing_record()
         self.batch_current_index += 1
         self.process_next_batch_image()
 
+    def writes_tiff(self, frame):
+        """True if the pages of the current document are collected into one output TIFF."""
+        return frame is not None and self.tiff_output.get() and not self.batch_overlay_output
+
+    def save_batch_page(self, image, path, frame, **fields):
+        """Queue a finished batch page for writing and return the output path.
+
+        With overlay output only the text layer is saved, as <name>_overlay.png. Otherwise pages of
+        a multi-page TIFF are put into <name>_modified.tif (started over only if no page of the
+        document was finished before, see tiff_started_over) or saved as <name>_pNNNN_modified.png; single images are saved as <name>_modified.png.
+        Pages are written by self.batch_saver in the order they were queued. Once a page is written
+        its manifest entry is updated with fields (see record_saved_pages), or marked failed if the
+        write raised; until then the page counts as not done.
+        """
+        overlay = self.batch_overlay
+        if self.batch_overlay_output:
+            save_path = os.path.join(self.batch_output_folder, f"{page_stem(path, frame)}{OVERLAY_SUFFIX}")
+            write = lambda: save_overlay(overlay, save_path)
+        elif self.writes_tiff(frame):
+            # Pages may be decided out of order after browsing; pages not decided yet go in unchanged
+            save_path = os.path.join(self.batch_output_folder, f"{page_stem(path)}_modified.tif")
+            new = save_path not in self.batch_tiff_started and self.tiff_started_over(path)
+            write = lambda: put_tiff_page(save_path, frame, image, lambda k: open_page(path, k), new=new)
+            self.batch_tiff_started.add(save_path)
+        else:
+            save_path = os.path.join(self.batch_output_folder, f"{page_stem(path, frame)}_modified.png")
+            write = lambda: image.save(save_path)
+        index = self.batch_current_index
+        manifest = self.batch_manifest
+        fields = dict(fields, output=save_path if fields.get("decision") == "accepted" else None)
+
+        def saved(future):
+            # Runs on the saver thread; the manifest and the strip are updated on the UI thread
+            error = future.exception()
+            self.batch_saved.put((manifest, index, path, frame, save_path, fields, error))
+            self.root.after(0, self.record_saved_pages)
+
+        self.batch_saving.add(index)
+        self.batch_saver.submit(write).add_done_callback(saved)
+        return save_path
+
+    def tiff_started_over(self, path):
+        """True if the output TIFF of document path is written from scratch by this run.
+
+        A resumed run keeps the TIFF when the manifest holds a finished page of the document, so the
+        pages decided in earlier runs stay in it and new decisions replace their pages in place.
+        """
+        return not any(self.batch_manifest.entry(page_path, frame).get("decision") in FINISHED_DECISIONS
+                       for page_path, frame in self.batch_pages if page_path == path)
+
+    def record_saved_pages(self):
+        """Record the decisions of the pages the saver has written (or failed to write)."""
+        while True:
+            try:
+                manifest, index, path, frame, save_path, fields, error = self.batch_saved.get_nowait()
+            except queue.Empty:
+                break
+            if error is None:
+                print(f"图片已保存到 {save_path}")
+                manifest.record(path, frame, **fields)
+            else:
+                print(f"保存图片 '{save_path}' 时发生错误：{error}")
+                manifest.record(path, frame, decision="failed", error=str(error))
+            if manifest is self.batch_manifest:  # Not a late page of a batch that was cancelled meanwhile
+                self.batch_saving.discard(index)
+                if error is not None:
+                    self.batch_failed.add(index)
+                self.update_thumbnail_status(index)
+
+    def finish_batch_saves(self):
+        """Wait until every queued page is written and record them."""
+        # The saver runs one task at a time, and a task's done callback runs before the next task starts,
+        # so when this no-op finishes every earlier page has been put into batch_saved
+        self.batch_saver.submit(lambda: None).result()
+        self.record_saved_pages()
+
     def cancel_batch_processing(self):
         if not self.batch_active:
             return
 
+        advancing = self.cancel_batch_advance()  # Do not move on while the question is open
         confirm = messagebox.askyesno("确认取消", "您确定要取消批量处理吗？")
         if confirm:
             self.batch_cleanup()
             messagebox.showinfo("取消", "批量处理已取消。")
+        elif advancing:
+            self.schedule_batch_advance()
 
     def batch_cleanup(self):
+        self.cancel_batch_advance()
+        if self.batch_saver is not None:
+            self.batch_saver.shutdown(wait=True)  # Finish writing the pages that were already accepted
+            self.batch_saver = None
+            self.record_saved_pages()
+        if self.batch_manifest is not None:
+            self.batch_manifest.close()
         # Reset batch variables
         self.batch_active = False
-        self.batch_images = []
+        self.batch_pages = []
         self.batch_output_folder = ""
         self.batch_current_index = 0
         self.batch_total = 0
         self.batch_temp_image = None
         self.batch_original_image = None
+        self.variant_pool = None
+        self.registrar = None
+        self.batch_page_transform = None
+        self.batch_page_texts = []
+        self.batch_manifest = None
+        self.batch_overlay = None
+        self.batch_states = {}
+        self.batch_failed = set()
+        self.batch_saving = set()
+        self.batch_page_scores = []
+        self.review_policy = None
+        if self.page_cache is not None:
+            self.page_cache.close()
+            self.page_cache = None
+        self.stop_thumbnail_strip()
 
         # Re-enable batch and process buttons
         self.batch_button.config(state=tk.NORMAL)
@@ -1014,6 +1754,8 @@ class PenaltyCopyApp:
         self.accept_button.config(state=tk.DISABLED)
         self.reject_button.config(state=tk.DISABLED)
         self.regenerate_button.config(state=tk.DISABLED)
+        for button in (self.previous_button, self.next_button, self.jump_button):
+            button.config(state=tk.DISABLED)
 
         # Reload the original image to display
         self.load_image(self.image_path)
@@ -1064,6 +1806,22 @@ class PenaltyCopyApp:
         if dx == 0 and dy == 0:
             return  # No movement
 
+        # With boxes selected, only the selection moves
+        if self.selected_boxes:
+            changed = []
+            for pair, box in self.selected_boxes.values():
+                box[:] = [
+                    min(max(box[0] + dx, 0), 1),
+                    min(max(box[1] + dy, 0), 1),
+                    min(max(box[2] + dx, 0), 1),
+                    min(max(box[3] + dy, 0), 1)
+                ]
+                changed.append((pair, box))
+            self.regions_changed(changed)
+            self.update_canvas()
+            print(f"已移动选中的 {len(changed)} 个框 {move_step} 像素。")
+            return
+
         # Determine which regions to move based on current mode
         for pair in self.region_pairs:
             # Move source regions if mode is '源区域' or '全部区域'
@@ -1089,126 +1847,40 @@ class PenaltyCopyApp:
                     new_destinations.append(new_dst)
                 pair['destinations'] = new_destinations
 
+        self.regions_changed()
+
         # Update display
         self.update_canvas()
         print(f"已向{'上' if dy < 0 else '下' if dy > 0 else ''}{'左' if dx < 0 else '右' if dx > 0 else ''}移动所有选中框 {move_step} 像素。")
 
     def regenerate_current_batch_image(self):
-        if not self.batch_active:
+        if not self.batch_ready():
             return
 
         # Reset the temp image to the original
         self.batch_temp_image = self.batch_original_image.copy()
 
-        # Reprocess the current image with the updated region_pairs
-        try:
-            image = self.batch_temp_image
-            img_width, img_height = image.size
-            draw = ImageDraw.Draw(image)
-
-            language = self.selected_language.get()
-
-            for index, pair in enumerate(self.region_pairs, start=1):
-                src = pair['source']  # [x1_ratio, y1_ratio, x2_ratio, y2_ratio]
-                destinations = pair.get('destinations', [])
-
-                src_box = (
-                    int(src[0] * img_width),
-                    int(src[1] * img_height),
-                    int(src[2] * img_width),
-                    int(src[3] * img_height)
-                )
-                src_region = image.crop(src_box)
+        # Every regeneration gets its own seed derived from the batch seed, so it can be replayed
+        self.batch_regen_count += 1
+        current_image_path, frame = self.batch_pages[self.batch_current_index]
+        self.batch_page_seed = stable_seed(self.batch_seed, page_key(current_image_path, frame), self.batch_regen_count)
 
-                # Perform OCR
-                try:
-                    ocr_text = OCR.getTextFromImage(src_region, language)
-                except Exception as e:
-                    print(f"执行OCR时发生错误：{e}")
-                    ocr_text = ""
-
-                print(f"图片 '{os.path.basename(self.batch_image_paths[self.batch_current_index])}' 区域 {index} OCR 结果: {ocr_text}")
-
-                if not ocr_text:
-                    print(f"警告: 图片 '{os.path.basename(self.batch_image_paths[self.batch_current_index])}' 区域 {index} 未识别到任何文本。")
-                    continue
-
-                # Get text properties
-                font_color = self.color_entry.get()
-
-                # Add OCR text to all destination regions
-                for dst_index, dst in enumerate(destinations, start=1):
-                    dst_box = (
-                        int(dst[0] * img_width),
-                        int(dst[1] * img_height),
-                        int(dst[2] * img_width),
-                        int(dst[3] * img_height)
-                    )
-                    box_width = dst_box[2] - dst_box[0]
-                    box_height = dst_box[3] - dst_box[1]
-
-                    # Calculate starting position
-                    text_x = dst_box[0]
-                    text_y = dst_box[1]
-
-                    # Draw text character by character with random font and slight variations
-                    last_font = None
-                    total_width = 0
-                    max_text_height = 0
-                    for char in ocr_text:
-                        # Choose a different font than the last one
-                        available_fonts = [f for f in self.selected_fonts if f != last_font]
-                        if not available_fonts:
-                            available_fonts = self.selected_fonts  # Allow repetition if all fonts used
-                        font_path = random.choice(available_fonts)
-                        last_font = font_path
-
-                        # Load font if not already loaded
-                        if font_path not in self.loaded_fonts:
-                            try:
-                                pil_font = ImageFont.truetype(font_path, self.font_size)
-                                self.loaded_fonts[font_path] = pil_font
-                            except Exception as e:
-                                print(f"无法加载字体 {font_path}：{e}")
-                                pil_font = ImageFont.load_default()
-                                self.loaded_fonts[font_path] = pil_font
-                        else:
-                            pil_font = self.loaded_fonts[font_path]
-
-                        # Get character size and apply slight random variation
-                        try:
-                            char_width, char_height = pil_font.getsize(char)
-                        except:
-                            char_width, char_height = (10, 10)  # Fallback size
-
-                        # Apply 0.05 random variation
-                        size_variation = np.random.uniform(1, 1)
-                        char_width = int(char_width * size_variation)
-                        char_height = int(char_height * size_variation)
-
-                        max_text_height = max(max_text_height, char_height)
-
-                        # Add random offset
-                        max_offset_x = box_width * 0
-                        max_offset_y = box_height * 0
-                        random_offset_x = np.random.uniform(-max_offset_x / 2, max_offset_x / 2)
-                        random_offset_y = np.random.uniform(-max_offset_y, max_offset_y)
-
-                        # Calculate character position
-                        current_x = dst_box[0] + (box_width - total_width) / 2 + random_offset_x - char_width / 2 + ocr_text.index(char) * (2*char_width)
-                        current_y = dst_box[1] + (box_height - max_text_height) / 2 + random_offset_y
-
-                        # Draw character with adjusted size
-                        try:
-                            font_with_size = pil_font.font_variant(size=int(self.font_size * size_variation))
-                            draw.text((current_x + total_width, current_y), char, font=font_with_size, fill=font_color)
-                        except Exception as e:
-                            print(f"绘制字符时发生错误：{e}")
-
-                        # Update total width
-                        total_width += char_width
-
-                    print(f"文本已添加到图片 '{os.path.basename(self.batch_image_paths[self.batch_current_index])}' 区域 {index}-{dst_index}")
+        # Reprocess the current image with the updated region_pairs; a new overlay leaves the one of an
+        # already accepted render untouched while it is being saved
+        self.batch_overlay = Overlay(self.batch_temp_image.size, os.path.abspath(current_image_path), frame)
+        try:
+            self.batch_page_scores = []
+            self.batch_page_texts = self.render_page(self.batch_temp_image, page_name(current_image_path, frame),
+                                                     self.batch_page_seed, transform=self.batch_page_transform,
+                                                     overlay=self.batch_overlay, scores=self.batch_page_scores)
+
+            # Remember the new render so browsing back to this page shows it
+            self.batch_states[self.batch_current_index] = {
+                "seed": self.batch_page_seed, "texts": self.batch_page_texts, "scores": self.batch_page_scores,
+                "transform": self.batch_page_transform, "regen": self.batch_regen_count, "box_regen": 0,
+                "overlay": self.batch_overlay}
+            self.page_cache.put((self.batch_current_index, "rendered"), self.batch_temp_image,
+                                group=self.batch_current_index)
 
             # Update the display with the modified image
             self.display_batch_preview()
@@ -1216,6 +1888,74 @@ class PenaltyCopyApp:
         except Exception as e:
             print(f"重新生成图片时发生错误：{e}")
 
+    def on_box_press(self, action):
+        self.box_action = action
+
+    def on_box_release(self, event):
+        action, self.box_action = self.box_action, None
+        if action is None or not self.batch_ready():
+            return
+        hit = self.region_index.hit(event.x / self.display_size[0], event.y / self.display_size[1])
+        if hit is not None:
+            self.regenerate_batch_box(*hit, edit=(action == "edit"))
+
+    def regenerate_batch_box(self, pair, box, edit=False):
+        """Redraw one box of the current batch page, reusing its OCR result and the rest of the render.
+
+        A destination box is redrawn on its own, a source box redraws all of its destinations. With
+        `edit` the text of the region is corrected first (and its confidence set to 1, as it was checked
+        by hand). Every redraw gets its own seed derived from the page seed.
+        """
+        index = next(i for i, candidate in enumerate(self.region_pairs) if candidate is pair)
+        if is_source(pair, box):
+            dst_indices = range(len(pair['destinations']))
+        else:
+            dst_indices = [next(i for i, dst in enumerate(pair['destinations']) if dst is box)]
+        if len(self.region_pairs) != len(self.batch_page_texts):
+            messagebox.showwarning("警告", "渲染本页后区域有增删，请使用“重新生成”重新处理整页。")
+            return
+        if self.batch_overlay is None:
+            messagebox.showwarning("警告", "本页已处理完毕，绘制记录已释放，请使用“重新生成”重新处理整页。")
+            return
+
+        text = self.batch_page_texts[index]
+        if edit:
+            text = simpledialog.askstring("修改文本", f"区域 {index + 1} 的文本：", initialvalue=text, parent=self.root)
+            if text is None:
+                return
+
+        start = time.perf_counter()
+        current_image_path, frame = self.batch_pages[self.batch_current_index]
+        state = self.batch_states[self.batch_current_index]
+        if (self.batch_manifest.entry(current_image_path, frame).get("decision")
+                or self.batch_current_index in self.batch_saving):
+            # The page may still be waiting in the saver queue: leave the queued image alone
+            self.batch_temp_image = self.batch_temp_image.copy()
+        self.batch_overlay = self.batch_overlay.copy()
+        if edit:
+            self.batch_page_texts = list(self.batch_page_texts)
+            self.batch_page_texts[index] = text
+            self.batch_page_scores = list(self.batch_page_scores)
+            self.batch_page_scores[index] = 1.0
+
+        layout = self.layout_cache.get(self.region_pairs, *self.batch_temp_image.size)
+        if self.batch_page_transform is not None:
+            layout = self.batch_page_transform.apply_layout(layout)
+        renderer = self.get_renderer()
+        dst_boxes = layout[index][1]
+        state["box_regen"] += 1
+        rng = random.Random(stable_seed(self.batch_page_seed, "box", index, state["box_regen"]))
+        for dst_index in dst_indices:
+            redraw_destination(self.batch_temp_image, self.batch_original_image, self.batch_overlay,
+                               (index, dst_index), dst_boxes[dst_index], text, renderer, rng)
+        elapsed = (time.perf_counter() - start) * 1000
+
+        state.update(texts=self.batch_page_texts, scores=self.batch_page_scores, overlay=self.batch_overlay)
+        self.page_cache.put((self.batch_current_index, "rendered"), self.batch_temp_image,
+                            group=self.batch_current_index)
+        self.display_batch_preview()
+        print(f"已重新绘制区域 {index + 1} 的 {len(dst_indices)} 个目标框，用时 {elapsed:.1f} 毫秒")
+
 if __name__ == "__main__":
     root = tk.Tk()
     app = PenaltyCopyApp(root)
@@ -0,0 +1,89 @@
+import numpy as np
+
+
+def otsu_threshold(gray):
+    """Return the Otsu threshold of a uint8 grayscale array."""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = hist.sum()
+    if total == 0:
+        return 128
+    levels = np.arange(256, dtype=np.float64)
+    weight_bg = np.cumsum(hist)
+    weight_fg = total - weight_bg
+    mean_bg = np.cumsum(hist * levels)
+    mean_total = mean_bg[-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between = (mean_total * weight_bg / total - mean_bg) ** 2 / (weight_bg * weight_fg / total)
+    between = np.nan_to_num(between)
+    return int(np.argmax(between))
+
+
+def _zeros_along(array, count, axis):
+    shape = list(array.shape)
+    shape[axis] = count
+    return np.zeros(shape, dtype=array.dtype)
+
+
+def long_runs(ink, length, axis):
+    """Mark ink pixels that belong to a straight run of at least `length` pixels along axis."""
+    n = ink.shape[axis]
+    if n < length:
+        return np.zeros_like(ink)
+    counts = np.cumsum(ink, axis=axis, dtype=np.int32)
+    counts = np.concatenate([_zeros_along(counts, 1, axis), counts], axis=axis)
+    # Window sums of `length` consecutive pixels; a full window is a line segment
+    window = counts.take(np.arange(length, n + 1), axis=axis) - counts.take(np.arange(0, n - length + 1), axis=axis)
+    full = (window == length).astype(np.int32)
+    # Spread every full window back over the pixels it covers
+    full = np.concatenate([full, _zeros_along(full, length - 1, axis)], axis=axis)
+    marks = np.cumsum(full, axis=axis, dtype=np.int32)
+    marks = np.concatenate([_zeros_along(marks, length, axis), marks], axis=axis)
+    covered = marks.take(np.arange(length, n + length), axis=axis) - marks.take(np.arange(0, n), axis=axis)
+    return covered > 0
+
+
+def find_lines(profile, ratio=0.5):
+    """Return (start, end) runs where profile exceeds ratio of its maximum."""
+    if profile.size == 0 or profile.max() <= 0:
+        return []
+    mask = np.concatenate([[False], profile >= profile.max() * ratio, [False]])
+    edges = np.flatnonzero(np.diff(mask.astype(np.int8)))
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+
+def spans_between(lines, size, min_cell):
+    """Return the (start, end) gaps between consecutive lines that look like grid cells."""
+    if len(lines) < 2:
+        return [(0, size)]
+    gaps = [(lines[i][1], lines[i + 1][0]) for i in range(len(lines) - 1)]
+    gaps = [gap for gap in gaps if gap[1] - gap[0] >= min_cell]
+    if not gaps:
+        return []
+    # Drop gaps that are far from the typical cell size (margins, ruby columns)
+    typical = np.median([end - start for start, end in gaps])
+    return [(start, end) for start, end in gaps if 0.6 * typical <= end - start <= 1.5 * typical]
+
+
+def detect_grid(gray, min_cell=8, line_ratio=0.5):
+    """Detect the cells of a printed grid in a grayscale image area.
+
+    `gray`: 2-D uint8 array of the area to search.
+    `min_cell`: smallest cell side in pixels; shorter ink runs are treated as text, not grid lines.
+    Returns cell boxes (x1, y1, x2, y2) in area pixel coordinates, row by row for areas wider than
+    tall and column by column otherwise.
+    """
+    gray = np.asarray(gray, dtype=np.uint8)
+    height, width = gray.shape
+    min_cell = max(int(min_cell), 2)
+    ink = gray <= otsu_threshold(gray)  # The threshold level itself belongs to the dark class
+
+    # Project only straight segments so that handwriting and printed text do not form lines
+    row_profile = long_runs(ink, min_cell, axis=1).sum(axis=1)
+    col_profile = long_runs(ink, min_cell, axis=0).sum(axis=0)
+
+    rows = spans_between(find_lines(row_profile, line_ratio), height, min_cell)
+    cols = spans_between(find_lines(col_profile, line_ratio), width, min_cell)
+
+    if width >= height:
+        return [(x1, y1, x2, y2) for y1, y2 in rows for x1, x2 in cols]
+    return [(x1, y1, x2, y2) for x1, x2 in cols for y1, y2 in rows]
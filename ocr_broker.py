@@ -0,0 +1,140 @@
+# 共享识别服务：一个常驻进程持有一组已预热的 PaddleOCR-json 引擎，
+# 供多个罚抄生成器实例、工作进程和渲染服务共同使用。
+# 服务端使用与 PaddleOCR-json 套接字模式相同的协议（每个连接发送一行JSON指令，返回一行JSON结果），
+# 因此客户端直接使用 PPOCR_socket 的 remote:// 模式即可连接：
+#     python ocr_broker.py --engines 2 --port 8767
+#     set FACHAO_OCR_BROKER=remote://127.0.0.1:8767   然后照常启动 fachao.py
+
+import argparse
+import collections
+import socketserver
+import threading
+from json import loads as jsonLoads, dumps as jsonDumps
+import OCR
+import cpu_budget
+
+
+class FairQueue:
+    """按客户端轮流出队的请求队列：同一客户端内先进先出，不同客户端之间轮转，
+    避免一个大批量客户端占满所有引擎。"""
+
+    def __init__(self):
+        self.queues = collections.OrderedDict()  # 客户端 -> 请求队列，顺序即轮转顺序
+        self.cond = threading.Condition()
+
+    def put(self, client, item):
+        with self.cond:
+            self.queues.setdefault(client, collections.deque()).append(item)
+            self.cond.notify()
+
+    def get(self):
+        with self.cond:
+            while not self.queues:
+                self.cond.wait()
+            client, items = next(iter(self.queues.items()))
+            item = items.popleft()
+            # 该客户端移到队尾，下一次轮到其他客户端
+            del self.queues[client]
+            if items:
+                self.queues[client] = items
+            return item
+
+    def pending(self):
+        with self.cond:
+            return {client: len(items) for client, items in self.queues.items()}
+
+
+class BrokerRequest:
+    def __init__(self, client, writeDict):
+        self.client = client
+        self.writeDict = writeDict
+        self.done = threading.Event()
+        self.result = None
+
+
+class OcrBroker:
+    def __init__(self, engines=1, argument=None, exePath=OCR.ENGINE_PATH, timeout=None, budget=None):
+        self.engines = max(int(engines), 1)
+        self.budget = budget
+        self.pool = OCR.EnginePool(self.engines, argument, exePath, timeout=timeout, budget=budget)
+        self.queue = FairQueue()
+        self.served = collections.Counter()  # 客户端 -> 已完成请求数
+        self.lock = threading.Lock()
+
+    def engine_loop(self):
+        # 每个线程对应一个引擎，引擎数即并发数
+        while True:
+            request = self.queue.get()
+            try:
+                request.result = self.pool.runDict(request.writeDict)
+            except Exception as e:
+                request.result = {"code": 902, "data": f"共享识别服务调用引擎失败：{e}"}
+            with self.lock:
+                self.served[request.client] += 1
+            request.done.set()
+
+    def handle(self, client, writeDict):
+        client = writeDict.pop("client", client)
+        if writeDict.get("broker") == "status":
+            with self.lock:
+                served = dict(self.served)
+            return {"code": 100, "data": {"engines": self.engines, "pending": self.queue.pending(), "served": served,
+                                          "latency": self.pool.stats()}}
+        if not writeDict:
+            # 客户端连接时发送的空指令，用于检测服务是否可用，无需经过引擎
+            return {"code": 200, "data": "ocr broker ready"}
+        request = BrokerRequest(client, writeDict)
+        self.queue.put(client, request)
+        request.done.wait()
+        return request.result
+
+    def serve(self, host="127.0.0.1", port=8767):
+        print(f"正在启动 {self.engines} 个识别引擎……")
+        if self.budget is not None:
+            print(self.budget.summary())
+        self.pool.warm()
+        for _ in range(self.engines):
+            threading.Thread(target=self.engine_loop, daemon=True).start()
+
+        broker = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                line = self.rfile.readline().decode("utf-8", errors="ignore")
+                try:
+                    writeDict = jsonLoads(line) if line.strip() else {}
+                except Exception as e:
+                    result = {"code": 904, "data": f"指令反序列化JSON失败：{e}"}
+                else:
+                    result = broker.handle(self.client_address[0], writeDict)
+                self.wfile.write((jsonDumps(result, ensure_ascii=True) + "\n").encode("utf-8"))
+
+        class Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        with Server((host, port), Handler) as server:
+            print(f"共享识别服务已启动：remote://{host}:{server.server_address[1]}")
+            try:
+                server.serve_forever()
+            finally:
+                self.pool.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="罚抄生成器共享识别服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址，默认仅本机")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--engines", type=int, default=1, help="常驻引擎数量")
+    parser.add_argument("--config", default=OCR.DEFAULT_ARGUMENT["config_path"], help="引擎配置文件（相对于引擎目录）")
+    parser.add_argument("--exe", default=OCR.ENGINE_PATH, help="PaddleOCR-json 可执行文件路径")
+    parser.add_argument("--timeout", type=float, default=None, help="单次识别的最长秒数，超时的引擎会被关闭并重启")
+    parser.add_argument("--cores", type=int, default=None, help="按此核心数为每个引擎分配线程数")
+    parser.add_argument("--pin", action="store_true", help="把每个引擎绑定到各自的核心上")
+    args = parser.parse_args(argv)
+    budget = cpu_budget.CpuBudget(args.cores, args.engines, pin=args.pin) if args.cores or args.pin else None
+    OcrBroker(args.engines, {"config_path": args.config}, args.exe, args.timeout, budget).serve(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# 识别前的图片预处理：去掉透明通道、转为灰度，并把过大的源区域缩小到识别模型需要的尺寸。
+# 高分辨率扫描件裁出的源区域往往比识别模型需要的大很多倍，
+# 缩小后PNG编码、进程间传输和推理的耗时都随像素数下降。
+# 默认参数对耗时和准确率的影响可用 bench_preprocess.py 在本机的引擎上测量。
+
+import numpy as np
+from PIL import Image
+
+# 各识别后端的预处理参数：
+#   text_height: 最矮的一行文字缩放到的像素高度（只缩小不放大），None为不按字高缩放
+#   limit_side_len: 图片长边上限，与引擎的同名参数含义一致，None为不限制
+#   gray: 是否转为灰度图
+PROFILES = {
+    # PP-OCR 识别模型输入高度为48，保留一些余量给检测模型
+    "paddle": {"text_height": 64, "limit_side_len": 960, "gray": True},
+    # EasyOCR 默认把图片长边限制在2560以内
+    "easyocr": {"text_height": 64, "limit_side_len": 2560, "gray": True},
+}
+
+
+def set_profile(backend, **options):
+    """修改某个识别后端的预处理参数，例如 set_profile("paddle", text_height=48)。"""
+    profile = PROFILES.setdefault(backend, {"text_height": None, "limit_side_len": None, "gray": True})
+    unknown = set(options) - {"text_height", "limit_side_len", "gray"}
+    if unknown:
+        raise ValueError(f"未知的预处理参数：{sorted(unknown)}")
+    profile.update(options)
+
+
+def flatten(image, gray=True):
+    """把透明部分合成到白底上，返回 L（灰度）或 RGB 图片。"""
+    mode = "L" if gray else "RGB"
+    if image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    return image if image.mode == mode else image.convert(mode)
+
+
+def ink_rows(gray):
+    """返回灰度图（图片或二维数组）中含有墨迹的行（布尔数组）和墨迹掩码。"""
+    pixels = np.asarray(gray, dtype=np.uint8)
+    if pixels.size == 0:
+        return np.zeros(0, dtype=bool), np.zeros((0, 0), dtype=bool)
+    ink = pixels < min(int(pixels.mean()) - 40, 160)  # 比纸面明显更暗的像素视为墨迹
+    return ink.sum(axis=1) > max(1, ink.shape[1] // 100), ink
+
+
+def text_bands(rows):
+    """返回被空白行隔开的各条文字墨迹带的高度；低于最高墨迹带40%的标点等矮墨迹带不计入。"""
+    if not rows.any():
+        return np.zeros(0, dtype=int)
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], rows.astype(np.int8), [0]])))
+    heights = edges[1::2] - edges[::2]
+    return heights[heights >= max(heights.max() * 0.4, 2)]
+
+
+def text_height(gray):
+    """估计灰度图中最矮一行文字的像素高度，没有墨迹时返回None。\n
+    按最矮的一行缩放，保证图中的小字缩小后仍然清晰。"""
+    bands = text_bands(ink_rows(gray)[0])
+    return int(bands.min()) if bands.size else None
+
+
+def scale_for(gray, backend="paddle"):
+    """按后端的预处理参数计算缩放比例（不大于1）。`gray`: 灰度图片或二维数组。"""
+    profile = PROFILES.get(backend, {})
+    size = gray.shape if isinstance(gray, np.ndarray) else gray.size
+    scale = 1.0
+    if profile.get("text_height"):
+        height = text_height(gray)
+        if height:
+            scale = min(scale, profile["text_height"] / height)
+    if profile.get("limit_side_len") and max(size):
+        scale = min(scale, profile["limit_side_len"] / max(size))
+    return scale
+
+
+def prepare(image, backend="paddle"):
+    """按后端的预处理参数处理一张源区域图片，返回可直接送入识别引擎的图片。"""
+    profile = PROFILES.get(backend, {})
+    gray = flatten(image, True)
+    image = gray if profile.get("gray", True) else flatten(image, False)
+
+    scale = scale_for(gray, backend)
+    if scale < 1.0:
+        size = (max(round(image.width * scale), 1), max(round(image.height * scale), 1))
+        image = image.resize(size, Image.BOX)  # 缩小时按面积取平均，笔画不会断裂
+    return image
@@ -0,0 +1,174 @@
+# 识别后端路由：按语言把识别请求交给 PaddleOCR 或 EasyOCR。
+# 每个 (后端, 语言) 记录最近若干次识别的单张耗时和置信度，优先使用近期平均置信度达到下限的后端中最快的一个；
+# 没有后端达到下限时使用平均置信度最高的后端。每隔若干次请求会把一次请求交给其他后端，使统计保持最新。
+# 两个后端的置信度刻度并不完全一致，下限只用于排除明显不适合该语言的后端。
+
+import importlib.util
+import threading
+import time
+from collections import deque
+import OCR
+
+ACCURACY_FLOOR = 0.85  # 近期平均置信度低于此值的后端不优先使用
+STATS_WINDOW = 50  # 每个 (后端, 语言) 统计最近多少次请求
+MIN_SAMPLES = 5  # 样本数不足时不根据统计选择
+EXPLORE_EVERY = 100  # 每种语言每隔多少次请求试用一次其他后端，0为不试用
+
+
+class PaddleBackend:
+    """PaddleOCR-json 引擎池，每种语言使用对应的模型配置（见 OCR.get_pool）。"""
+    name = "paddle"
+    languages = set(OCR.LANGUAGE_CONFIGS)
+
+    def available(self):
+        return True
+
+    def recognise(self, images, language, page=None, boxes=None):
+        if OCR.recognitionOnly:
+            return OCR.getResultsFromLines(images, language)
+        results = []
+        for image in images:
+            try:
+                results.append(OCR.getResultFromImage(image, language))
+            except Exception as e:
+                results.append(e)  # 只影响这一张图片
+        return results
+
+
+class EasyOcrBackend:
+    """EasyOCR，未安装 easyocr 时不可用；首次使用时才导入并加载模型。"""
+    name = "easyocr"
+    languages = {"cn", "en", "ja"}
+
+    def available(self):
+        return importlib.util.find_spec("easyocr") is not None
+
+    def recognise(self, images, language, page=None, boxes=None):
+        import OCR_EasyOCR
+        if page is not None:
+            # 整页只写入共享内存一次，子进程直接切出各源区域，见 OCR_EasyOCR.getResultsFromPage_EasyOCR
+            return OCR_EasyOCR.getResultsFromPage_EasyOCR(page, boxes, language)
+        return [OCR_EasyOCR.getResultFromImage_EasyOCR(image, language) for image in images]
+
+
+class OcrRouter:
+    """按语言选择识别后端并统计各后端的耗时和置信度。可在多个线程中同时使用。\n
+    `backends`: 按优先级排列的后端，统计不足时优先使用靠前的后端。\n
+    `floor`: 平均置信度下限。`explore_every`: 见 EXPLORE_EVERY。"""
+
+    def __init__(self, backends=None, floor=ACCURACY_FLOOR, window=STATS_WINDOW, explore_every=EXPLORE_EVERY):
+        backends = backends if backends is not None else [PaddleBackend(), EasyOcrBackend()]
+        self.backends = [backend for backend in backends if backend.available()]
+        self.floor = floor
+        self.window = window
+        self.explore_every = explore_every
+        self.forced = None  # 固定使用的后端名称，None为自动选择
+        self.samples = {}  # (后端名称, 语言) -> deque[(单张耗时秒数, 置信度)]
+        self.warmed = set()  # 已完成第一次请求的 (后端名称, 语言)，第一次包含加载模型的时间，不计入统计
+        self.requests = {}  # 语言 -> 请求次数
+        self.lock = threading.Lock()
+
+    def force(self, name):
+        """固定使用名为 `name` 的后端（"paddle" 或 "easyocr"），None 恢复自动选择。"""
+        if name is not None and name not in [backend.name for backend in self.backends]:
+            raise ValueError(f"识别后端 {name} 不可用。")
+        self.forced = name
+
+    def summarise(self, name, language):
+        """返回 (样本数, 平均耗时, 平均置信度)，没有样本时后两项为None。"""
+        samples = list(self.samples.get((name, language), ()))
+        if not samples:
+            return 0, None, None
+        return (len(samples), sum(latency for latency, _ in samples) / len(samples),
+                sum(score for _, score in samples) / len(samples))
+
+    def candidates(self, language):
+        """返回本次请求依次尝试的后端，第一个为首选，其余在首选出错时依次使用。"""
+        supported = [backend for backend in self.backends if language in backend.languages] or self.backends[:1]
+        if self.forced is not None:
+            forced = [backend for backend in supported if backend.name == self.forced]
+            return forced + [backend for backend in supported if backend.name != self.forced]
+
+        with self.lock:
+            count = self.requests[language] = self.requests.get(language, 0) + 1
+            stats = {backend.name: self.summarise(backend.name, language) for backend in supported}
+
+        measured = [backend for backend in supported if stats[backend.name][0] >= MIN_SAMPLES]
+        good = [backend for backend in measured if stats[backend.name][2] >= self.floor]
+        if good:
+            best = min(good, key=lambda backend: stats[backend.name][1])
+        else:
+            # 还没有后端达到下限：先按优先级试用样本不足的后端，都试过后取置信度最高的
+            unmeasured = [backend for backend in supported if backend not in measured]
+            best = unmeasured[0] if unmeasured else max(measured, key=lambda backend: stats[backend.name][2])
+        others = [backend for backend in supported if backend is not best]
+        if others and self.explore_every and count % self.explore_every == 0:
+            best = min(others, key=lambda backend: stats[backend.name][0])  # 试用样本最少的其他后端
+            others = [backend for backend in supported if backend is not best]
+        return [best] + others
+
+    def recognise(self, images, language, page=None, boxes=None):
+        """识别多张图片，返回与输入一一对应的 (文本, 置信度) 列表，单张图片出错时对应位置为该异常。\n
+        `page`, `boxes`: 可选的整页图片和各图片在页面上的源区域框，支持的后端直接从整页切出源区域。\n
+        首选后端出错（或所有图片都出错）时依次改用其他支持该语言的后端，全部出错时抛出最后一个异常。"""
+        if not images:
+            return []
+        error = None
+        for backend in self.candidates(language):
+            started = time.monotonic()
+            try:
+                results = backend.recognise(images, language, page, boxes)
+                errors = [result for result in results if isinstance(result, Exception)]
+                if len(errors) == len(results):
+                    raise errors[0]
+            except Exception as e:
+                print(f"识别后端 {backend.name} 出错：{e}")
+                error = e
+                continue
+            # 空白区域和识别失败的结果置信度为0，不反映后端对该语言的准确率，不计入统计
+            self.record(backend.name, language, (time.monotonic() - started) / len(images),
+                        [result[1] for result in results
+                         if not isinstance(result, Exception) and result[0] and result[1] > 0])
+            return results
+        raise error
+
+    def record(self, name, language, latency, scores):
+        with self.lock:
+            key = (name, language)
+            if key not in self.warmed:
+                self.warmed.add(key)
+                return
+            samples = self.samples.setdefault(key, deque(maxlen=self.window))
+            for score in scores:
+                samples.append((latency, score))
+
+    def stats(self):
+        """返回 {(后端名称, 语言): {"samples", "latency", "score"}}。"""
+        with self.lock:
+            keys = list(self.samples)
+            return {key: dict(zip(("samples", "latency", "score"), self.summarise(*key))) for key in keys}
+
+    def summary(self):
+        lines = []
+        for (name, language), stat in sorted(self.stats().items()):
+            if stat["samples"]:
+                lines.append(f"{name}/{language}: {stat['samples']} 张，平均 {stat['latency'] * 1000:.0f} 毫秒，"
+                             f"平均置信度 {stat['score']:.2f}")
+        return "；".join(lines) or "暂无识别统计"
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = OcrRouter()
+        return _router
+
+
+def recognise(images, language, page=None, boxes=None):
+    """用默认路由识别多张图片，见 OcrRouter.recognise。"""
+    return get_router().recognise(images, language, page, boxes)
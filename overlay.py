@@ -0,0 +1,166 @@
+"""Sparse page output: the rendered text layer of a page instead of a full copy of it.
+
+While a page is drawn, every pasted patch is recorded with its position in an Overlay (see
+renderer.HandwritingRenderer.draw_text). save_overlay packs the distinct patches into one RGBA atlas
+and writes it as a single PNG whose text chunk holds the page size, the source page and where each
+patch goes. compose_overlay pastes the patches onto the original page again in drawing order, which
+reproduces the rendered page exactly. Full pages can be materialised on demand:
+
+    python overlay.py out/*_overlay.png --output composed
+"""
+import argparse
+import glob
+import json
+import math
+import os
+from PIL import Image, PngImagePlugin
+from page_source import open_page
+from renderer import paste_patch
+
+OVERLAY_KEY = "fachao-overlay"  # PNG text chunk holding the placement metadata
+OVERLAY_VERSION = 1
+OVERLAY_SUFFIX = "_overlay.png"
+
+
+class Overlay:
+    """Text layer of one page: the patches drawn onto it and where they were pasted."""
+
+    def __init__(self, size, source=None, frame=None):
+        self.size = tuple(size)
+        self.source = source  # Original page the overlay belongs to, see page_source.open_page
+        self.frame = frame
+        self.placements = []  # (patch, x, y) in drawing order
+        self.keys = []  # Destination each placement was drawn for, see pipeline.apply_regions
+
+    def add(self, patch, x, y, key=None):
+        self.placements.append((patch, x, y))
+        self.keys.append(key)
+
+    def clear(self):
+        self.placements.clear()
+        self.keys.clear()
+
+    def copy(self):
+        """Return an overlay with the same placements that can be changed independently."""
+        overlay = Overlay(self.size, self.source, self.frame)
+        overlay.placements = list(self.placements)
+        overlay.keys = list(self.keys)
+        return overlay
+
+    def replace(self, key, placements):
+        """Replace the placements drawn for key, keeping their place in the drawing order."""
+        indices = [i for i, placement_key in enumerate(self.keys) if placement_key == key]
+        position = indices[0] if indices else len(self.placements)
+        for i in reversed(indices):
+            del self.placements[i], self.keys[i]
+        self.placements[position:position] = placements
+        self.keys[position:position] = [key] * len(placements)
+
+
+def pack(sizes):
+    """Shelf-pack rectangles, tallest first, into a roughly square atlas.
+
+    Returns ((width, height) of the atlas, [(x, y) of every rectangle]).
+    """
+    if not sizes:
+        return (1, 1), []
+    area = sum(width * height for width, height in sizes)
+    atlas_width = max(max(width for width, _ in sizes), int(math.sqrt(area) * 1.1) + 1)
+    positions = [None] * len(sizes)
+    x = y = shelf = 0
+    for index in sorted(range(len(sizes)), key=lambda i: -sizes[i][1]):
+        width, height = sizes[index]
+        if x + width > atlas_width:
+            x, y, shelf = 0, y + shelf, 0
+        positions[index] = (x, y)
+        x += width
+        shelf = max(shelf, height)
+    return (atlas_width, max(y + shelf, 1)), positions
+
+
+def save_overlay(overlay, path):
+    """Write overlay as one atlas PNG. Patches reused from a variant pool are stored once."""
+    patches = []
+    indices = {}  # id(patch) -> atlas index; the patches stay alive in overlay.placements
+    placements = []
+    for patch, x, y in overlay.placements:
+        index = indices.setdefault(id(patch), len(patches))
+        if index == len(patches):
+            patches.append(patch)
+        placements.append([index, int(x), int(y)])
+
+    atlas_size, positions = pack([patch.size for patch in patches])
+    atlas = Image.new("RGBA", atlas_size, (0, 0, 0, 0))
+    for patch, position in zip(patches, positions):
+        atlas.paste(patch, position)
+
+    metadata = {
+        "version": OVERLAY_VERSION,
+        "size": list(overlay.size),
+        "source": overlay.source,
+        "frame": overlay.frame,
+        "patches": [[x, y, patch.width, patch.height] for patch, (x, y) in zip(patches, positions)],
+        "placements": placements,
+    }
+    info = PngImagePlugin.PngInfo()
+    info.add_text(OVERLAY_KEY, json.dumps(metadata, ensure_ascii=False, separators=(",", ":")))
+    atlas.save(path, format="PNG", pnginfo=info)
+
+
+def load_overlay(path):
+    """Return (metadata, atlas image) of an overlay file."""
+    with Image.open(path) as image:
+        text = getattr(image, "text", {}).get(OVERLAY_KEY)
+        if text is None:
+            raise ValueError(f"'{os.path.basename(path)}' 不是文字层文件。")
+        metadata = json.loads(text)
+        if metadata.get("version") != OVERLAY_VERSION:
+            raise ValueError(f"文字层文件版本不匹配（{metadata.get('version')}）。")
+        return metadata, image.convert("RGBA")
+
+
+def compose_overlay(path, base=None, source_dir=None):
+    """Return the rendered page: the overlay at path pasted onto base.
+
+    Without `base` the original page recorded in the overlay is opened; `source_dir` looks for it
+    by file name in another folder (e.g. after the originals were archived elsewhere).
+    """
+    metadata, atlas = load_overlay(path)
+    if base is None:
+        source = metadata["source"]
+        if source_dir:
+            source = os.path.join(source_dir, os.path.basename(source))
+        base = open_page(source, metadata["frame"])
+    if list(base.size) != metadata["size"]:
+        raise ValueError(f"原图尺寸 {base.size} 与文字层尺寸 {tuple(metadata['size'])} 不一致。")
+    base = base.convert("RGBA") if base.mode != "RGBA" else base
+    patches = [atlas.crop((x, y, x + width, y + height)) for x, y, width, height in metadata["patches"]]
+    for index, x, y in metadata["placements"]:
+        paste_patch(base, patches[index], x, y)
+    return base
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="把文字层文件合成为完整页面")
+    parser.add_argument("overlays", nargs="+", help="文字层文件（支持通配符）")
+    parser.add_argument("--output", required=True, help="输出文件夹")
+    parser.add_argument("--source-dir", default=None, help="原图所在文件夹，默认使用文字层中记录的原图路径")
+    args = parser.parse_args(argv)
+
+    paths = []
+    for pattern in args.overlays:
+        paths.extend(sorted(glob.glob(pattern)) or [pattern])
+    os.makedirs(args.output, exist_ok=True)
+    for path in paths:
+        name = os.path.basename(path)
+        stem = name[:-len(OVERLAY_SUFFIX)] if name.endswith(OVERLAY_SUFFIX) else os.path.splitext(name)[0]
+        output_path = os.path.join(args.output, f"{stem}_modified.png")
+        try:
+            compose_overlay(path, source_dir=args.source_dir).save(output_path)
+            print(f"已合成 {output_path}")
+        except Exception as e:
+            print(f"合成 '{name}' 时发生错误：{e}")
+
+
+if __name__ == "__main__":
+    main()
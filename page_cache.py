@@ -0,0 +1,104 @@
+"""Decoded batch pages kept in numpy.memmap files under a scratch directory.
+
+Decoding a scan and running OCR on it is the slow part of a batch page; once a page has been shown,
+its decoded original and rendered result are written to raw memmap files so that going back to it,
+jumping around or regenerating only copies pixels that the operating system usually still has in
+its file cache. The process itself only holds the pages currently on screen, and the scratch files
+are bounded by `max_bytes`, dropping the least recently used pages first; the images of one page
+are put in one group so that they are always dropped together.
+"""
+import collections
+import os
+import shutil
+import tempfile
+import numpy as np
+from PIL import Image
+
+DEFAULT_MAX_BYTES = 4 << 30  # Scratch space for cached pages (about 150 A4 pages at 300 dpi, original + render)
+
+
+class PageCache:
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.owns_directory = directory is None
+        self.directory = directory or tempfile.mkdtemp(prefix="fachao_pages_")
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()  # key -> (file path, shape, bytes, group); least recently used first
+        self.groups = {}  # group -> keys stored in it
+        self.used_bytes = 0
+        self.counter = 0
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def members(self, key):
+        """Keys stored in the same group as key (including key itself)."""
+        group = self.entries[key][3]
+        return [key] if group is None else list(self.groups[group])
+
+    def put(self, key, image, group=None):
+        """Store a copy of image (L, RGB or RGBA) under key, replacing an earlier entry.
+
+        Entries put with the same `group` are used and evicted together: once one of them has to go
+        to stay within max_bytes, the others are removed as well.
+        """
+        self.discard(key)
+        pixels = np.asarray(image)
+        self.counter += 1
+        path = os.path.join(self.directory, f"{self.counter}.raw")
+        mapped = np.memmap(path, dtype=np.uint8, mode="w+", shape=pixels.shape)
+        mapped[...] = pixels
+        mapped.flush()
+        del mapped
+        self.entries[key] = (path, pixels.shape, pixels.nbytes, group)
+        self.used_bytes += pixels.nbytes
+        if group is not None:
+            self.groups.setdefault(group, set()).add(key)
+        self.touch(key)
+        keep = self.members(key)
+        while self.used_bytes > self.max_bytes:
+            oldest = next(iter(self.entries))
+            if oldest in keep:
+                break
+            for member in self.members(oldest):
+                self.discard(member)
+
+    def touch(self, key):
+        """Mark key and the rest of its group as most recently used."""
+        for member in self.members(key):
+            self.entries.move_to_end(member)
+
+    def get(self, key):
+        """Return a copy of the image stored under key, or None."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.touch(key)
+        path, shape, _, _ = entry
+        mapped = np.memmap(path, dtype=np.uint8, mode="r", shape=shape)
+        try:
+            return Image.fromarray(np.array(mapped))
+        finally:
+            del mapped
+
+    def discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.used_bytes -= entry[2]
+        group = entry[3]
+        if group is not None:
+            self.groups[group].discard(key)
+            if not self.groups[group]:
+                del self.groups[group]
+        try:
+            os.remove(entry[0])
+        except OSError:
+            pass
+
+    def close(self):
+        """Delete all cached pages (and the scratch directory if the cache created it)."""
+        for key in list(self.entries):
+            self.discard(key)
+        if self.owns_directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
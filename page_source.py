@@ -0,0 +1,90 @@
+"""Batch inputs and outputs made of pages: single images and multi-page TIFF documents.
+
+Inputs are expanded into pages (path, frame), where frame is None for a single-image file and the
+frame index inside a multi-page TIFF. Only the frame count is read up front; every page is decoded
+when it is processed and the file is closed again, so a document of any length keeps at most one
+decoded page in memory. Multi-page output is written the same way, one page appended at a time.
+"""
+import os
+from PIL import Image, TiffImagePlugin
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+IMAGE_FILETYPES = [("Image Files", ";".join(f"*{extension}" for extension in IMAGE_EXTENSIONS))]
+TIFF_COMPRESSION = "tiff_deflate"  # Lossless and supported by every TIFF reader
+
+
+def frame_count(path):
+    """Return the number of frames in path without decoding them (1 for single-image formats)."""
+    with Image.open(path) as image:
+        return getattr(image, "n_frames", 1)
+
+
+def expand_pages(paths):
+    """Return the list of (path, frame) pages of the input files, in order."""
+    pages = []
+    for path in paths:
+        try:
+            count = frame_count(path)
+        except Exception as e:
+            print(f"无法读取 '{os.path.basename(path)}' 的页数，将按单页处理：{e}")
+            count = 1
+        if count > 1:
+            pages.extend((path, frame) for frame in range(count))
+        else:
+            pages.append((path, None))
+    return pages
+
+
+def open_page(path, frame=None):
+    """Decode one page as RGBA."""
+    with Image.open(path) as image:
+        if frame:
+            image.seek(frame)
+        return image.convert("RGBA")
+
+
+def page_key(path, frame=None):
+    """Identifier of a page, used for manifest entries and seeds."""
+    return path if frame is None else f"{path}#{frame + 1}"
+
+
+def page_name(path, frame=None):
+    """Human-readable page name for messages."""
+    name = os.path.basename(path)
+    return name if frame is None else f"{name} 第{frame + 1}页"
+
+
+def page_stem(path, frame=None):
+    """Base name for the output file of a page."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem if frame is None else f"{stem}_p{frame + 1:04d}"
+
+
+def append_tiff_page(path, image, new=False):
+    """Append image as the last page of the TIFF at path; `new` starts the file over.
+
+    Earlier pages are neither read nor rewritten, and the file is a valid TIFF after every call.
+    """
+    new = new or not os.path.exists(path)
+    with TiffImagePlugin.AppendingTiffWriter(path, new=new) as tiff:
+        image.save(tiff, format="TIFF", compression=TIFF_COMPRESSION)
+        tiff.newFrame()
+
+
+def put_tiff_page(path, index, image, filler, new=False):
+    """Store image as page `index` of the TIFF at path; `new` starts the file over.
+
+    The next page is simply appended. Missing pages before index are appended from filler(k) first,
+    and an existing page is replaced by copying the file page by page, so at most one page is
+    decoded at a time in every case.
+    """
+    count = 0 if new or not os.path.exists(path) else frame_count(path)
+    if index < count:
+        temp_path = path + ".tmp"
+        for k in range(count):
+            append_tiff_page(temp_path, image if k == index else open_page(path, k), new=(k == 0))
+        os.replace(temp_path, path)
+        return
+    for k in range(count, index):
+        append_tiff_page(path, filler(k), new=(k == 0))
+    append_tiff_page(path, image, new=(index == 0))
@@ -0,0 +1,160 @@
+import random
+import threading
+import ocr_router
+from renderer import paste_patch
+
+
+def apply_regions(image, layout, language, renderer, rng, pool=None, name="", on_region=None, raise_ocr_errors=False,
+                  overlay=None, scores=None, languages=None):
+    """OCR every source region of image and draw the text into its destinations.
+
+    `layout` is the page's compiled pixel layout (see region_template.compile_layout).
+    `languages` optionally gives the OCR language of every region pair; None entries use `language`.
+    `on_region(index, src_region)` is called for every source crop before OCR (used for the debug view).
+    `overlay` records the drawn patches, keyed by (region index, destination index) from 0, for sparse
+    output and for redrawing single destinations later (see overlay.Overlay and redraw_destination).
+    `scores`, when given, is extended with the OCR confidence of every region pair (0.0 when unknown).
+    Returns the list of OCR texts, one per region pair ("" when nothing was recognised).
+    """
+    prefix = f"图片 '{name}' " if name else ""
+    crops = crop_sources(image, layout)
+
+    if on_region is not None:
+        for index, src_region in enumerate(crops, start=1):
+            on_region(index, src_region)
+
+    # Perform OCR through the backend chosen for each language (see ocr_router.py). Each language group
+    # is one request with the page and its source boxes, so EasyOCR cuts the regions from a single
+    # shared-memory copy of the page; a region that fails comes back as its exception
+    def recognise(indices, group_language):
+        return ocr_router.recognise([crops[i] for i in indices], group_language,
+                                    page=image, boxes=[layout[i][0] for i in indices])
+
+    languages = [region_language or language for region_language in (languages or [None] * len(crops))]
+    results = recognise_by_language(list(range(len(crops))), languages, recognise)
+    reported = None
+    for index, result in enumerate(results):
+        if isinstance(result, Exception):
+            if raise_ocr_errors:
+                raise result
+            if result is not reported:  # A failed batch fails all of its crops with the same error
+                print(f"执行OCR时发生错误：{result}")
+                reported = result
+            results[index] = ("", 0.0)
+    ocr_texts = [text for text, _ in results]
+    if scores is not None:
+        scores.extend(score for _, score in results)
+
+    for index, ((src_box, dst_boxes), ocr_text) in enumerate(zip(layout, ocr_texts), start=1):
+        print(f"{prefix}区域 {index} OCR 结果: {ocr_text}")
+
+        if not ocr_text:
+            print(f"警告: {prefix}区域 {index} 未识别到任何文本。")
+            continue
+
+        # Add OCR text to all destination regions
+        for dst_index, dst_box in enumerate(dst_boxes):
+            renderer.draw_text(image, ocr_text, dst_box, rng, pool, overlay, (index - 1, dst_index))
+
+        print(f"文本已添加到{prefix}区域 {index} 的 {len(dst_boxes)} 个目标框")
+
+    return ocr_texts
+
+
+def recognise_by_language(crops, languages, recognise):
+    """Recognise crops grouped by language, that is by engine configuration.
+
+    `recognise(crops, language)` returns one result per crop; `crops` may be any per-region items, such
+    as indices when recognise needs more than the crop itself. Every language group runs on its own
+    thread against the engines of its language (see OCR.get_pool), so engines never switch models and
+    the engines of all languages on a page work at the same time. Returns the results in crop order;
+    the crops of a group that raised get the exception instead of a result.
+    """
+    groups = {}
+    for index, language in enumerate(languages):
+        groups.setdefault(language, []).append(index)
+    results = [None] * len(crops)
+
+    def run(language, indices):
+        try:
+            group_results = recognise([crops[i] for i in indices], language)
+        except Exception as e:
+            group_results = [e] * len(indices)
+        for index, result in zip(indices, group_results):
+            results[index] = result
+
+    if len(groups) <= 1:
+        for language, indices in groups.items():
+            run(language, indices)
+    else:
+        threads = [threading.Thread(target=run, args=group) for group in groups.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return results
+
+
+def region_languages(region_pairs):
+    """Return the OCR language set on every region pair (None where the page language applies)."""
+    return [pair.get('language') for pair in region_pairs]
+
+
+def crop_sources(image, layout):
+    """Return the source crop of every region pair in layout."""
+    return [image.crop(src_box) for src_box, _ in layout]
+
+
+def draw_regions(image, layout, texts, renderer, rng, pool=None, overlay=None):
+    """Draw already recognised texts (one per region pair) into their destinations."""
+    for index, ((_, dst_boxes), text) in enumerate(zip(layout, texts)):
+        if not text:
+            continue
+        for dst_index, dst_box in enumerate(dst_boxes):
+            renderer.draw_text(image, text, dst_box, rng, pool, overlay, (index, dst_index))
+
+
+def redraw_destination(image, original, overlay, key, dst_box, text, renderer, rng):
+    """Redraw the destination `key` of a rendered page in place with text ("" leaves it empty).
+
+    `overlay` must hold the page's placements with their keys (see apply_regions) and receives the new
+    patch. Only the area under the destination's old and new patches and its box is restored from
+    `original`; the patches of the page that overlap it are pasted again in drawing order, so the result
+    is exactly what rendering the whole page would give and the rest of the page is not touched.
+    """
+    box_size = (dst_box[2] - dst_box[0], dst_box[3] - dst_box[1])
+    patch, offset = renderer.render_patch(text, box_size, rng) if text else (None, (0, 0))
+    placements = [] if patch is None else [(patch, dst_box[0] + offset[0], dst_box[1] + offset[1])]
+
+    rects = [dst_box] + [(x, y, x + patch.width, y + patch.height) for patch, x, y in placements]
+    rects += [(x, y, x + patch.width, y + patch.height)
+              for (patch, x, y), placement_key in zip(overlay.placements, overlay.keys) if placement_key == key]
+    left = max(min(rect[0] for rect in rects), 0)
+    top = max(min(rect[1] for rect in rects), 0)
+    right = min(max(rect[2] for rect in rects), image.width)
+    bottom = min(max(rect[3] for rect in rects), image.height)
+    overlay.replace(key, placements)
+    if right <= left or bottom <= top:
+        return
+
+    area = original.crop((left, top, right, bottom)).convert("RGBA")
+    for patch, x, y in overlay.placements:
+        if x < right and y < bottom and x + patch.width > left and y + patch.height > top:
+            paste_patch(area, patch, x - left, y - top)
+    image.paste(area, (left, top))
+
+
+def render_page(image, region_pairs, layout_cache, language, renderer, seed, pool=None, transform=None, name="",
+                on_region=None, raise_ocr_errors=False, overlay=None, scores=None):
+    """Apply region_pairs to image in place using a layout from layout_cache and a RNG seeded with seed.
+
+    `transform` maps template pixels to this page (see registration.PageRegistrar).
+    `language` applies to region pairs without a language of their own.
+    Returns the OCR texts, see apply_regions.
+    """
+    layout = layout_cache.get(region_pairs, *image.size)
+    if transform is not None:
+        layout = transform.apply_layout(layout)
+    return apply_regions(image, layout, language, renderer, random.Random(seed), pool=pool, name=name,
+                         on_region=on_region, raise_ocr_errors=raise_ocr_errors, overlay=overlay, scores=scores,
+                         languages=region_languages(region_pairs))
@@ -0,0 +1,101 @@
+"""Spatial index over the source and destination boxes of region_pairs.
+
+Boxes are stored in relative ratios (0..1), like region_pairs itself. The index is a uniform grid
+hash: every box is registered in the cells it overlaps, so a click or a rubber-band selection only
+looks at the boxes near it instead of scanning every region. Boxes are identified by the box lists
+themselves, which stay the same objects while they are moved in place.
+"""
+import math
+
+
+class RegionIndex:
+    def __init__(self, cell_size=0.02):
+        self.cell_size = cell_size
+        self.cells = {}  # (column, row) -> set of box ids
+        self.entries = {}  # box id -> (pair, box, cells)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.cells.clear()
+        self.entries.clear()
+
+    def rebuild(self, region_pairs):
+        self.clear()
+        for pair in region_pairs:
+            for box in boxes_of(pair):
+                self.update(pair, box)
+
+    def cells_of(self, x1, y1, x2, y2):
+        x1, x2 = sorted((x1, x2))
+        y1, y2 = sorted((y1, y2))
+        size = self.cell_size
+        return [(column, row)
+                for column in range(math.floor(x1 / size), math.floor(x2 / size) + 1)
+                for row in range(math.floor(y1 / size), math.floor(y2 / size) + 1)]
+
+    def update(self, pair, box):
+        """Insert box, or re-register it after it was moved or resized in place."""
+        key = id(box)
+        if key in self.entries:
+            self.remove(box)
+        cells = self.cells_of(*box)
+        for cell in cells:
+            self.cells.setdefault(cell, set()).add(key)
+        self.entries[key] = (pair, box, cells)
+
+    def remove(self, box):
+        entry = self.entries.pop(id(box), None)
+        if entry is None:
+            return
+        key = id(box)
+        for cell in entry[2]:
+            members = self.cells.get(cell)
+            if members is not None:
+                members.discard(key)
+                if not members:
+                    del self.cells[cell]
+
+    def remove_pair(self, pair):
+        for box in boxes_of(pair):
+            self.remove(box)
+
+    def candidates(self, x1, y1, x2, y2):
+        keys = set()
+        for cell in self.cells_of(x1, y1, x2, y2):
+            keys.update(self.cells.get(cell, ()))
+        return [self.entries[key][:2] for key in keys]
+
+    def hit(self, x, y):
+        """Return (pair, box) of the smallest box containing the point, or None."""
+        best, best_area = None, None
+        for pair, box in self.candidates(x, y, x, y):
+            x1, x2 = sorted((box[0], box[2]))
+            y1, y2 = sorted((box[1], box[3]))
+            if x1 <= x <= x2 and y1 <= y <= y2:
+                area = (x2 - x1) * (y2 - y1)
+                if best is None or area < best_area:
+                    best, best_area = (pair, box), area
+        return best
+
+    def query(self, x1, y1, x2, y2):
+        """Return (pair, box) of every box intersecting the rectangle."""
+        x1, x2 = sorted((x1, x2))
+        y1, y2 = sorted((y1, y2))
+        result = []
+        for pair, box in self.candidates(x1, y1, x2, y2):
+            if min(box[0], box[2]) <= x2 and max(box[0], box[2]) >= x1 and \
+                    min(box[1], box[3]) <= y2 and max(box[1], box[3]) >= y1:
+                result.append((pair, box))
+        return result
+
+
+def boxes_of(pair):
+    """Source box (if any) followed by the destination boxes of a region pair."""
+    boxes = [pair['source']] if pair.get('source') else []
+    return boxes + list(pair.get('destinations', []))
+
+
+def is_source(pair, box):
+    return pair.get('source') is box
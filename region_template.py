@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+TEMPLATE_FORMAT = "fachao-template"
+TEMPLATE_VERSION = 1
+
+
+def compile_layout(region_pairs, width, height):
+    """Convert ratio region pairs into integer pixel boxes for a width x height image.
+
+    Returns a list of (src_box, [dst_box, ...]) with boxes as (x1, y1, x2, y2) tuples,
+    truncated exactly like int(ratio * size).
+    """
+    if not region_pairs:
+        return []
+    counts = [len(pair.get('destinations', [])) for pair in region_pairs]
+    boxes = [pair['source'] for pair in region_pairs]
+    boxes += [dst for pair in region_pairs for dst in pair.get('destinations', [])]
+
+    scale = np.array([width, height, width, height], dtype=np.float64)
+    pixels = [tuple(box) for box in (np.asarray(boxes, dtype=np.float64) * scale).astype(np.int64).tolist()]
+
+    layout = []
+    offset = len(region_pairs)
+    for src_box, count in zip(pixels, counts):
+        layout.append((src_box, pixels[offset:offset + count]))
+        offset += count
+    return layout
+
+
+class LayoutCache:
+    """Caches compiled pixel layouts per input resolution.
+
+    Call invalidate() whenever the region pairs change.
+    """
+
+    def __init__(self):
+        self.layouts = {}  # (width, height) -> layout
+
+    def invalidate(self):
+        self.layouts.clear()
+
+    def get(self, region_pairs, width, height):
+        key = (width, height)
+        layout = self.layouts.get(key)
+        if layout is None:
+            layout = compile_layout(region_pairs, width, height)
+            self.layouts[key] = layout
+        return layout
+
+
+def copy_pair(pair):
+    """Copy a region pair with plain lists; the optional per-region OCR 'language' is kept when set."""
+    copied = {'source': list(pair['source']), 'destinations': [list(dst) for dst in pair.get('destinations', [])]}
+    if pair.get('language'):
+        copied['language'] = pair['language']
+    return copied
+
+
+def save_template(path, region_pairs, square_size=None, interval=None, layout_cache=None):
+    """Write region pairs (and any compiled layouts) to a versioned JSON template file."""
+    data = {
+        "format": TEMPLATE_FORMAT,
+        "version": TEMPLATE_VERSION,
+        "square_size": square_size,
+        "interval": interval,
+        "region_pairs": [copy_pair(pair) for pair in region_pairs],
+        "layouts": {},
+    }
+    if layout_cache is not None:
+        for (width, height), layout in layout_cache.layouts.items():
+            data["layouts"][f"{width}x{height}"] = [[list(src), [list(dst) for dst in dsts]] for src, dsts in layout]
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(temp_path, path)
+
+
+def load_template(path, layout_cache=None):
+    """Read a template file written by save_template.
+
+    Returns a dict with 'region_pairs', 'square_size' and 'interval'. Compiled layouts stored
+    in the file are loaded into layout_cache when one is given.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return parse_template(data, layout_cache, path)
+
+
+def parse_template(data, layout_cache=None, source="<data>"):
+    """Validate already decoded template JSON; see load_template."""
+    if not isinstance(data, dict) or data.get("format") != TEMPLATE_FORMAT:
+        raise ValueError(f"不是有效的模板文件：{source}")
+    version = data.get("version")
+    if not isinstance(version, int) or version > TEMPLATE_VERSION:
+        raise ValueError(f"不支持的模板版本：{version}（当前支持 {TEMPLATE_VERSION}）")
+
+    region_pairs = [copy_pair(pair) for pair in data.get("region_pairs", [])]
+
+    if layout_cache is not None:
+        layout_cache.invalidate()
+        for size, layout in data.get("layouts", {}).items():
+            width, height = (int(v) for v in size.split("x"))
+            if len(layout) != len(region_pairs):
+                continue  # Stale layout, it will be recompiled on demand
+            layout_cache.layouts[(width, height)] = [(tuple(src), [tuple(dst) for dst in dsts]) for src, dsts in layout]
+
+    return {
+        "region_pairs": region_pairs,
+        "square_size": data.get("square_size"),
+        "interval": data.get("interval"),
+    }
+
+
+def template_fingerprint(region_pairs):
+    """Return a short hash identifying the geometry (and per-region languages) of region_pairs."""
+    data = json.dumps([[pair['source'], pair.get('destinations', [])]
+                       + ([pair['language']] if pair.get('language') else []) for pair in region_pairs],
+                      separators=(",", ":"))
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()[:16]
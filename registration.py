@@ -0,0 +1,156 @@
+import math
+import numpy as np
+from PIL import Image
+
+
+class Transform:
+    """Maps template page pixels to batch page pixels.
+
+    p_page = M * (p - center) + center + (dx, dy), where M rotates by `angle` degrees
+    (counter-clockwise as seen on screen) and scales by `scale`.
+    """
+
+    def __init__(self, dx=0.0, dy=0.0, angle=0.0, scale=1.0, center=(0.0, 0.0), response=0.0):
+        self.dx = dx
+        self.dy = dy
+        self.angle = angle
+        self.scale = scale
+        self.center = center
+        self.response = response  # Phase correlation peak height, 0..1
+
+    def matrix(self):
+        theta = math.radians(self.angle)
+        cos_t = math.cos(theta) * self.scale
+        sin_t = math.sin(theta) * self.scale
+        return ((cos_t, sin_t), (-sin_t, cos_t))
+
+    def is_identity(self):
+        return abs(self.dx) < 0.5 and abs(self.dy) < 0.5 and abs(self.angle) < 1e-3 and abs(self.scale - 1) < 1e-4
+
+    def apply_point(self, x, y):
+        (a, b), (c, d) = self.matrix()
+        cx, cy = self.center
+        x, y = x - cx, y - cy
+        return a * x + b * y + cx + self.dx, c * x + d * y + cy + self.dy
+
+    def apply_box(self, box):
+        """Move a box with its centre; the box stays axis-aligned and only its size is scaled."""
+        center_x, center_y = self.apply_point((box[0] + box[2]) / 2, (box[1] + box[3]) / 2)
+        half_w = (box[2] - box[0]) * self.scale / 2
+        half_h = (box[3] - box[1]) * self.scale / 2
+        return (int(center_x - half_w), int(center_y - half_h), int(center_x + half_w), int(center_y + half_h))
+
+    def apply_layout(self, layout):
+        if self.is_identity():
+            return layout
+        return [(self.apply_box(src), [self.apply_box(dst) for dst in dsts]) for src, dsts in layout]
+
+    def __repr__(self):
+        return f"Transform(dx={self.dx:.1f}, dy={self.dy:.1f}, angle={self.angle:.2f}, scale={self.scale:.4f}, response={self.response:.3f})"
+
+
+def _hann(shape):
+    return np.outer(np.hanning(shape[0]), np.hanning(shape[1])).astype(np.float32)
+
+
+def _subpixel(values, index):
+    """Parabolic peak refinement along a 1-D circular array."""
+    left = values[(index - 1) % len(values)]
+    centre = values[index]
+    right = values[(index + 1) % len(values)]
+    denom = left - 2 * centre + right
+    if denom == 0:
+        return float(index)
+    return index + 0.5 * (left - right) / denom
+
+
+def phase_correlate(fft_a, fft_b, shape):
+    """Return ((dy, dx), response) such that b(x) ~= a(x - (dy, dx))."""
+    cross = np.conj(fft_a) * fft_b
+    cross /= np.abs(cross) + 1e-9
+    corr = np.fft.irfft2(cross, s=shape)
+    peak_y, peak_x = np.unravel_index(np.argmax(corr), corr.shape)
+    dy = _subpixel(corr[:, peak_x], peak_y)
+    dx = _subpixel(corr[peak_y, :], peak_x)
+    if dy > shape[0] / 2:
+        dy -= shape[0]
+    if dx > shape[1] / 2:
+        dx -= shape[1]
+    return (dy, dx), float(corr[peak_y, peak_x])
+
+
+class PageRegistrar:
+    """Estimates how each batch page is shifted (and optionally rotated/scaled) from the template page.
+
+    Both pages are compared as downsampled, windowed grayscale ink maps, so registration costs a
+    handful of FFTs of `work_size` pixels per page.
+    """
+
+    def __init__(self, reference_image, work_size=512, estimate_rotation=False, max_angle=5.0, max_scale=0.05):
+        ref_width, ref_height = reference_image.size
+        ratio = work_size / max(ref_width, ref_height)
+        self.work_shape = (max(int(ref_height * ratio), 16), max(int(ref_width * ratio), 16))  # (rows, cols)
+        self.window = _hann(self.work_shape)
+        self.estimate_rotation = estimate_rotation
+        self.max_angle = max_angle
+        self.max_scale = max_scale
+
+        self.reference = self.to_work_array(reference_image)
+        self.reference_fft = np.fft.rfft2(self.reference * self.window)
+        if estimate_rotation:
+            self.log_polar_shape = (360, min(self.work_shape) // 2)
+            self.reference_log_polar_fft = np.fft.rfft2(self.log_polar_magnitude(self.reference))
+
+    def to_work_array(self, image):
+        gray = image.convert("L").resize((self.work_shape[1], self.work_shape[0]), Image.BILINEAR)
+        ink = 255.0 - np.asarray(gray, dtype=np.float32)  # Ink is positive, paper is zero
+        return ink - ink.mean()
+
+    def log_polar_magnitude(self, work):
+        """Sample the high-passed FFT magnitude on a log-polar grid (angle rows, log-radius columns)."""
+        magnitude = np.abs(np.fft.fftshift(np.fft.fft2(work * self.window)))
+        rows, cols = self.work_shape
+        fy = np.fft.fftshift(np.fft.fftfreq(rows))[:, None]
+        fx = np.fft.fftshift(np.fft.fftfreq(cols))[None, :]
+        high_pass = 1.0 - np.cos(np.pi * fy) * np.cos(np.pi * fx)
+        magnitude = np.log1p(magnitude * high_pass)
+
+        angles, radii = self.log_polar_shape
+        max_radius = min(rows, cols) / 2
+        self.log_base = math.log(max_radius) / radii
+        theta = np.linspace(0, np.pi, angles, endpoint=False)[:, None]
+        radius = np.exp(np.arange(radii) * self.log_base)[None, :]
+        ys = np.clip(np.rint(rows // 2 + radius * np.sin(theta)), 0, rows - 1).astype(np.intp)
+        xs = np.clip(np.rint(cols // 2 + radius * np.cos(theta)), 0, cols - 1).astype(np.intp)
+        return magnitude[ys, xs]
+
+    def estimate(self, image):
+        """Return the Transform from template pixels to pixels of image."""
+        page = self.to_work_array(image)
+        rows, cols = self.work_shape
+        angle, scale = 0.0, 1.0
+
+        if self.estimate_rotation:
+            (d_angle, d_radius), _ = phase_correlate(
+                self.reference_log_polar_fft, np.fft.rfft2(self.log_polar_magnitude(page)), self.log_polar_shape)
+            angle = -d_angle * 180.0 / self.log_polar_shape[0]
+            scale = math.exp(-d_radius * self.log_base)
+            if abs(angle) > self.max_angle or abs(scale - 1) > self.max_scale:
+                angle, scale = 0.0, 1.0  # Implausible for a scan, most likely a false peak
+
+        transform = Transform(angle=angle, scale=scale, center=(cols / 2, rows / 2))
+        if angle or scale != 1.0:
+            # Undo rotation/scale on the page, then the remaining misalignment is a pure shift
+            (a, b), (c, d) = transform.matrix()
+            cx, cy = transform.center
+            page = np.asarray(Image.fromarray(page).transform(
+                (cols, rows), Image.AFFINE, (a, b, cx - a * cx - b * cy, c, d, cy - c * cx - d * cy), Image.BILINEAR))
+
+        (shift_y, shift_x), response = phase_correlate(self.reference_fft, np.fft.rfft2(page * self.window), self.work_shape)
+        (a, b), (c, d) = transform.matrix()
+        work_dx, work_dy = a * shift_x + b * shift_y, c * shift_x + d * shift_y
+
+        # Express the transform in pixels of the page being registered
+        width, height = image.size
+        sx, sy = width / cols, height / rows
+        return Transform(work_dx * sx, work_dy * sy, angle, scale, (width / 2, height / 2), response)
@@ -0,0 +1,284 @@
+"""Local HTTP render service.
+
+Other tools can render pages without the GUI:
+
+    POST /templates/<name>          body: template file written by “保存模板”
+    POST /render/<name>?format=png  body: page image; response: rendered page (png or webp)
+         optional query parameters: language, seed, font_size, color, wrap=1, augment (0..1)
+
+Requests that arrive close together are micro-batched: the source crops of all pages in a batch
+are recognised together in as few engine calls as possible, one group per language (see
+OCR.getTextsFromImages and pipeline.recognise_by_language). The
+request queue is bounded; when it is full the service answers 503 with Retry-After.
+"""
+import argparse
+import io
+import json
+import os
+import queue
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image
+import cpu_budget
+import OCR
+from pipeline import crop_sources, draw_regions, recognise_by_language, region_languages
+from region_template import LayoutCache, load_template, parse_template
+from augment import Augmentation
+from renderer import HandwritingRenderer, VariantPool
+
+FONTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts")
+FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc')
+OUTPUT_FORMATS = {"png": ("PNG", "image/png"), "webp": ("WEBP", "image/webp")}
+
+
+class RenderJob:
+    def __init__(self, template, image_bytes, options):
+        self.template = template
+        self.image_bytes = image_bytes
+        self.options = options
+        self.done = threading.Event()
+        self.result = None  # Encoded output image
+        self.error = None
+
+
+class RenderService:
+    """Renders pages submitted over HTTP, coalescing the OCR work of concurrent requests."""
+
+    def __init__(self, font_paths, engines=1, max_queue=32, max_batch=8, max_wait=0.05, variants=0, budget=None):
+        self.font_paths = font_paths
+        self.engines = max(int(engines), 1)
+        self.budget = budget  # Optional cpu_budget.CpuBudget shared by the engines and the batch threads
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.templates = {}  # name -> {'region_pairs', 'square_size', 'layout_cache'}
+        self.templates_lock = threading.Lock()
+        self.pool = VariantPool(variants) if variants else None
+        self.local = threading.local()
+        self.batches = 0
+        self.pages = 0
+
+    def add_template(self, name, template):
+        """Register a template returned by load_template/parse_template under name."""
+        template["layout_cache"] = LayoutCache()
+        template["lock"] = threading.Lock()
+        with self.templates_lock:
+            self.templates[name] = template
+
+    def submit(self, name, image_bytes, options):
+        """Queue a page; raises KeyError for unknown templates and queue.Full when overloaded."""
+        with self.templates_lock:
+            template = self.templates[name]
+        job = RenderJob(template, image_bytes, options)
+        self.queue.put_nowait(job)
+        return job
+
+    def next_batch(self):
+        """Block for one job, then gather more until max_batch jobs or max_wait seconds."""
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def get_renderer(self, font_size, color, wrap=False, augment=0.0):
+        key = (font_size, color, wrap, augment)
+        if getattr(self.local, "key", None) != key:
+            fonts = getattr(self.local, "fonts", {})  # Fonts are not shared between threads
+            self.local.fonts = fonts
+            self.local.renderer = HandwritingRenderer(self.font_paths, font_size, color, font_cache=fonts, wrap=wrap,
+                                                      augmentation=Augmentation.from_strength(augment))
+            self.local.key = key
+        return self.local.renderer
+
+    def process_batch(self, batch):
+        pages = []
+        for job in batch:
+            try:
+                image = Image.open(io.BytesIO(job.image_bytes)).convert("RGBA")
+                template = job.template
+                with template["lock"]:
+                    layout = template["layout_cache"].get(template["region_pairs"], *image.size)
+                    languages = [language or job.options["language"]
+                                 for language in region_languages(template["region_pairs"])]
+                pages.append((job, image, layout, crop_sources(image, layout), languages))
+            except Exception as e:
+                job.error = f"无法读取图片：{e}"
+                job.done.set()
+
+        # Recognise the crops of all pages together, grouped by language (per region, or the page's)
+        crops = [crop for page in pages for crop in page[3]]
+        languages = [language for page in pages for language in page[4]]
+        results = recognise_by_language(crops, languages, OCR.getTextsFromImages)
+        texts = {}
+        offset = 0
+        for page in pages:
+            page_results = results[offset:offset + len(page[3])]
+            offset += len(page[3])
+            error = next((result for result in page_results if isinstance(result, Exception)), None)
+            if error is not None:
+                page[0].error = f"执行OCR时发生错误：{error}"
+            texts[id(page[0])] = page_results
+
+        for job, image, layout, _, _ in pages:
+            if job.error is None:
+                try:
+                    options = job.options
+                    font_size = options.get("font_size") or int((job.template["square_size"] or 50) * 0.85)
+                    renderer = self.get_renderer(font_size, options.get("color", "black"), options.get("wrap", False),
+                                                 options.get("augment", 0.0))
+                    draw_regions(image, layout, texts[id(job)], renderer, random.Random(options["seed"]), self.pool)
+                    output_format = OUTPUT_FORMATS[options["format"]][0]
+                    buffer = io.BytesIO()
+                    image.save(buffer, format=output_format)
+                    job.result = buffer.getvalue()
+                except Exception as e:
+                    job.error = f"渲染时发生错误：{e}"
+            job.done.set()
+
+        self.batches += 1
+        self.pages += len(batch)
+
+    def worker_loop(self):
+        while True:
+            batch = self.next_batch()
+            try:
+                self.process_batch(batch)
+            except Exception as e:
+                for job in batch:
+                    if not job.done.is_set():
+                        job.error = str(e)
+                        job.done.set()
+
+    def make_server(self, host, port, request_timeout=300):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def send_body(self, body, content_type, status=200, headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def send_error_json(self, status, message, headers=None):
+                body = json.dumps({"error": message}, ensure_ascii=False).encode("utf-8")
+                self.send_body(body, "application/json; charset=utf-8", status, headers)
+
+            def do_GET(self):
+                if self.path == "/status":
+                    body = json.dumps({"templates": sorted(service.templates), "queued": service.queue.qsize(),
+                                       "batches": service.batches, "pages": service.pages})
+                    self.send_body(body.encode("utf-8"), "application/json")
+                else:
+                    self.send_error_json(404, "not found")
+
+            def do_POST(self):
+                url = urllib.parse.urlparse(self.path)
+                parts = url.path.strip("/").split("/")
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if len(parts) != 2:
+                    self.send_error_json(404, "not found")
+                elif parts[0] == "templates":
+                    try:
+                        service.add_template(parts[1], parse_template(json.loads(body)))
+                    except Exception as e:
+                        self.send_error_json(400, f"模板无效：{e}")
+                        return
+                    self.send_body(b'{"ok": true}', "application/json")
+                elif parts[0] == "render":
+                    query = urllib.parse.parse_qs(url.query)
+                    try:
+                        options = {
+                            "format": query.get("format", ["png"])[0].lower(),
+                            "language": query.get("language", ["cn"])[0],
+                            "seed": int(query["seed"][0]) if "seed" in query else random.getrandbits(32),
+                            "font_size": int(query["font_size"][0]) if "font_size" in query else None,
+                            "color": query.get("color", ["black"])[0],
+                            "wrap": query.get("wrap", ["0"])[0] in ("1", "true"),
+                            "augment": float(query.get("augment", ["0"])[0]),
+                        }
+                    except ValueError as e:
+                        self.send_error_json(400, f"参数无效：{e}")
+                        return
+                    if options["format"] not in OUTPUT_FORMATS:
+                        self.send_error_json(400, f"不支持的输出格式：{options['format']}")
+                        return
+                    try:
+                        job = service.submit(parts[1], body, options)
+                    except KeyError:
+                        self.send_error_json(404, f"模板不存在：{parts[1]}")
+                        return
+                    except queue.Full:
+                        self.send_error_json(503, "服务繁忙，请稍后重试", {"Retry-After": "1"})
+                        return
+                    if not job.done.wait(request_timeout):
+                        self.send_error_json(504, "渲染超时")
+                    elif job.error:
+                        self.send_error_json(500, job.error)
+                    else:
+                        self.send_body(job.result, OUTPUT_FORMATS[options["format"]][1],
+                                       headers={"X-Fachao-Seed": str(options["seed"])})
+                else:
+                    self.send_error_json(404, "not found")
+
+        return ThreadingHTTPServer((host, port), Handler)
+
+    def serve(self, host="127.0.0.1", port=8766):
+        OCR.configure(size=self.engines, budget=self.budget)
+        # As in distributed workers: one batch thread per engine, plus the budget's render threads
+        # that draw one batch while the engines recognise the next
+        threads = self.engines
+        if self.budget is not None:
+            print(self.budget.summary())
+            threads += self.budget.render_threads
+        for _ in range(threads):
+            threading.Thread(target=self.worker_loop, daemon=True).start()
+        server = self.make_server(host, port)
+        print(f"渲染服务已启动：http://{host}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        finally:
+            OCR.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="罚抄生成器本地渲染服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--template", action="append", default=[], metavar="NAME=PATH", help="启动时加载的模板")
+    parser.add_argument("--engines", type=int, default=1)
+    parser.add_argument("--max-queue", type=int, default=32, help="排队请求数上限，超出时返回503")
+    parser.add_argument("--max-batch", type=int, default=8, help="每批合并的最多页数")
+    parser.add_argument("--max-wait", type=float, default=0.05, help="凑批等待的最长秒数")
+    parser.add_argument("--variants", type=int, default=0, help="预渲染变体数，0为关闭")
+    parser.add_argument("--cores", type=int, default=None, help="按此核心数为引擎和渲染线程分配线程数")
+    parser.add_argument("--pin", action="store_true", help="把每个引擎绑定到各自的核心上")
+    args = parser.parse_args(argv)
+
+    font_paths = sorted(os.path.join(FONTS_DIR, f) for f in os.listdir(FONTS_DIR) if f.lower().endswith(FONT_EXTENSIONS))
+    budget = cpu_budget.CpuBudget(args.cores, args.engines, pin=args.pin) if args.cores or args.pin else None
+    service = RenderService(font_paths, args.engines, args.max_queue, args.max_batch, args.max_wait, args.variants,
+                            budget)
+    for item in args.template:
+        name, path = item.split("=", 1)
+        service.add_template(name, load_template(path))
+    service.serve(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
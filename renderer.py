@@ -0,0 +1,256 @@
+import collections
+import random
+import threading
+import zlib
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from augment import draw_parameters, tone, warp_all
+from text_layout import MIN_FONT_SIZE, REFERENCE_SIZE, FontMetrics, MeasuredText, break_lines, fit_size, fits, place_glyphs
+
+DEFAULT_POOL_KEYS = 2048  # Distinct (text, box, settings) keys a VariantPool keeps
+
+
+def stable_seed(*parts):
+    """Derive a reproducible 32-bit seed from arbitrary printable parts."""
+    return zlib.crc32(repr(parts).encode("utf-8"))
+
+
+def paste_patch(image, patch, x, y):
+    """Alpha-composite an RGBA patch onto image at (x, y), clipping to the image bounds."""
+    left, top = max(x, 0), max(y, 0)
+    right = min(x + patch.width, image.width)
+    bottom = min(y + patch.height, image.height)
+    if right <= left or bottom <= top:
+        return
+    patch = patch.crop((left - x, top - y, right - x, bottom - y))
+    image.alpha_composite(patch, dest=(left, top))
+
+
+class HandwritingRenderer:
+    """Draws text glyph by glyph, picking a different font for each glyph.
+
+    Glyphs are placed from cached metric tables (see text_layout). With `fit` the font size is
+    reduced as far as needed for the text to fit each destination box; with `wrap` long texts are
+    broken into several lines before shrinking. Every glyph is rasterised once per font and size and
+    composited from its cached mask, optionally varied by `augmentation` (see augment.Augmentation).
+    """
+
+    def __init__(self, font_paths, font_size, font_color="black", font_cache=None, fit=True, wrap=False,
+                 augmentation=None):
+        self.font_paths = list(font_paths)
+        self.font_size = font_size
+        self.font_color = font_color
+        self.fit = fit
+        self.wrap = wrap
+        self.augmentation = augmentation if augmentation is not None and augmentation.enabled() else None
+        # (path, size) -> font, ("metrics", path) -> text_layout.FontMetrics
+        # and ("glyph", path, size, char) -> (alpha mask, offset)
+        self.loaded_fonts = font_cache if font_cache is not None else {}
+
+    def settings_key(self):
+        augmentation = self.augmentation.key() if self.augmentation is not None else None
+        return (tuple(self.font_paths), self.font_size, self.font_color, self.fit, self.wrap, augmentation)
+
+    def get_font(self, font_path, size):
+        key = (font_path, size)
+        if key not in self.loaded_fonts:
+            try:
+                self.loaded_fonts[key] = ImageFont.truetype(font_path, size)
+            except Exception as e:
+                print(f"无法加载字体 {font_path}：{e}")
+                self.loaded_fonts[key] = ImageFont.load_default()
+        return self.loaded_fonts[key]
+
+    def get_metrics(self, font_path):
+        key = ("metrics", font_path)
+        if key not in self.loaded_fonts:
+            self.loaded_fonts[key] = FontMetrics(self.get_font(font_path, REFERENCE_SIZE))
+        return self.loaded_fonts[key]
+
+    def get_glyph(self, font_path, size, char):
+        """Return the alpha mask of a glyph and its offset from the drawing origin."""
+        key = ("glyph", font_path, size, char)
+        glyph = self.loaded_fonts.get(key)
+        if glyph is None:
+            font = self.get_font(font_path, size)
+            try:
+                left, top, right, bottom = font.getbbox(char)
+            except Exception:
+                left = top = right = bottom = 0
+            if right <= left or bottom <= top:
+                glyph = (np.zeros((0, 0), dtype=np.uint8), (0, 0))
+            else:
+                image = Image.new("L", (right - left, bottom - top), 0)
+                ImageDraw.Draw(image).text((-left, -top), char, font=font, fill=255)
+                glyph = (np.asarray(image), (left, top))
+            self.loaded_fonts[key] = glyph
+        return glyph
+
+    def measure(self, text, font_choices):
+        """Measure text where glyph i uses font_paths[font_choices[i]]; no font calls for known glyphs."""
+        advances = np.empty(len(text))
+        bboxes = np.empty((len(text), 4))
+        line_height = 0
+        choices = np.asarray(font_choices)
+        for index, font_path in enumerate(self.font_paths):
+            members = np.flatnonzero(choices == index)
+            if len(members) == 0:
+                continue
+            metrics = self.get_metrics(font_path)
+            advances[members], bboxes[members] = metrics.measure([text[i] for i in members])
+            line_height = max(line_height, metrics.line_height)
+        return MeasuredText(advances, bboxes, line_height)
+
+    def overflows(self, text, box_size):
+        """True if text may not fit box_size even at MIN_FONT_SIZE, judging every glyph by its widest font."""
+        if not text or not self.font_paths:
+            return False
+        tables = [self.get_metrics(font_path) for font_path in self.font_paths]
+        measured = [metrics.measure(text) for metrics in tables]
+        advances = np.max([advances for advances, _ in measured], axis=0)
+        bboxes = np.concatenate([np.min([bboxes[:, :2] for _, bboxes in measured], axis=0),
+                                 np.max([bboxes[:, 2:] for _, bboxes in measured], axis=0)], axis=1)
+        widest = MeasuredText(advances, bboxes, max(metrics.line_height for metrics in tables))
+        return fits(widest, box_size, MIN_FONT_SIZE / REFERENCE_SIZE, self.wrap) is None
+
+    def layout(self, text, box_size, rng):
+        """Place every glyph of text inside a box of box_size.
+
+        Returns (font size, [(x, y, char, font_path, line), ...]) with positions relative to the box origin.
+        """
+        if not text or not self.font_paths:
+            return self.font_size, []
+
+        # Choose a different font than the last one for every glyph
+        font_choices = []
+        last = None
+        for _ in text:
+            available = [i for i in range(len(self.font_paths)) if i != last] or [0]  # Allow repetition with one font
+            last = rng.choice(available)
+            font_choices.append(last)
+
+        measured = self.measure(text, font_choices)
+        if self.fit:
+            size, lines = fit_size(measured, box_size, self.font_size, self.wrap)
+        else:
+            size = self.font_size
+            scaled = measured.advances * (size / REFERENCE_SIZE)
+            lines = break_lines(scaled, box_size[0]) if self.wrap else [(0, len(text))]
+        xs, ys, _ = place_glyphs(measured, lines, box_size, size / REFERENCE_SIZE)
+
+        line_ids = np.zeros(len(text), dtype=int)
+        for row, (start, end) in enumerate(lines):
+            line_ids[start:end] = row
+        return size, [(xs[i], ys[i], char, self.font_paths[font_choices[i]], line_ids[i]) for i, char in enumerate(text)]
+
+    def render_patch(self, text, box_size, rng):
+        """Render text for a box of box_size into a tight RGBA patch.
+
+        Returns (patch, (offset_x, offset_y)) where the offset is relative to the box origin,
+        or (None, (0, 0)) if nothing would be drawn.
+        """
+        size, glyphs = self.layout(text, box_size, rng)
+        if not glyphs:
+            return None, (0, 0)
+
+        params = None
+        if self.augmentation is not None:
+            generator = np.random.default_rng(rng.getrandbits(64))
+            params = draw_parameters(self.augmentation, [glyph[4] for glyph in glyphs], size, generator)
+
+        masks, offsets = zip(*(self.get_glyph(font_path, size, char) for _, _, char, font_path, _ in glyphs))
+        if params is not None:
+            masks, offsets = warp_all(masks, offsets, params["angle"], params["scale"])
+
+        placed = []
+        for i, (x, y, _, _, _) in enumerate(glyphs):
+            mask, (offset_x, offset_y) = masks[i], offsets[i]
+            if mask.size == 0:
+                continue
+            if params is not None:
+                mask = tone(mask, params["gamma"][i], params["intensity"][i])
+                x += params["dx"][i]
+                y += params["dy"][i]
+            placed.append((int(round(x + offset_x)), int(round(y + offset_y)), mask))
+        if not placed:
+            return None, (0, 0)
+
+        left = min(x for x, _, _ in placed)
+        top = min(y for _, y, _ in placed)
+        right = max(x + mask.shape[1] for x, _, mask in placed)
+        bottom = max(y + mask.shape[0] for _, y, mask in placed)
+
+        # Composite coverage into one mask and colour it afterwards so anti-aliased edges keep their hue
+        coverage = np.zeros((bottom - top, right - left), dtype=np.uint8)
+        for x, y, mask in placed:
+            region = coverage[y - top:y - top + mask.shape[0], x - left:x - left + mask.shape[1]]
+            np.maximum(region, mask, out=region)
+
+        patch = Image.new("RGBA", (coverage.shape[1], coverage.shape[0]), self.font_color)
+        patch.putalpha(Image.fromarray(coverage))
+        return patch, (left, top)
+
+    def draw_text(self, image, text, dst_box, rng, pool=None, overlay=None, key=None):
+        """Draw text into dst_box of image, sampling from pool when one is given.
+
+        Every pasted patch is also recorded in `overlay` under `key` when one is given (see overlay.Overlay).
+        """
+        box_size = (dst_box[2] - dst_box[0], dst_box[3] - dst_box[1])
+        if pool is not None:
+            patch, offset = pool.sample(self, text, box_size, rng)
+        else:
+            patch, offset = self.render_patch(text, box_size, rng)
+        if patch is not None:
+            paste_patch(image, patch, dst_box[0] + offset[0], dst_box[1] + offset[1])
+            if overlay is not None:
+                overlay.add(patch, dst_box[0] + offset[0], dst_box[1] + offset[1], key)
+
+
+class VariantPool:
+    """Pre-renders K variants per (text, box size, fonts, size, colour) and reuses them.
+
+    Variants are rendered from a seed derived from the pool seed and the key, so the same
+    pool seed always yields the same variants no matter in which order pages are processed.
+    At most `max_keys` keys are kept, the least recently used are dropped first, so a
+    long-running service does not grow with every distinct text. Safe to share between threads.
+    """
+
+    def __init__(self, variants=4, seed=0, max_keys=DEFAULT_POOL_KEYS):
+        self.variants = max(int(variants), 1)
+        self.seed = seed
+        self.max_keys = max(int(max_keys), 1)
+        self.pool = collections.OrderedDict()  # key -> variants, least recently used first
+        self.lock = threading.Lock()
+        self.rendered = 0  # Number of patches actually rendered
+        self.sampled = 0  # Number of destinations served
+
+    def get_variants(self, renderer, text, box_size):
+        key = (text, tuple(box_size)) + renderer.settings_key()
+        with self.lock:
+            variants = self.pool.get(key)
+            if variants is not None:
+                self.pool.move_to_end(key)
+                return variants
+        # Render outside the lock; two threads missing the same key render identical variants
+        variants = [
+            renderer.render_patch(text, box_size, random.Random(stable_seed(self.seed, key, i)))
+            for i in range(self.variants)
+        ]
+        with self.lock:
+            self.pool[key] = variants
+            self.rendered += len(variants)
+            while len(self.pool) > self.max_keys:
+                self.pool.popitem(last=False)
+        return variants
+
+    def sample(self, renderer, text, box_size, rng):
+        variants = self.get_variants(renderer, text, box_size)
+        with self.lock:
+            self.sampled += 1
+        return rng.choice(variants)
+
+    def clear(self):
+        with self.lock:
+            self.pool.clear()
+            self.rendered = 0
+            self.sampled = 0
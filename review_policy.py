@@ -0,0 +1,45 @@
+"""Decides which batch pages can be accepted without human review.
+
+A page is accepted automatically only when every region that has destinations was recognised with
+at least `threshold` confidence and its text fits all of its destination boxes; any other page goes
+to the review queue with the reasons listed. Counts of both outcomes are kept for the batch summary.
+"""
+
+DEFAULT_THRESHOLD = 0.9  # PaddleOCR scores clearly correct single lines at 0.95 and above
+
+
+class ReviewPolicy:
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self.auto_accepted = 0
+        self.reviewed = 0
+
+    def check(self, texts, scores, layout, renderer):
+        """Return the reasons why a page needs review (an empty list means it can be auto-accepted).
+
+        `layout` is the page's pixel layout as drawn, `texts` and `scores` hold one entry per region pair.
+        """
+        reasons = []
+        if len(scores) != len(texts):
+            return ["缺少置信度"]
+        for index, ((_, dst_boxes), text, score) in enumerate(zip(layout, texts, scores), start=1):
+            if not dst_boxes:
+                continue
+            if not text:
+                reasons.append(f"区域 {index} 未识别到文本")
+            elif score < self.threshold:
+                reasons.append(f"区域 {index} 置信度 {score:.2f}")
+            elif any(renderer.overflows(text, (box[2] - box[0], box[3] - box[1])) for box in dst_boxes):
+                reasons.append(f"区域 {index} 文字放不下目标框")
+        return reasons
+
+    def count(self, accepted):
+        if accepted:
+            self.auto_accepted += 1
+        else:
+            self.reviewed += 1
+
+    def summary(self):
+        total = self.auto_accepted + self.reviewed
+        share = f"（{self.auto_accepted / total:.0%}）" if total else ""
+        return f"自动接受 {self.auto_accepted} 页{share}，人工审阅 {self.reviewed} 页"
@@ -0,0 +1,64 @@
+# 共享内存图片传输：整页图片只写入共享内存一次，识别子进程按描述符 (名称, 形状, 框)
+# 直接在共享内存上切出源区域的视图，不再为每个源区域单独转换、复制和序列化图片。
+
+from multiprocessing import shared_memory
+import numpy as np
+import ocr_preprocess
+
+
+class SharedPage:
+    """把一页图片写入共享内存，供识别子进程读取。\n
+    `mode`: "BGR"（OpenCV/EasyOCR 的通道顺序）或 "L"（灰度）。RGB→BGR 的转换在写入时对整页一次完成。\n
+    用法：
+        with SharedPage(image) as page:
+            futures = [pool.submit(work, page.descriptor(box)) for box in boxes]
+    """
+
+    def __init__(self, image, mode="BGR"):
+        pixels = np.asarray(ocr_preprocess.flatten(image, gray=(mode == "L")), dtype=np.uint8)
+        self.shape = pixels.shape
+        self.shm = shared_memory.SharedMemory(create=True, size=max(pixels.nbytes, 1))
+        view = np.ndarray(self.shape, dtype=np.uint8, buffer=self.shm.buf)
+        if mode == "BGR":
+            view[...] = pixels[:, :, ::-1]  # 翻转通道的同时写入共享内存
+        else:
+            view[...] = pixels
+        del view
+
+    def descriptor(self, box):
+        """返回源区域的描述符，可直接传给子进程。`box`: (左, 上, 右, 下)"""
+        return self.shm.name, self.shape, tuple(int(v) for v in box)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach(name):
+    """在子进程中打开已存在的共享内存，由创建方负责释放。\n
+    进程池的子进程与主进程共用同一个资源追踪器，登记重复也不会导致共享内存被提前删除。"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def with_region(descriptor, func, *args):
+    """在子进程中取得源区域的视图（不复制像素）并调用 func(视图, *args)，返回其结果。\n
+    视图只在 func 执行期间有效，func 不应保存对它的引用。"""
+    name, shape, (left, top, right, bottom) = descriptor
+    shm = attach(name)
+    try:
+        page = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        region = page[max(top, 0):min(bottom, shape[0]), max(left, 0):min(right, shape[1])]
+        del page
+        return func(region, *args)
+    finally:
+        region = None
+        shm.close()
@@ -0,0 +1,65 @@
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import OCR  # noqa: E402
+
+
+class FakeEngine:
+    """Stands in for a PaddleOCR-json process: the first engine's call times out (code 903)."""
+    instances = []
+
+    def __init__(self, *args, **kwargs):
+        self.instances.append(self)
+        self.first = len(self.instances) == 1
+        self.proceed = threading.Event()
+
+    def runDict(self, writeDict, timeout=None):
+        if self.first:
+            self.proceed.wait(5)
+            return {"code": 903, "data": "timeout"}
+        return {"code": 100, "data": [{"text": "ok", "score": 1.0}]}
+
+    def exit(self):
+        pass
+
+
+class EnginePoolTest(unittest.TestCase):
+    def setUp(self):
+        FakeEngine.instances = []
+        patcher = mock.patch.object(OCR, "GetOcrApi", FakeEngine)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_waiter_starts_replacement_after_timeout(self):
+        pool = OCR.EnginePool(size=1)
+        results = []
+        first = threading.Thread(target=lambda: results.append(pool.runDict({})), daemon=True)
+        first.start()  # Holds the only engine until its call times out
+        while not FakeEngine.instances:
+            threading.Event().wait(0.01)
+        waiter = threading.Thread(target=lambda: results.append(pool.runDict({})), daemon=True)
+        waiter.start()  # Finds the pool full and waits
+        threading.Event().wait(0.1)
+        self.assertTrue(waiter.is_alive())
+
+        # The timed-out engine is discarded; the waiter must start its replacement
+        FakeEngine.instances[0].proceed.set()
+        first.join(5)
+        waiter.join(5)
+        self.assertFalse(waiter.is_alive(), "the waiting thread is still blocked in acquire()")
+        self.assertEqual(sorted(result["code"] for result in results), [100, 903])
+        self.assertEqual(len(FakeEngine.instances), 2)
+        self.assertEqual(pool.started, 1)
+
+    def test_acquire_without_blocking_on_full_pool(self):
+        pool = OCR.EnginePool(size=1)
+        pool.acquire()
+        self.assertIsNone(pool.acquire(block=False))
+
+
+if __name__ == "__main__":
+    unittest.main()
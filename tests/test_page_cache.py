@@ -0,0 +1,46 @@
+import os
+import sys
+import tempfile
+import unittest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from page_cache import PageCache  # noqa: E402
+
+
+class PageCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        page_bytes = 10 * 10 * 3
+        self.cache = PageCache(self.directory.name, max_bytes=4 * page_bytes)  # Room for two pages of two images
+
+    def tearDown(self):
+        self.cache.close()
+        self.directory.cleanup()
+
+    def put_page(self, index):
+        for kind in ("original", "rendered"):
+            self.cache.put((index, kind), Image.new("RGB", (10, 10), (index, 0, 0)), group=index)
+
+    def test_images_of_a_page_are_evicted_together(self):
+        self.put_page(0)
+        self.put_page(1)
+        self.cache.get((0, "original"))  # Page 0 becomes the most recently used one
+        self.put_page(2)
+        self.assertNotIn((1, "original"), self.cache)
+        self.assertNotIn((1, "rendered"), self.cache)
+        self.assertIn((0, "rendered"), self.cache)
+        self.assertEqual(self.cache.get((2, "rendered")).getpixel((0, 0)), (2, 0, 0))
+
+    def test_replacing_one_image_keeps_the_group(self):
+        self.put_page(0)
+        self.put_page(1)
+        self.cache.put((0, "rendered"), Image.new("RGB", (10, 10), (9, 0, 0)), group=0)
+        self.put_page(2)
+        self.assertIn((0, "original"), self.cache)
+        self.assertEqual(self.cache.get((0, "rendered")).getpixel((0, 0)), (9, 0, 0))
+        self.assertNotIn((1, "original"), self.cache)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import sys
+import tempfile
+import unittest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from thumbnails import ThumbnailMaker  # noqa: E402
+
+
+class ThumbnailCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.directory.name, "cache")
+        self.pages = []
+        for i in range(4):
+            path = os.path.join(self.directory.name, f"{i}.png")
+            Image.effect_noise((300, 400), 40 + i).save(path)
+            self.pages.append(path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def maker(self, max_bytes):
+        maker = ThumbnailMaker(self.cache_dir, max_bytes=max_bytes)
+        maker.stop()
+        maker.thread.join()  # The worker has indexed the cache folder; make() is called directly below
+        return maker
+
+    def test_least_recently_used_thumbnails_are_deleted(self):
+        maker = self.maker(10 ** 9)
+        for path in self.pages:
+            maker.make(path)
+        sizes = sorted(maker.entries.values())
+        maker.make(self.pages[0])  # Page 0 becomes the most recently used one
+
+        maker = self.maker(sizes[-1] + sizes[-2] + 1)  # Room for two thumbnails
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+        self.assertIn(os.path.basename(maker.cache_path(self.pages[0], None)), os.listdir(self.cache_dir))
+        maker.make(self.pages[1])
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), sorted(maker.entries))
+        self.assertLessEqual(maker.used_bytes, maker.max_bytes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+"""Metric-table text layout.
+
+Glyph metrics are measured once per font at REFERENCE_SIZE with getlength/getbbox and cached per
+character; metrics at other sizes are obtained by linear scaling. Laying out a string is then a few
+NumPy operations over its advances (cumulative sums for positions and line breaks), so no font calls
+are made per glyph and the fit-to-box search can try many sizes cheaply.
+"""
+import numpy as np
+
+REFERENCE_SIZE = 100  # Font size at which metric tables are measured
+MIN_FONT_SIZE = 6  # Fit-to-box never shrinks text below this size
+LINE_SPACING = 1.1  # Line height relative to the font's ascent + descent
+
+
+class FontMetrics:
+    """Advance and bounding-box tables of one font at REFERENCE_SIZE, filled lazily per character."""
+
+    def __init__(self, font):
+        self.font = font
+        self.advances = {}  # char -> advance width
+        self.bboxes = {}  # char -> (left, top, right, bottom) relative to the drawing origin
+        try:
+            ascent, descent = font.getmetrics()
+            self.line_height = ascent + descent
+        except Exception:
+            bbox = font.getbbox("Ag")
+            self.line_height = bbox[3]
+
+    def measure(self, text):
+        """Return (advances, bboxes) arrays for text, measuring only characters not seen before."""
+        for char in set(text) - self.advances.keys():
+            try:
+                self.advances[char] = self.font.getlength(char)
+                self.bboxes[char] = self.font.getbbox(char)
+            except Exception:
+                self.advances[char] = REFERENCE_SIZE / 10
+                self.bboxes[char] = (0, 0, 0, 0)
+        advances = np.array([self.advances[char] for char in text], dtype=np.float64)
+        bboxes = np.array([self.bboxes[char] for char in text], dtype=np.float64).reshape(-1, 4)
+        return advances, bboxes
+
+
+class MeasuredText:
+    """Metrics of one string at REFERENCE_SIZE: per-glyph advances and ink boxes, line pitch and ink extent."""
+
+    def __init__(self, advances, bboxes, line_height):
+        self.advances = advances
+        self.bboxes = bboxes
+        self.pitch = line_height * LINE_SPACING
+        self.ink_top = bboxes[:, 1].min() if len(bboxes) else 0.0
+        self.ink_height = (bboxes[:, 3].max() - self.ink_top) if len(bboxes) else 0.0
+
+
+def break_lines(advances, width):
+    """Greedy line breaking: return (start, end) index pairs so that each line fits width.
+
+    A glyph wider than the line gets a line of its own.
+    """
+    ends = np.cumsum(advances)
+    lines = []
+    start, consumed = 0, 0.0
+    count = len(advances)
+    while start < count:
+        end = int(np.searchsorted(ends, consumed + width, side="right"))
+        end = min(max(end, start + 1), count)
+        lines.append((start, end))
+        consumed = ends[end - 1]
+        start = end
+    return lines
+
+
+def fits(measured, box_size, scale, wrap):
+    """Return the line breaks if the text fits the box at scale, else None."""
+    box_width, box_height = box_size
+    advances = measured.advances * scale
+    lines = break_lines(advances, box_width) if wrap else [(0, len(advances))]
+    if ((len(lines) - 1) * measured.pitch + measured.ink_height) * scale > box_height:
+        return None
+    if any(advances[start:end].sum() > box_width for start, end in lines):
+        return None
+    return lines
+
+
+def fit_size(measured, box_size, max_size, wrap=False, min_size=MIN_FONT_SIZE):
+    """Binary-search the largest integer font size <= max_size at which the text fits box_size.
+
+    Returns (size, lines); when even min_size does not fit, min_size is returned with its line breaks.
+    """
+    def attempt(size):
+        return fits(measured, box_size, size / REFERENCE_SIZE, wrap)
+
+    lines = attempt(max_size)
+    if lines is not None:
+        return max_size, lines
+    low, high = min(min_size, max_size), max_size  # attempt(high) fails
+    best = attempt(low)
+    while best is not None and high - low > 1:
+        middle = (low + high) // 2
+        lines = attempt(middle)
+        if lines is not None:
+            low, best = middle, lines
+        else:
+            high = middle
+    if best is None:  # Does not fit even at the minimum size; let it overflow
+        scale = low / REFERENCE_SIZE
+        best = break_lines(measured.advances * scale, box_size[0]) if wrap else [(0, len(measured.advances))]
+    return low, best
+
+
+def place_glyphs(measured, lines, box_size, scale):
+    """Return (x, y, ink) for every glyph, with the text block centred in the box.
+
+    x and y are the drawing origins relative to the box origin; ink holds the (left, top, right,
+    bottom) ink bounds of every glyph relative to the box origin.
+    """
+    box_width, box_height = box_size
+    advances = measured.advances * scale
+    pitch = measured.pitch * scale
+    x = np.empty(len(advances))
+    y = np.empty(len(advances))
+    block_height = (len(lines) - 1) * pitch + measured.ink_height * scale
+    top = (box_height - block_height) / 2 - measured.ink_top * scale
+    for row, (start, end) in enumerate(lines):
+        line = advances[start:end]
+        x[start:end] = (box_width - line.sum()) / 2 + np.concatenate(([0.0], np.cumsum(line)[:-1]))
+        y[start:end] = top + row * pitch
+    ink = measured.bboxes * scale + np.stack([x, y, x, y], axis=1)
+    return x, y, ink
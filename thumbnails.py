@@ -0,0 +1,124 @@
+"""Thumbnails of batch pages, made by a background thread and cached on disk.
+
+The GUI asks for the thumbnails of the pages currently visible in its strip; a worker thread makes
+them (most recent requests first) and hands them back through a queue that the UI thread polls, so
+Tk is only ever touched from the UI thread. Pages are decoded with Image.draft, which lets JPEG
+decode directly at a fraction of the full size, and every thumbnail is stored under the hash of its
+source file, so it is made only once per file and page no matter where the file is opened from.
+The cache folder is bounded by `max_bytes`: every use refreshes a thumbnail's modification time and
+the least recently used thumbnails are deleted first.
+"""
+import collections
+import os
+import queue
+import threading
+from PIL import Image
+from batch_manifest import file_hash
+
+THUMBNAIL_SIZE = (90, 120)
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".fachao", "thumbnails")
+DEFAULT_CACHE_BYTES = 64 << 20  # Disk space for cached thumbnails (about 4000 pages at 15 KB each)
+
+
+class ThumbnailMaker:
+    def __init__(self, cache_dir=CACHE_DIR, size=THUMBNAIL_SIZE, max_bytes=DEFAULT_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.size = size
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self.entries = None  # File name -> bytes, least recently used first; loaded by the worker thread
+        self.used_bytes = 0
+        self.requests = queue.LifoQueue()  # (index, path, frame); pages scrolled to last are made first
+        self.results = queue.Queue()  # (index, thumbnail) for the UI thread
+        self.requested = set()
+        self.hashes = {}  # (path, size, mtime) -> file hash
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def request(self, index, path, frame=None):
+        """Queue the thumbnail of a page unless it was requested before."""
+        if index not in self.requested:
+            self.requested.add(index)
+            self.requests.put((index, path, frame))
+
+    def cache_path(self, path, frame):
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+        if key not in self.hashes:
+            self.hashes[key] = file_hash(path)
+        return os.path.join(self.cache_dir, f"{self.hashes[key]}_{frame or 0}_{self.size[0]}x{self.size[1]}.png")
+
+    def load_entries(self):
+        """Index the thumbnails already in the cache folder, oldest first, and trim it to max_bytes."""
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(".png"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+        self.entries = collections.OrderedDict((name, size) for _, name, size in sorted(files))
+        self.used_bytes = sum(self.entries.values())
+        self.prune()
+
+    def touch(self, cache_path):
+        """Mark a cached thumbnail as just used, on disk too so that the order survives restarts."""
+        name = os.path.basename(cache_path)
+        try:
+            os.utime(cache_path)
+            size = os.path.getsize(cache_path)
+        except OSError:
+            return
+        self.used_bytes += size - self.entries.pop(name, 0)
+        self.entries[name] = size
+        self.prune(keep=name)
+
+    def prune(self, keep=None):
+        """Delete the least recently used thumbnails until the cache fits in max_bytes."""
+        while self.used_bytes > self.max_bytes and self.entries:
+            name = next(iter(self.entries))
+            if name == keep:
+                break
+            self.used_bytes -= self.entries.pop(name)
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+
+    def make(self, path, frame=None):
+        """Return the thumbnail of a page, from the disk cache when possible."""
+        cache_path = self.cache_path(path, frame)
+        if os.path.exists(cache_path):
+            with Image.open(cache_path) as cached:
+                thumbnail = cached.convert("RGB")
+            self.touch(cache_path)
+            return thumbnail
+        with Image.open(path) as image:
+            if frame:
+                image.seek(frame)
+            image.draft("RGB", self.size)  # JPEG: decode at 1/2 .. 1/8 scale, still at least self.size
+            thumbnail = image.convert("RGB")
+        thumbnail.thumbnail(self.size, reducing_gap=2.0)
+        temp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+        thumbnail.save(temp_path, format="PNG")
+        os.replace(temp_path, cache_path)
+        self.touch(cache_path)
+        return thumbnail
+
+    def run(self):
+        try:
+            self.load_entries()
+        except OSError as e:
+            print(f"读取缩略图缓存失败：{e}")
+            self.entries = collections.OrderedDict()
+        while not self.stopped.is_set():
+            try:
+                index, path, frame = self.requests.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self.results.put((index, self.make(path, frame)))
+            except Exception as e:
+                print(f"生成缩略图失败 '{os.path.basename(path)}'：{e}")
+
+    def stop(self):
+        self.stopped.set()
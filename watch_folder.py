@@ -0,0 +1,237 @@
+"""Watch-folder mode: render scans as soon as they arrive in an input folder.
+
+    python watch_folder.py scans --template worksheet.json --output out --workers 2
+
+The folder is rescanned whenever the file system reports a change (with the optional `watchdog`
+package) and at least every --poll-interval seconds otherwise. A file is taken only once its size
+and modification time have not changed for --settle seconds and it can be decoded, so scans that
+are still being written are left alone. Every page is rendered like a distributed batch page, with
+at most --workers pages at a time, and its output is written under a temporary name and renamed,
+so programs watching the output folder never see partial files. Results are recorded in the
+output folder's manifest; files that are already done are skipped after a restart, and a file that
+is replaced by a new scan under the same name is rendered again.
+"""
+import argparse
+import importlib.util
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+import OCR
+import ocr_router
+from augment import Augmentation
+from batch_manifest import BatchManifest
+from distributed import FONT_EXTENSIONS, FONTS_DIR, add_job_arguments, build_job, output_path_for
+from overlay import Overlay, save_overlay
+from page_source import IMAGE_EXTENSIONS, expand_pages, open_page, page_key, page_name
+from pipeline import render_page
+from region_template import LayoutCache, template_fingerprint
+from registration import PageRegistrar
+from renderer import HandwritingRenderer, VariantPool, stable_seed
+
+DEFAULT_SETTLE = 2.0  # Seconds a file must stay unchanged before it is read
+DEFAULT_POLL_INTERVAL = 1.0  # Rescan interval without file system events
+EVENT_POLL_INTERVAL = 30.0  # Safety rescan interval when file system events are available
+
+
+def input_changed(path, signature):
+    """True if path no longer has the size and mtime of signature (see BatchManifest.input_signature)."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return True
+    return (stat.st_size, stat.st_mtime) != tuple(signature[:2])
+
+
+class FolderWatcher:
+    """Renders the image files arriving in input_folder into output_folder until stopped."""
+
+    def __init__(self, input_folder, output_folder, job, workers=2, settle=DEFAULT_SETTLE,
+                 poll_interval=DEFAULT_POLL_INTERVAL, reference_path=None):
+        self.input_folder = os.path.abspath(input_folder)
+        if os.path.abspath(output_folder) == self.input_folder:
+            raise ValueError("输出文件夹不能是监视的文件夹。")
+        self.output_folder = output_folder
+        self.job = job
+        self.workers = max(int(workers), 1)
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.reference_path = reference_path
+
+        self.manifest = BatchManifest(output_folder)
+        self.manifest.start(job["seed"], template_fingerprint(job["region_pairs"]))
+        self.candidates = {}  # path -> ((size, mtime), time the file was first seen with that size and mtime)
+        self.taken = {}  # path -> (size, mtime) of the version that was queued
+        self.arrived = {}  # path -> time the file was first seen, for the arrival-to-output latency
+        self.wake = threading.Event()  # Set by file system events to rescan early
+        self.stopped = threading.Event()
+
+        self.region_pairs = job["region_pairs"]
+        self.layout_cache = LayoutCache()
+        self.layout_lock = threading.Lock()
+        local_fonts = {f: os.path.join(FONTS_DIR, f) for f in os.listdir(FONTS_DIR) if f.lower().endswith(FONT_EXTENSIONS)}
+        self.font_paths = [local_fonts[f] for f in job["fonts"] if f in local_fonts] or sorted(local_fonts.values())
+        if not self.font_paths:
+            raise Exception(f"在 {FONTS_DIR} 中未找到任何字体文件。")
+        self.pool = VariantPool(job["variants"], job["seed"]) if job.get("variants") else None
+        self.registrar = None
+        if reference_path:
+            self.registrar = PageRegistrar(Image.open(reference_path), estimate_rotation=job.get("align_rotation", False))
+        self.local = threading.local()  # Fonts are not shared between threads
+
+    def get_renderer(self):
+        if not hasattr(self.local, "renderer"):
+            self.local.renderer = HandwritingRenderer(self.font_paths, self.job["font_size"], self.job["color"],
+                                                      wrap=self.job.get("wrap", False),
+                                                      augmentation=Augmentation.from_strength(self.job.get("augment", 0)))
+        return self.local.renderer
+
+    def scan(self, now=None):
+        """Return the input files that have settled since the last scan and were not taken yet."""
+        now = time.monotonic() if now is None else now
+        ready = []
+        present = set()
+        with os.scandir(self.input_folder) as entries:
+            for entry in entries:
+                if not entry.is_file() or not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                path = entry.path
+                present.add(path)
+                stat = entry.stat()
+                version = (stat.st_size, stat.st_mtime_ns)
+                if self.taken.get(path) == version:
+                    continue
+                self.arrived.setdefault(path, now)
+                seen, since = self.candidates.get(path, (None, now))
+                if seen != version:
+                    self.candidates[path] = (version, now)  # New or still being written: wait for it to settle
+                elif now - since >= self.settle and self.readable(path):
+                    del self.candidates[path]
+                    self.taken[path] = version
+                    ready.append(path)
+        for path in set(self.candidates) - present:
+            del self.candidates[path]  # Deleted or renamed before it settled
+            self.arrived.pop(path, None)
+        return sorted(ready)
+
+    def readable(self, path):
+        """True if the file can be opened and decoded; scanners may still hold it open on Windows."""
+        try:
+            with Image.open(path) as image:
+                image.load()
+            return True
+        except Exception:
+            return False
+
+    def process_file(self, path):
+        """Render every unfinished page of an input file."""
+        for frame_path, frame in expand_pages([path]):
+            if self.manifest.is_done(frame_path, frame):
+                print(f"跳过已完成的 {page_name(frame_path, frame)}")
+                continue
+            try:
+                # Sign the input before it is read, so a file replaced while it is rendered is not
+                # recorded as done with the new content's hash
+                signature = self.manifest.input_signature(frame_path, frame)
+                output_path, seed, texts = self.process_page(frame_path, frame)
+            except Exception as e:
+                print(f"处理 {page_name(frame_path, frame)} 失败：{e}")
+                self.manifest.record(frame_path, frame, decision="failed", error=str(e))
+                continue
+            self.manifest.record(frame_path, frame, signature, decision="rendered", output=output_path, seed=seed,
+                                 texts=texts)
+            latency = time.monotonic() - self.arrived.get(path, time.monotonic())
+            print(f"已完成 {page_name(frame_path, frame)}，从到达到输出用时 {latency:.1f} 秒")
+            if input_changed(frame_path, signature):
+                print(f"{page_name(frame_path, frame)} 在处理期间被修改，将重新处理")
+        self.arrived.pop(path, None)
+
+    def process_page(self, path, frame):
+        image = open_page(path, frame)
+        transform = self.registrar.estimate(image) if self.registrar is not None else None
+        seed = stable_seed(self.job["seed"], page_key(path, frame), 0)
+        overlay = Overlay(image.size, path, frame) if self.job.get("overlay") else None
+        with self.layout_lock:
+            self.layout_cache.get(self.region_pairs, *image.size)  # Compile once per resolution
+        texts = render_page(image, self.region_pairs, self.layout_cache, self.job["language"], self.get_renderer(),
+                            seed, pool=self.pool, transform=transform, name=page_name(path, frame), overlay=overlay)
+
+        output_path = output_path_for(self.output_folder, path, frame, overlay is not None)
+        temp_path = f"{output_path}.{threading.get_ident()}.tmp"
+        if overlay is not None:
+            with open(temp_path, "wb") as f:
+                save_overlay(overlay, f)
+        else:
+            image.save(temp_path, format="PNG")
+        os.replace(temp_path, output_path)
+        return output_path, seed, texts
+
+    def start_events(self):
+        """Wake the scanner on file system events if watchdog is installed; return the observer or None."""
+        if importlib.util.find_spec("watchdog") is None:
+            return None
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                watcher.wake.set()
+
+        observer = Observer()
+        observer.schedule(Handler(), self.input_folder, recursive=False)
+        observer.start()
+        return observer
+
+    def run(self):
+        observer = self.start_events()
+        interval = self.poll_interval if observer is None else EVENT_POLL_INTERVAL
+        print(f"正在监视 {self.input_folder}（{'文件系统事件' if observer is not None else '定时扫描'}），"
+              f"最多同时处理 {self.workers} 页，按 Ctrl+C 停止。")
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            while not self.stopped.is_set():
+                for path in self.scan():
+                    print(f"发现新文件 {os.path.basename(path)}")
+                    executor.submit(self.process_file, path)
+                # Files that are still settling are checked again shortly, whether or not events arrive
+                self.wake.wait(min(interval, self.settle / 2) if self.candidates else interval)
+                self.wake.clear()
+        except KeyboardInterrupt:
+            print("正在停止，等待处理中的页面完成……")
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+            executor.shutdown(wait=True)
+            self.manifest.close()
+            print(f"批量处理清单统计: {self.manifest.summary()}")
+            print(f"识别后端统计: {ocr_router.get_router().summary()}")
+            OCR.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="监视文件夹，自动处理新放入的扫描件")
+    parser.add_argument("input", help="要监视的输入文件夹")
+    add_job_arguments(parser)
+    parser.add_argument("--workers", type=int, default=2, help="同时处理的页数")
+    parser.add_argument("--engines", type=int, default=None, help="识别引擎数，默认与 --workers 相同")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE, help="文件大小和修改时间保持不变多少秒后才读取")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL, help="未安装 watchdog 时的扫描间隔（秒）")
+    parser.add_argument("--ocr-timeout", type=float, default=None, help="单次识别的最长秒数，超时的引擎会被关闭并重启")
+    args = parser.parse_args(argv)
+
+    job = build_job(args)
+    OCR.configure(size=args.engines or args.workers, timeout=args.ocr_timeout)
+    FolderWatcher(args.input, args.output, job, args.workers, args.settle, args.poll_interval,
+                  reference_path=args.align).run()
+
+
+if __name__ == "__main__":
+    main()